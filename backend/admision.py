@@ -0,0 +1,114 @@
+"""
+Control de admisión de /predict.
+
+Cada variante de modelo tiene un máximo de peticiones en curso en el modelo
+(esperando en el micro-batching o ejecutándose) y un presupuesto de latencia.
+Una petición que necesita el modelo se rechaza de inmediato, con 503 y
+Retry-After, si su variante ya tiene el máximo de peticiones en curso o si
+el tiempo que lleva desde su llegada más la latencia reciente de la variante
+superaría el presupuesto. Así la latencia de las peticiones admitidas queda
+acotada y el exceso se rechaza en microsegundos, en lugar de esperar en la
+cola hasta que el cliente agota su timeout.
+
+La latencia reciente es una media móvil exponencial de las peticiones
+admitidas, y solo se tiene en cuenta mientras hay peticiones en curso: con
+la variante libre siempre se admite, lo que permite que la media se recupere
+tras una ráfaga.
+
+admitir y liberar se llaman desde el bucle de eventos, por lo que los
+contadores no necesitan lock.
+"""
+import math
+from typing import Any, Dict, Mapping
+
+MOTIVO_CONCURRENCIA = "concurrencia"
+MOTIVO_PRESUPUESTO = "presupuesto"
+
+
+class PeticionRechazada(Exception):
+    """La petición no se admite; `reintento_s` es el valor sugerido para Retry-After"""
+
+    def __init__(self, modelo: str, motivo: str, reintento_s: int):
+        super().__init__(f"Servicio saturado para el modelo {modelo} ({motivo}); reintente en {reintento_s} s")
+        self.modelo = modelo
+        self.motivo = motivo
+        self.reintento_s = reintento_s
+
+
+class _Variante:
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.en_curso = 0
+        self.max_en_curso = 0
+        self.latencia_media = 0.0
+        self.admitidas = 0
+        self.rechazadas = {MOTIVO_CONCURRENCIA: 0, MOTIVO_PRESUPUESTO: 0}
+
+
+class ControlAdmision:
+    """
+    Límites de concurrencia y presupuesto de latencia por variante de modelo.
+
+    Args:
+        limites: Máximo de peticiones en curso por variante (0 = sin límite)
+        presupuesto_s: Latencia máxima aceptable de una petición desde su
+            llegada (0 = sin presupuesto)
+        alfa: Peso de la última observación en la media móvil de latencia
+    """
+
+    def __init__(self, limites: Mapping[str, int], presupuesto_s: float = 1.0, alfa: float = 0.1):
+        self.presupuesto_s = presupuesto_s
+        self.alfa = alfa
+        self._variantes = {modelo: _Variante(limite) for modelo, limite in limites.items()}
+
+    def _reintento(self, variante: _Variante) -> int:
+        return max(1, math.ceil(variante.latencia_media))
+
+    def admitir(self, modelo: str, esperado_s: float):
+        """
+        Reserva un hueco para una petición que lleva `esperado_s` segundos
+        desde su llegada.
+
+        Raises:
+            PeticionRechazada: Si se supera el límite de la variante o su presupuesto de latencia
+        """
+        variante = self._variantes[modelo]
+        if variante.limite and variante.en_curso >= variante.limite:
+            motivo = MOTIVO_CONCURRENCIA
+        elif (self.presupuesto_s and variante.en_curso
+              and esperado_s + variante.latencia_media > self.presupuesto_s):
+            motivo = MOTIVO_PRESUPUESTO
+        else:
+            variante.en_curso += 1
+            variante.max_en_curso = max(variante.max_en_curso, variante.en_curso)
+            variante.admitidas += 1
+            return
+        variante.rechazadas[motivo] += 1
+        raise PeticionRechazada(modelo, motivo, self._reintento(variante))
+
+    def liberar(self, modelo: str, duracion_s: float):
+        """Libera el hueco de una petición admitida y actualiza la latencia media"""
+        variante = self._variantes[modelo]
+        variante.en_curso -= 1
+        if variante.latencia_media:
+            variante.latencia_media += self.alfa * (duracion_s - variante.latencia_media)
+        else:
+            # Una primera observación anómala (arranque en frío) no debe
+            # dejar la media por encima del presupuesto y rechazar la ráfaga
+            variante.latencia_media = min(duracion_s, self.presupuesto_s) if self.presupuesto_s else duracion_s
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "presupuesto_ms": self.presupuesto_s * 1000,
+            "modelos": {
+                modelo: {
+                    "limite": variante.limite,
+                    "en_curso": variante.en_curso,
+                    "max_en_curso": variante.max_en_curso,
+                    "latencia_media_ms": round(variante.latencia_media * 1000, 3),
+                    "admitidas": variante.admitidas,
+                    "rechazadas": dict(variante.rechazadas),
+                }
+                for modelo, variante in self._variantes.items()
+            },
+        }
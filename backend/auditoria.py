@@ -0,0 +1,398 @@
+"""
+Registro de auditoría de las predicciones servidas por la API.
+
+Los endpoints de predicción entregan a RegistroAuditoria las entradas, el
+modelo con su versión y las salidas; en el camino de la petición solo se
+añade una referencia a un buffer en memoria. Un hilo aparte convierte el
+buffer en tablas Arrow cada `intervalo_s` segundos y las escribe en ficheros
+Parquet (zstd) con las columnas de texto codificadas como diccionario, en un
+directorio por día UTC:
+
+    auditoria/fecha=2026-10-18/auditoria-20261018T101500-<pid>-<n>.parquet
+
+Las filas se acumulan en memoria como Arrow hasta completar un grupo de filas
+(`filas_grupo`). El fichero abierto lleva el prefijo '_' y se renombra al
+cerrarse, cada `rotacion_s` segundos o al detener la API; hasta entonces no
+es visible para leer_dia, y si el proceso muere sin cerrarlo se pierden esos
+segundos de registros.
+
+Consulta de un día (desde cualquier directorio):
+    python backend/auditoria.py 2026-10-18 --modelo distrito
+"""
+import argparse
+import itertools
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from puntuacion_masiva import categorias_codigos, columna_numerica
+from vocabulario import CAMPOS_CATEGORICOS, categorias_columna
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_AUDITORIA = Path(os.getenv("AUDITORIA_DIR", Path(__file__).resolve().parent.parent / "auditoria"))
+
+CAMPOS_NUMERICOS = ("cod_distrito", "coordenada_x_utm", "coordenada_y_utm", "latitud", "longitud")
+
+TEXTO = pa.dictionary(pa.int32(), pa.string())
+TS = pa.timestamp("us", tz="UTC")
+
+# Esquema de los ficheros: las columnas de texto como diccionario
+ESQUEMA = pa.schema(
+    [("ts", TS), ("endpoint", TEXTO), ("modelo", TEXTO), ("version", TEXTO), ("huella", TEXTO), ("origen", TEXTO)]
+    + [(c, TEXTO) for c in CAMPOS_CATEGORICOS]
+    + [(c, pa.float64()) for c in CAMPOS_NUMERICOS]
+    + [("prediction", pa.int8()), ("probability", pa.float64()), ("error", TEXTO)]
+)
+
+# Mismo esquema con texto plano, para construir las tablas antes de codificarlas
+_ESQUEMA_PLANO = pa.schema([
+    pa.field(campo.name, pa.string()) if campo.type == TEXTO else campo for campo in ESQUEMA
+])
+
+# Versión (etiqueta, huella) de cada modelo en el momento de la predicción
+Versiones = Mapping[str, Tuple[str, str]]
+
+
+def _texto(valor) -> Optional[str]:
+    return None if valor is None else str(valor)
+
+
+def _numero(valor) -> Optional[float]:
+    try:
+        return None if valor is None or valor == "" else float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _campo(entrada, campo: str):
+    return entrada.get(campo) if isinstance(entrada, dict) else getattr(entrada, campo, None)
+
+
+def _dia(ts: float) -> date:
+    return datetime.fromtimestamp(ts, timezone.utc).date()
+
+
+class RegistroAuditoria:
+    """
+    Sumidero asíncrono de predicciones.
+
+    Args:
+        directorio: Raíz de los ficheros (un subdirectorio fecha=AAAA-MM-DD por día)
+        intervalo_s: Cada cuánto se convierte el buffer a Arrow
+        filas_grupo: Filas por grupo de filas de Parquet
+        rotacion_s: Antigüedad máxima de un fichero antes de cerrarlo
+        max_pendientes: Filas en el buffer a partir de las cuales se descartan
+            registros (contados en 'descartadas') en lugar de crecer sin límite
+        activo: Si es False, registrar no hace nada
+    """
+
+    def __init__(self, directorio: Path = DIRECTORIO_AUDITORIA, intervalo_s: float = 1.0,
+                 filas_grupo: int = 100000, rotacion_s: float = 300.0,
+                 max_pendientes: int = 1000000, activo: bool = True):
+        self.directorio = Path(directorio)
+        self.intervalo_s = intervalo_s
+        self.filas_grupo = max(1, filas_grupo)
+        self.rotacion_s = rotacion_s
+        self.max_pendientes = max_pendientes
+        self.activo = activo
+
+        self._lock = threading.Lock()
+        self._pendientes: List[Tuple] = []
+        self._filas_pendientes = 0
+        self._despertar = threading.Event()
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+        # Estado del hilo escritor: tablas Arrow acumuladas y fichero abierto por día
+        self._tablas: Dict[date, List[pa.Table]] = {}
+        self._filas_tablas = 0
+        self._ficheros: Dict[date, Tuple[pq.ParquetWriter, Path, float]] = {}
+        self._secuencia = itertools.count()
+
+        self.registradas = 0
+        self.escritas = 0
+        self.descartadas = 0
+        self.ficheros_cerrados = 0
+        self.errores = 0
+
+    # --- Camino de la petición ---
+
+    def _encolar(self, entrada: Tuple, filas: int):
+        if not self.activo:
+            return
+        with self._lock:
+            if self._filas_pendientes + filas > self.max_pendientes:
+                self.descartadas += filas
+                return
+            self._pendientes.append(entrada)
+            self._filas_pendientes += filas
+            self.registradas += filas
+        if self._filas_pendientes >= self.filas_grupo:
+            self._despertar.set()
+
+    def registrar(self, endpoint: str, modelo: str, version: Tuple[str, str], origen: str,
+                  data, resultado: Mapping[str, Any]):
+        """Una predicción individual (InputData y su resultado)"""
+        self._encolar(("fila", time.time(), endpoint, modelo, version, origen, data, resultado), 1)
+
+    def registrar_lote(self, endpoint: str, versiones: Versiones, entradas: Sequence,
+                       modelos: Sequence[Optional[str]], resultados: Sequence[Mapping[str, Any]]):
+        """
+        Un lote de registros (InputData o el dict recibido si no validó) con
+        el modelo que usó cada uno y su resultado (prediction/probability o error)
+        """
+        self._encolar(("lote", time.time(), endpoint, versiones, entradas, modelos, resultados), len(entradas))
+
+    def registrar_columnas(self, endpoint: str, versiones: Versiones, categoricas: Mapping[str, Sequence],
+                           numericas: Mapping[str, Sequence], resultado: Mapping[str, np.ndarray]):
+        """
+        Un bloque columnar con el resultado de puntuar_columnas/puntuar_codigos.
+        Las categóricas pueden ser arrays de códigos del vocabulario o valores.
+        """
+        n = len(resultado["prediction"])
+        self._encolar(("columnas", time.time(), endpoint, versiones, categoricas, numericas, resultado), n)
+
+    # --- Hilo escritor ---
+
+    def iniciar(self):
+        """Arranca el hilo escritor (una vez por proceso)"""
+        if not self.activo or (self._hilo is not None and self._hilo.is_alive()):
+            return
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="auditoria", daemon=True)
+        self._hilo.start()
+        logger.info(f"Auditoría de predicciones en {self.directorio}")
+
+    def detener(self):
+        """Escribe lo pendiente, cierra los ficheros y detiene el hilo"""
+        if self._hilo is None:
+            return
+        self._parar.set()
+        self._despertar.set()
+        self._hilo.join()
+        self._hilo = None
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            self._despertar.wait(self.intervalo_s)
+            self._despertar.clear()
+            self._volcar(cerrar=False)
+        self._volcar(cerrar=True)
+
+    def _volcar(self, cerrar: bool):
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, []
+            self._filas_pendientes = 0
+        try:
+            for dia, tabla in self._convertir(pendientes).items():
+                self._tablas.setdefault(dia, []).append(tabla)
+                self._filas_tablas += tabla.num_rows
+
+            ahora = time.time()
+            for dia in list(set(self._tablas) | set(self._ficheros)):
+                tablas = self._tablas.get(dia, [])
+                filas = sum(t.num_rows for t in tablas)
+                abierto = self._ficheros.get(dia)
+                caducado = abierto is not None and ahora - abierto[2] >= self.rotacion_s
+                if filas >= self.filas_grupo or (filas and (cerrar or caducado or dia != _dia(ahora))):
+                    self._escribir(dia, self._tablas.pop(dia))
+                if dia in self._ficheros and (cerrar or caducado or dia != _dia(ahora)):
+                    self._cerrar(dia)
+        except Exception as e:
+            self.errores += 1
+            logger.error(f"Error escribiendo el registro de auditoría: {e}")
+
+    def _convertir(self, pendientes: List[Tuple]) -> Dict[date, pa.Table]:
+        """Agrupa por día las entradas del buffer y las convierte en tablas con diccionarios"""
+        filas: Dict[date, List[Tuple]] = {}
+        bloques: Dict[date, List[pa.Table]] = {}
+        for entrada in pendientes:
+            dia = _dia(entrada[1])
+            if entrada[0] == "columnas":
+                bloques.setdefault(dia, []).append(_tabla_columnas(*entrada[1:]))
+            else:
+                filas.setdefault(dia, []).extend(_filas(entrada))
+
+        tablas = {}
+        for dia in set(filas) | set(bloques):
+            partes = list(bloques.get(dia, []))
+            if dia in filas:
+                columnas = list(zip(*filas[dia]))
+                partes.append(pa.table(
+                    [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, _ESQUEMA_PLANO)],
+                    schema=_ESQUEMA_PLANO,
+                ))
+            tablas[dia] = _codificar(pa.concat_tables(partes))
+        return tablas
+
+    def _escribir(self, dia: date, tablas: List[pa.Table]):
+        if dia not in self._ficheros:
+            carpeta = self.directorio / f"fecha={dia.isoformat()}"
+            carpeta.mkdir(parents=True, exist_ok=True)
+            marca = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+            ruta = carpeta / f"auditoria-{marca}-{os.getpid()}-{next(self._secuencia)}.parquet"
+            escritor = pq.ParquetWriter(carpeta / f"_{ruta.name}", ESQUEMA, compression="zstd")
+            self._ficheros[dia] = (escritor, ruta, time.time())
+        escritor = self._ficheros[dia][0]
+        tabla = pa.concat_tables(tablas).unify_dictionaries().combine_chunks()
+        escritor.write_table(tabla, row_group_size=max(self.filas_grupo, tabla.num_rows))
+        self.escritas += tabla.num_rows
+        self._filas_tablas -= tabla.num_rows
+
+    def _cerrar(self, dia: date):
+        escritor, ruta, _ = self._ficheros.pop(dia)
+        escritor.close()
+        os.replace(ruta.parent / f"_{ruta.name}", ruta)
+        self.ficheros_cerrados += 1
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "activo": self.activo,
+            "directorio": str(self.directorio),
+            "registradas": self.registradas,
+            "escritas": self.escritas,
+            "pendientes": self._filas_pendientes + self._filas_tablas,
+            "descartadas": self.descartadas,
+            "ficheros_abiertos": len(self._ficheros),
+            "ficheros_cerrados": self.ficheros_cerrados,
+            "errores": self.errores,
+        }
+
+
+def _filas(entrada: Tuple) -> Iterator[Tuple]:
+    """Filas (en el orden de ESQUEMA) de una entrada 'fila' o 'lote'"""
+    if entrada[0] == "fila":
+        _, ts, endpoint, modelo, version, origen, data, resultado = entrada
+        versiones, filas = {modelo: version}, [(data, modelo, resultado)]
+    else:
+        _, ts, endpoint, versiones, entradas, modelos, resultados = entrada
+        origen, filas = "modelo", zip(entradas, modelos, resultados)
+
+    ts_us = int(ts * 1_000_000)
+    for data, modelo, resultado in filas:
+        version, huella = versiones.get(modelo) or (None, None)
+        error = resultado.get("error")
+        yield (
+            ts_us, endpoint, modelo, version, huella, origen if error is None else None,
+            *(_texto(_campo(data, c)) for c in CAMPOS_CATEGORICOS),
+            *(_numero(_campo(data, c)) for c in CAMPOS_NUMERICOS),
+            resultado.get("prediction"), resultado.get("probability"),
+            None if error is None else _texto(error),
+        )
+
+
+def _tabla_columnas(ts: float, endpoint: str, versiones: Versiones, categoricas: Mapping[str, Sequence],
+                    numericas: Mapping[str, Sequence], resultado: Mapping[str, np.ndarray]) -> pa.Table:
+    n = len(resultado["prediction"])
+    modelos = list(resultado["modelo"])
+    fallidas = resultado["prediction"] < 0
+
+    columnas = {
+        "ts": pa.array(np.full(n, int(ts * 1_000_000), dtype=np.int64)).cast(TS),
+        "endpoint": pa.array([endpoint] * n, pa.string()),
+        "modelo": pa.array(modelos, pa.string()),
+        "version": pa.array([(versiones.get(m) or (None, None))[0] for m in modelos], pa.string()),
+        "huella": pa.array([(versiones.get(m) or (None, None))[1] for m in modelos], pa.string()),
+        "origen": pa.array(np.where(fallidas, None, "modelo"), pa.string()),
+    }
+    for campo in CAMPOS_CATEGORICOS:
+        valores = categoricas.get(campo)
+        if valores is None:
+            columnas[campo] = pa.nulls(n, pa.string())
+        elif isinstance(valores, np.ndarray) and valores.dtype.kind in "iu":
+            columnas[campo] = pa.array(categorias_codigos(campo, valores), pa.string())
+        else:
+            columnas[campo] = pa.array([_texto(v) for v in categorias_columna(campo, valores)], pa.string())
+    for campo in CAMPOS_NUMERICOS:
+        valores = numericas.get(campo)
+        if not (isinstance(valores, np.ndarray) and valores.dtype == np.float64):
+            valores = columna_numerica(numericas, campo, n)
+        columnas[campo] = pa.array(valores, pa.float64(), from_pandas=True)
+    columnas["prediction"] = pa.array(resultado["prediction"], pa.int8(), mask=fallidas)
+    columnas["probability"] = pa.array(resultado["probability"], pa.float64(), mask=fallidas)
+    columnas["error"] = pa.array(resultado["error"], pa.string())
+    return pa.table(columnas, schema=_ESQUEMA_PLANO)
+
+
+def _codificar(tabla: pa.Table) -> pa.Table:
+    """Convierte las columnas de texto en diccionarios (un diccionario por columna)"""
+    tabla = tabla.combine_chunks()
+    return pa.table(
+        [pc.dictionary_encode(tabla.column(c)) if tabla.schema.field(c).type == pa.string() else tabla.column(c)
+         for c in tabla.column_names],
+        schema=ESQUEMA,
+    )
+
+
+def ficheros_dia(dia: date, directorio: Path = DIRECTORIO_AUDITORIA) -> List[Path]:
+    """Ficheros cerrados de un día (los abiertos, con prefijo '_', se omiten)"""
+    carpeta = Path(directorio) / f"fecha={dia.isoformat()}"
+    return sorted(carpeta.glob("auditoria-*.parquet")) if carpeta.is_dir() else []
+
+
+def leer_dia(dia: date, columnas: Optional[Sequence[str]] = None, filtro: Optional[pc.Expression] = None,
+             directorio: Path = DIRECTORIO_AUDITORIA) -> pa.Table:
+    """
+    Lee los registros de un día UTC con pyarrow.dataset: solo se leen las
+    columnas pedidas y el filtro se aplica por grupo de filas usando las
+    estadísticas de Parquet (p. ej. ds.field("modelo") == "distrito").
+    Las columnas de texto se devuelven como diccionario.
+    """
+    ficheros = ficheros_dia(dia, directorio)
+    if not ficheros:
+        return ESQUEMA.empty_table().select(list(columnas) if columnas else ESQUEMA.names)
+    inicio = datetime(dia.year, dia.month, dia.day, tzinfo=timezone.utc)
+    del_dia = (ds.field("ts") >= pa.scalar(inicio, TS)) & (ds.field("ts") < pa.scalar(inicio + timedelta(days=1), TS))
+    dataset = ds.dataset([str(f) for f in ficheros], schema=ESQUEMA, format="parquet")
+    return dataset.to_table(columns=list(columnas) if columnas else None,
+                            filter=del_dia if filtro is None else del_dia & filtro)
+
+
+def resumen(tabla: pa.Table) -> pa.Table:
+    """Predicciones por modelo, versión y clase predicha, con su probabilidad media"""
+    tabla = pa.table({
+        c: tabla.column(c).cast(pa.string()) if pa.types.is_dictionary(tabla.schema.field(c).type) else tabla.column(c)
+        for c in ("modelo", "version", "prediction", "probability")
+    })
+    return (tabla.group_by(["modelo", "version", "prediction"])
+            .aggregate([("probability", "count"), ("probability", "mean")])
+            .sort_by([("modelo", "ascending"), ("version", "ascending"), ("prediction", "ascending")]))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Consulta el registro de auditoría de un día")
+    parser.add_argument("dia", type=date.fromisoformat, help="Día UTC (AAAA-MM-DD)")
+    parser.add_argument("--modelo", choices=("distrito", "coordenadas"), default=None)
+    parser.add_argument("--endpoint", default=None, help="Por ejemplo /predict o /predict/batch")
+    parser.add_argument("--salida", default=None, help="Guarda las filas seleccionadas en un fichero .parquet")
+    parser.add_argument("--directorio", type=Path, default=DIRECTORIO_AUDITORIA)
+    args = parser.parse_args()
+
+    filtro = None
+    for columna, valor in (("modelo", args.modelo), ("endpoint", args.endpoint)):
+        if valor is not None:
+            condicion = ds.field(columna) == valor
+            filtro = condicion if filtro is None else filtro & condicion
+
+    inicio = time.perf_counter()
+    columnas = None if args.salida else ["modelo", "version", "prediction", "probability"]
+    tabla = leer_dia(args.dia, columnas, filtro, args.directorio)
+    logger.info(f"{tabla.num_rows} registros leídos en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    if args.salida:
+        pq.write_table(tabla, args.salida, compression="zstd")
+        logger.info(f"Guardados en {args.salida}")
+    else:
+        print(resumen(tabla).to_pandas().to_string(index=False))
@@ -0,0 +1,125 @@
+"""
+Caché LRU de predicciones.
+
+Las combinaciones de vehículo, accidente y meteorología se repiten mucho, así
+que las predicciones se guardan por tupla de características normalizada. En
+el modelo de coordenadas, las coordenadas UTM se cuantizan a una rejilla
+configurable para que puntos muy próximos compartan entrada.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from vocabulario import CAMPOS_CATEGORICOS
+
+
+class CachePredicciones:
+    """
+    Caché LRU acotada con TTL opcional.
+
+    Args:
+        max_entradas: Número máximo de entradas (0 desactiva la caché)
+        ttl_s: Tiempo de vida de cada entrada en segundos (0 = sin caducidad)
+        paso_coordenadas: Tamaño de la rejilla de cuantización en metros UTM
+            (0 = coordenadas exactas)
+    """
+
+    def __init__(self, max_entradas: int = 10000, ttl_s: float = 0.0, paso_coordenadas: float = 1.0):
+        self.max_entradas = max(0, max_entradas)
+        self.ttl_s = ttl_s
+        self.paso_coordenadas = paso_coordenadas
+
+        self._entradas: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.caducadas = 0
+        self.invalidaciones = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.max_entradas > 0
+
+    def _cuantizar(self, valor: float) -> float:
+        if self.paso_coordenadas <= 0:
+            return valor
+        return round(valor / self.paso_coordenadas)
+
+    def clave(self, nombre_modelo: str, data) -> Tuple:
+        """Clave normalizada de un registro para el modelo indicado"""
+        categoricas = tuple(getattr(data, campo) for campo in CAMPOS_CATEGORICOS)
+        if nombre_modelo == "distrito":
+            return (nombre_modelo, categoricas, data.cod_distrito)
+        return (
+            nombre_modelo,
+            categoricas,
+            self._cuantizar(data.coordenada_x_utm),
+            self._cuantizar(data.coordenada_y_utm),
+        )
+
+    def _sincronizar(self, version: str):
+        # Si los modelos han cambiado, las entradas anteriores ya no son válidas
+        if version != self._version:
+            if self._entradas:
+                self.invalidaciones += 1
+            self._entradas.clear()
+            self._version = version
+
+    def obtener(self, version: str, clave: Hashable) -> Optional[Dict[str, Any]]:
+        """Devuelve la predicción guardada o None"""
+        with self._lock:
+            self._sincronizar(version)
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            guardado, resultado = entrada
+            if self.ttl_s > 0 and time.monotonic() - guardado > self.ttl_s:
+                del self._entradas[clave]
+                self.caducadas += 1
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return resultado
+
+    def guardar(self, version: str, clave: Hashable, resultado: Dict[str, Any]):
+        """Guarda una predicción, desalojando la menos usada si la caché está llena"""
+        if not self.activa:
+            return
+        with self._lock:
+            self._sincronizar(version)
+            self._entradas[clave] = (time.monotonic(), resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def vaciar(self):
+        """Elimina todas las entradas"""
+        with self._lock:
+            if self._entradas:
+                self.invalidaciones += 1
+            self._entradas.clear()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores de aciertos, fallos y desalojos"""
+        consultas = self.aciertos + self.fallos
+        return {
+            "activa": self.activa,
+            "max_entradas": self.max_entradas,
+            "ttl_s": self.ttl_s,
+            "paso_coordenadas": self.paso_coordenadas,
+            "entradas": len(self._entradas),
+            "version_modelos": self._version,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            "desalojos": self.desalojos,
+            "caducadas": self.caducadas,
+            "invalidaciones": self.invalidaciones,
+        }
@@ -0,0 +1,391 @@
+"""
+Evaluación offline de los modelos sobre un conjunto de accidentes etiquetado.
+
+Lee el fichero (CSV o Parquet) por bloques, reparte los bloques entre varios
+procesos y puntúa cada bloque con los dos bundles: el de distrito sobre las
+filas con cod_distrito y el de coordenadas sobre las filas con coordenadas
+UTM (o latitud y longitud). Además se evalúa la combinación que usaría la
+API, que da prioridad al distrito.
+
+Las métricas se acumulan de forma incremental: cada bloque devuelve solo
+contadores (matriz de confusión, histograma de probabilidades por clase y
+cubos de calibración) que el proceso principal suma, de modo que la memoria
+no depende del tamaño del fichero. El ROC-AUC se calcula sobre el histograma
+de CUBOS_ROC cubos, con un error acotado por la anchura del cubo.
+
+El informe se escribe como evaluacion.json en el directorio de la versión de
+modelos evaluada, y la API lo sirve en /modelo/info.
+
+Uso (desde cualquier directorio):
+    python backend/evaluacion.py accidentes_etiquetados.csv --objetivo lesividad --procesos 4
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from puntuacion_masiva import (
+    TAM_BLOQUE, columna_numerica, enrutar_ubicacion, leer_bloques, predecir_proba_columnas,
+)
+from registro_modelos import RUNTIME, VARIANTES, ModelRegistry
+from vocabulario import CAMPOS_CATEGORICOS, categorias_columna
+
+logger = logging.getLogger(__name__)
+
+NOMBRE_INFORME = "evaluacion.json"
+
+OBJETIVO = "lesividad"
+
+# Métricas que se acumulan: cada bundle por separado y la selección de la API
+EVALUACIONES = VARIANTES + ("api",)
+
+CUBOS_ROC = 10000
+CUBOS_CALIBRACION = 10
+
+COLUMNAS_UBICACION = ("cod_distrito", "coordenada_x_utm", "coordenada_y_utm", "latitud", "longitud")
+
+
+class AcumuladorBinario:
+    """
+    Contadores de un clasificador binario que se pueden sumar entre bloques y
+    procesos. La clase positiva es la de índice 1 del label encoder y la
+    clase predicha es el argmax de predict_proba, como en la API.
+    """
+
+    def __init__(self, cubos_roc: int = CUBOS_ROC, cubos_calibracion: int = CUBOS_CALIBRACION):
+        self.cubos_roc = cubos_roc
+        self.cubos_calibracion = cubos_calibracion
+        # Filas: clase real; columnas: clase predicha
+        self.confusion = np.zeros((2, 2), dtype=np.int64)
+        # Filas: clase real; columnas: cubo de la probabilidad de la clase 1
+        self.histograma = np.zeros((2, cubos_roc), dtype=np.int64)
+        self.calibracion_n = np.zeros(cubos_calibracion, dtype=np.int64)
+        self.calibracion_probabilidad = np.zeros(cubos_calibracion)
+        self.calibracion_positivos = np.zeros(cubos_calibracion, dtype=np.int64)
+        self.suma_brier = 0.0
+        self.suma_log_loss = 0.0
+
+    @staticmethod
+    def _cubos(probabilidad: np.ndarray, cubos: int) -> np.ndarray:
+        return np.minimum((probabilidad * cubos).astype(np.intp), cubos - 1)
+
+    def acumular(self, etiquetas: np.ndarray, probas: np.ndarray):
+        """Suma un bloque: índices de clase reales (0/1) y su salida de predict_proba"""
+        if len(etiquetas) == 0:
+            return
+        probabilidad = probas[:, 1]
+        prediccion = probas.argmax(axis=1)
+        self.confusion += np.bincount(etiquetas * 2 + prediccion, minlength=4).reshape(2, 2)
+
+        cubos = self._cubos(probabilidad, self.cubos_roc)
+        self.histograma += np.bincount(
+            etiquetas * self.cubos_roc + cubos, minlength=2 * self.cubos_roc
+        ).reshape(2, self.cubos_roc)
+
+        cubos = self._cubos(probabilidad, self.cubos_calibracion)
+        self.calibracion_n += np.bincount(cubos, minlength=self.cubos_calibracion)
+        self.calibracion_probabilidad += np.bincount(cubos, weights=probabilidad, minlength=self.cubos_calibracion)
+        self.calibracion_positivos += np.bincount(cubos, weights=etiquetas, minlength=self.cubos_calibracion).astype(np.int64)
+
+        self.suma_brier += float(np.sum((probabilidad - etiquetas) ** 2))
+        recortada = np.clip(probabilidad, 1e-15, 1 - 1e-15)
+        self.suma_log_loss -= float(np.sum(np.where(etiquetas == 1, np.log(recortada), np.log1p(-recortada))))
+
+    def combinar(self, otro: "AcumuladorBinario"):
+        """Suma los contadores de otro acumulador con los mismos cubos"""
+        self.confusion += otro.confusion
+        self.histograma += otro.histograma
+        self.calibracion_n += otro.calibracion_n
+        self.calibracion_probabilidad += otro.calibracion_probabilidad
+        self.calibracion_positivos += otro.calibracion_positivos
+        self.suma_brier += otro.suma_brier
+        self.suma_log_loss += otro.suma_log_loss
+
+    @property
+    def n(self) -> int:
+        return int(self.confusion.sum())
+
+    def roc_auc(self) -> Optional[float]:
+        """ROC-AUC del histograma: los empates dentro de un cubo cuentan como medio acierto"""
+        negativos, positivos = self.histograma.astype(np.float64)
+        total_positivos, total_negativos = positivos.sum(), negativos.sum()
+        if total_positivos == 0 or total_negativos == 0:
+            return None
+        negativos_debajo = np.cumsum(negativos) - negativos
+        return float(np.sum(positivos * (negativos_debajo + 0.5 * negativos)) / (total_positivos * total_negativos))
+
+    def informe(self) -> Dict[str, Any]:
+        (vn, fp), (fn, vp) = self.confusion.tolist()
+        n = self.n
+
+        def cociente(a: float, b: float) -> Optional[float]:
+            return a / b if b else None
+
+        calibracion = []
+        ece = 0.0
+        for i in range(self.cubos_calibracion):
+            m = int(self.calibracion_n[i])
+            media = cociente(float(self.calibracion_probabilidad[i]), m)
+            frecuencia = cociente(int(self.calibracion_positivos[i]), m)
+            if m:
+                ece += m / n * abs(media - frecuencia)
+            calibracion.append({
+                "desde": i / self.cubos_calibracion,
+                "hasta": (i + 1) / self.cubos_calibracion,
+                "n": m,
+                "probabilidad_media": media,
+                "frecuencia_positivos": frecuencia,
+            })
+
+        return {
+            "n": n,
+            "exactitud": cociente(vp + vn, n),
+            "sensibilidad": cociente(vp, vp + fn),
+            "especificidad": cociente(vn, vn + fp),
+            "precision": cociente(vp, vp + fp),
+            "f1": cociente(2 * vp, 2 * vp + fp + fn),
+            "roc_auc": self.roc_auc(),
+            "brier": cociente(self.suma_brier, n),
+            "log_loss": cociente(self.suma_log_loss, n),
+            "matriz_confusion": self.confusion.tolist(),
+            "calibracion": calibracion,
+            "ece": ece if n else None,
+        }
+
+
+def _clave_etiqueta(valor) -> Optional[str]:
+    if valor is None:
+        return None
+    if isinstance(valor, (float, np.floating)):
+        if np.isnan(valor):
+            return None
+        if float(valor).is_integer():
+            valor = int(valor)
+    return str(valor).strip()
+
+
+def codificar_etiquetas(clases: Sequence, valores: Sequence) -> np.ndarray:
+    """Índice de clase de cada etiqueta, -1 si falta o no es una clase del modelo"""
+    indices = {_clave_etiqueta(clase): i for i, clase in enumerate(clases)}
+    return np.fromiter((indices.get(_clave_etiqueta(v), -1) for v in valores), dtype=np.intp, count=len(valores))
+
+
+def evaluar_bloque(registro: ModelRegistry, columnas: Mapping[str, Sequence],
+                   objetivo: str = OBJETIVO) -> Tuple[Dict[str, AcumuladorBinario], int]:
+    """
+    Puntúa un bloque etiquetado con ambos bundles.
+
+    Returns:
+        Acumuladores por evaluación (EVALUACIONES) y número de filas del bloque
+
+    Raises:
+        ValueError: Si faltan columnas o algún modelo no es binario
+    """
+    faltan = [c for c in [*CAMPOS_CATEGORICOS, objetivo] if c not in columnas]
+    if faltan:
+        raise ValueError(f"Faltan columnas obligatorias: {faltan}")
+    n = len(columnas[objetivo])
+
+    latitud = longitud = None
+    if "latitud" in columnas and "longitud" in columnas:
+        latitud = columna_numerica(columnas, "latitud", n)
+        longitud = columna_numerica(columnas, "longitud", n)
+    distrito = columna_numerica(columnas, "cod_distrito", n)
+    usa_distrito, usa_coordenadas, x, y = enrutar_ubicacion(
+        distrito, columna_numerica(columnas, "coordenada_x_utm", n), columna_numerica(columnas, "coordenada_y_utm", n),
+        latitud, longitud
+    )
+    categorias = {c: np.asarray(categorias_columna(c, columnas[c]), dtype=object) for c in CAMPOS_CATEGORICOS}
+
+    acumuladores = {nombre: AcumuladorBinario() for nombre in EVALUACIONES}
+    for nombre, disponible, enrutada, numericas in (
+        ("distrito", usa_distrito, usa_distrito, {"cod_distrito": distrito}),
+        ("coordenadas", ~np.isnan(x) & ~np.isnan(y), usa_coordenadas, {"coordenada_x_utm": x, "coordenada_y_utm": y}),
+    ):
+        bundle = registro.get(nombre)
+        if len(bundle.label_encoder.classes_) != 2:
+            raise ValueError(f"El modelo {nombre} no es binario")
+        etiquetas = codificar_etiquetas(bundle.label_encoder.classes_, columnas[objetivo])
+        mascara = disponible & (etiquetas >= 0)
+        m = int(mascara.sum())
+        if m == 0:
+            continue
+
+        sub = {c: v[mascara] for c, v in categorias.items()}
+        sub.update({c: v[mascara] for c, v in numericas.items()})
+        probas = predecir_proba_columnas(bundle, sub, m)
+        acumuladores[nombre].acumular(etiquetas[mascara], probas)
+        # Filas que la API enviaría a este bundle
+        api = enrutada[mascara]
+        acumuladores["api"].acumular(etiquetas[mascara][api], probas[api])
+
+    return acumuladores, n
+
+
+def info_modelos(registro: ModelRegistry) -> Dict[str, Dict[str, Any]]:
+    """Versión, huella y clases de los bundles evaluados"""
+    info = {}
+    for nombre in VARIANTES:
+        bundle = registro.get(nombre)
+        info[nombre] = {
+            "version": bundle.etiqueta,
+            "huella": bundle.version,
+            "clases": [_clave_etiqueta(c) for c in bundle.label_encoder.classes_],
+        }
+    return info
+
+
+# Registro de modelos de cada proceso de evaluación
+_registro: Optional[ModelRegistry] = None
+
+
+def _iniciar_proceso(nthread: Optional[int], runtime: str, version: Optional[str]):
+    global _registro
+    _registro = ModelRegistry(nthread=nthread, runtime=runtime)
+    for nombre in VARIANTES:
+        if version is None:
+            _registro.get(nombre)
+        else:
+            _registro.recargar(nombre, version, filas_calentamiento=0)
+
+
+def _evaluar(columnas: Mapping[str, Sequence], objetivo: str):
+    return evaluar_bloque(_registro, columnas, objetivo)
+
+
+def _info():
+    return info_modelos(_registro)
+
+
+def evaluar_fichero(entrada: str, objetivo: str = OBJETIVO, procesos: int = 1,
+                    tam_bloque: int = TAM_BLOQUE, nthread: Optional[int] = None,
+                    runtime: str = RUNTIME, version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Evalúa un fichero etiquetado completo. Con varios procesos, cada uno
+    carga los bundles una vez y se mantienen como mucho dos bloques en vuelo
+    por proceso.
+
+    Returns:
+        Informe con las métricas de cada evaluación y los modelos evaluados
+    """
+    totales = {nombre: AcumuladorBinario() for nombre in EVALUACIONES}
+    filas = 0
+    inicio = time.perf_counter()
+    columnas_leidas = set(CAMPOS_CATEGORICOS) | set(COLUMNAS_UBICACION) | {objetivo}
+
+    def sumar(resultado: Tuple[Dict[str, AcumuladorBinario], int]):
+        nonlocal filas
+        parciales, n = resultado
+        for nombre, acumulador in parciales.items():
+            totales[nombre].combinar(acumulador)
+        filas += n
+        logger.info(f"{filas} filas evaluadas ({filas / (time.perf_counter() - inicio):,.0f} filas/s)")
+
+    bloques = (
+        {c: v for c, v in columnas.items() if c in columnas_leidas}
+        for columnas in leer_bloques(entrada, tam_bloque)
+    )
+    if procesos <= 1:
+        _iniciar_proceso(nthread, runtime, version)
+        modelos = _info()
+        for columnas in bloques:
+            sumar(_evaluar(columnas, objetivo))
+    else:
+        with ProcessPoolExecutor(procesos, initializer=_iniciar_proceso,
+                                 initargs=(nthread, runtime, version)) as pool:
+            modelos = pool.submit(_info).result()
+            pendientes = set()
+            for columnas in bloques:
+                if len(pendientes) >= 2 * procesos:
+                    terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    for futuro in terminados:
+                        sumar(futuro.result())
+                pendientes.add(pool.submit(_evaluar, columnas, objetivo))
+            for futuro in wait(pendientes).done:
+                sumar(futuro.result())
+
+    return {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "fichero": os.path.basename(entrada),
+        "objetivo": objetivo,
+        "filas": filas,
+        "duracion_s": round(time.perf_counter() - inicio, 2),
+        "procesos": procesos,
+        "runtime": runtime,
+        "clase_positiva": modelos[VARIANTES[0]]["clases"][1],
+        "modelos": modelos,
+        "metricas": {nombre: acumulador.informe() for nombre, acumulador in totales.items()},
+    }
+
+
+def ruta_informe(directorio: Path) -> Path:
+    """Ruta del informe de evaluación de una versión de modelos"""
+    return Path(directorio) / NOMBRE_INFORME
+
+
+def guardar_informe(informe: Dict[str, Any], ruta: Path) -> Path:
+    """Escribe el informe de forma atómica"""
+    ruta = Path(ruta)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=f".{ruta.name}.")
+    with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+_informes: Dict[Path, Tuple[int, Dict[str, Any]]] = {}
+_lock_informes = threading.Lock()
+
+
+def cargar_informe(ruta: Path) -> Optional[Dict[str, Any]]:
+    """Informe de evaluación, releído solo si el fichero cambia (None si no existe)"""
+    ruta = Path(ruta)
+    try:
+        modificado = ruta.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _lock_informes:
+        guardado = _informes.get(ruta)
+        if guardado is not None and guardado[0] == modificado:
+            return guardado[1]
+    with open(ruta, encoding="utf-8") as f:
+        informe = json.load(f)
+    with _lock_informes:
+        _informes[ruta] = (modificado, informe)
+    return informe
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Evalúa los modelos sobre un fichero CSV/Parquet etiquetado")
+    parser.add_argument("entrada", help="Fichero .csv o .parquet con las variables de entrada y la etiqueta")
+    parser.add_argument("--objetivo", default=OBJETIVO, help="Columna con la etiqueta real")
+    parser.add_argument("--procesos", type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument("--bloque", type=int, default=TAM_BLOQUE, help="Filas por bloque")
+    parser.add_argument("--version", default=None, help="Versión de modelos a evaluar (por defecto, la activa)")
+    parser.add_argument("--salida", default=None, help=f"Ruta del informe (por defecto, {NOMBRE_INFORME} de la versión)")
+    args = parser.parse_args()
+
+    from servidor import hilos_por_worker
+
+    registro = ModelRegistry()
+    version = args.version or registro.version_configurada()
+    informe = evaluar_fichero(
+        args.entrada, args.objetivo, args.procesos, args.bloque,
+        nthread=hilos_por_worker(args.procesos), version=args.version,
+    )
+    ruta = guardar_informe(informe, Path(args.salida) if args.salida else ruta_informe(registro.directorio_version(version)))
+    for nombre, metricas in informe["metricas"].items():
+        if metricas["n"]:
+            logger.info(f"{nombre:12s} n={metricas['n']}  exactitud {metricas['exactitud']:.4f}  "
+                        f"roc_auc {metricas['roc_auc'] or float('nan'):.4f}  ece {metricas['ece']:.4f}")
+    logger.info(f"Informe guardado en {ruta}")
@@ -0,0 +1,114 @@
+"""
+Formato binario columnar (Arrow IPC) para clientes de alto volumen.
+
+Una petición es un stream Arrow IPC con una fila por accidente y las mismas
+columnas que InputData. Las variables categóricas pueden ser texto, texto
+diccionario o códigos enteros del vocabulario compartido; las de ubicación,
+cualquier tipo numérico con nulos para los valores ausentes. El cuerpo se
+decodifica con pyarrow directamente en arrays NumPy (códigos enteros y
+float64) que la ruta compilada convierte en la matriz del modelo, sin crear
+un objeto Python por fila.
+
+La respuesta es otro stream Arrow IPC con las columnas prediction (int64),
+probability (float64), modelo y error (diccionarios), en el orden de entrada.
+Las categorías nulas o fuera del vocabulario se puntúan como desconocidas y
+los códigos enteros fuera de rango son un error de fila, igual que en
+/predict/stream; las filas que no se pueden predecir llevan
+prediction, probability y modelo nulos y el motivo en error.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from vocabulario import CAMPOS_CATEGORICOS, CODIGO_INVALIDO, VOCABULARIO
+
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+
+COLUMNAS_NUMERICAS = ("cod_distrito", "coordenada_x_utm", "coordenada_y_utm", "latitud", "longitud")
+
+# Vocabulario como arrays Arrow, para buscar los códigos con index_in
+_VALORES = {campo: pa.array(categorias, type=pa.string()) for campo, categorias in VOCABULARIO.items()}
+
+
+def leer_tabla(cuerpo: bytes) -> pa.Table:
+    """Lee un cuerpo Arrow IPC (stream) sin copiar los buffers"""
+    with pa.ipc.open_stream(pa.py_buffer(cuerpo)) as lector:
+        return lector.read_all()
+
+
+def _codigos_trozo(trozo: pa.Array, campo: str) -> np.ndarray:
+    if pa.types.is_dictionary(trozo.type):
+        # Se busca cada valor del diccionario una sola vez y se indexa
+        codigos_diccionario = _codigos_trozo(trozo.dictionary, campo)
+        indices = pc.cast(trozo.indices, pa.int64()).fill_null(-1).to_numpy().astype(np.intp)
+        return np.append(codigos_diccionario, -1)[indices]
+
+    if pa.types.is_integer(trozo.type):
+        codigos = pc.cast(trozo, pa.int64()).fill_null(-1).to_numpy().astype(np.intp)
+        invalidos = (codigos < 0) | (codigos >= len(VOCABULARIO[campo]))
+        codigos[invalidos] = CODIGO_INVALIDO
+        # Los nulos siguen siendo categoría desconocida
+        codigos[pc.is_null(trozo).to_numpy(zero_copy_only=False)] = -1
+        return codigos
+
+    if pa.types.is_string(trozo.type) or pa.types.is_large_string(trozo.type):
+        codigos = pc.index_in(trozo, value_set=_VALORES[campo])
+        return codigos.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.intp)
+
+    raise ValueError(f"Tipo no soportado para '{campo}': {trozo.type}")
+
+
+def codigos_columna(columna: pa.ChunkedArray, campo: str) -> np.ndarray:
+    """
+    Códigos del vocabulario de una columna categórica (-1 = desconocida o
+    nula, CODIGO_INVALIDO = código entero fuera de rango)
+    """
+    if columna.num_chunks == 0:
+        return np.empty(0, dtype=np.intp)
+    return np.concatenate([_codigos_trozo(trozo, campo) for trozo in columna.chunks])
+
+
+def numerica_columna(columna: pa.ChunkedArray, nombre: str) -> np.ndarray:
+    """Columna numérica como float64, con NaN en los nulos"""
+    if not (pa.types.is_integer(columna.type) or pa.types.is_floating(columna.type)):
+        raise ValueError(f"La columna '{nombre}' debe ser numérica, no {columna.type}")
+    flotante = pc.cast(columna, pa.float64())
+    return flotante.fill_null(np.nan).to_numpy()
+
+
+def decodificar(tabla: pa.Table) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray], int]:
+    """
+    Convierte una tabla de petición en los arrays que consume
+    puntuar_codigos: códigos de las categóricas y numéricas float64.
+
+    Raises:
+        ValueError: Si faltan columnas categóricas o alguna tiene un tipo no soportado
+    """
+    faltan = [c for c in CAMPOS_CATEGORICOS if c not in tabla.column_names]
+    if faltan:
+        raise ValueError(f"Faltan columnas obligatorias: {faltan}")
+    codigos = {c: codigos_columna(tabla.column(c), c) for c in CAMPOS_CATEGORICOS}
+    numericas = {
+        c: numerica_columna(tabla.column(c), c)
+        for c in COLUMNAS_NUMERICAS if c in tabla.column_names
+    }
+    return codigos, numericas, tabla.num_rows
+
+
+def codificar_resultado(resultado: Dict[str, np.ndarray]) -> bytes:
+    """Serializa el resultado de puntuar_codigos como stream Arrow IPC"""
+    fallidas = resultado["prediction"] < 0
+    modelos = np.where(fallidas, "", resultado["modelo"]).astype(str)
+    lote = pa.record_batch([
+        pa.array(resultado["prediction"], mask=fallidas, type=pa.int64()),
+        pa.array(resultado["probability"], mask=fallidas, type=pa.float64()),
+        pa.array(modelos, mask=fallidas, type=pa.string()).dictionary_encode(),
+        pa.array(resultado["error"], type=pa.string()).dictionary_encode(),
+    ], names=["prediction", "probability", "modelo", "error"])
+
+    salida = pa.BufferOutputStream()
+    with pa.ipc.new_stream(salida, lote.schema) as escritor:
+        escritor.write_batch(lote)
+    return salida.getvalue().to_pybytes()
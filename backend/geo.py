@@ -0,0 +1,410 @@
+"""
+Utilidades geoespaciales: proyección WGS84 <-> UTM 30N e índice de distritos.
+
+La proyección usa las series de Krüger (precisión submilimétrica dentro del
+huso) y funciona tanto con escalares como con arrays de NumPy. ETRS89, el
+datum de las coordenadas UTM de los datos de accidentes, coincide con WGS84 a
+efectos de estos modelos.
+
+El índice de distritos se construye a partir de un fichero GeoJSON local con
+los 21 distritos de Madrid (por defecto `modelos/geo/distritos.geojson`, o la
+variable de entorno DISTRITOS_GEOJSON), en coordenadas geográficas o UTM 30N.
+El fichero se genera una vez con --construir a partir de los límites
+de distritos que publica el Ayuntamiento de Madrid en su portal de datos
+abiertos (conjunto "Distritos municipales de Madrid", ETRS89). Si la descarga
+es un Shapefile, se convierte antes a GeoJSON, p. ej. con
+    ogr2ogr -f GeoJSON distritos_descargados.geojson Distritos.shp
+--construir comprueba que están los 21 distritos, normaliza las propiedades
+a cod_distrito y nombre y escribe el fichero en su ruta. Sin él, la API
+arranca igual pero /geo/localizar no devuelve distrito.
+Las aristas de todos los polígonos se empaquetan en arrays contiguos y se
+indexan con una rejilla regular: las celdas que no cruza ninguna frontera
+guardan directamente el distrito y solo los puntos de celdas frontera se
+resuelven con el test de cruces (par-impar) contra las aristas de su fila.
+
+Uso (desde cualquier directorio):
+    python backend/geo.py --construir distritos_descargados.geojson
+    python backend/geo.py 40.4168 -3.7038
+"""
+import argparse
+import json
+import logging
+import math
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RUTA_DISTRITOS = Path(os.getenv(
+    "DISTRITOS_GEOJSON", Path(__file__).resolve().parent.parent / "modelos" / "geo" / "distritos.geojson"
+))
+
+# Propiedades del GeoJSON en las que se busca el código y el nombre del distrito
+PROPIEDADES_CODIGO = ("cod_distrito", "COD_DIS", "CODDISTRIT", "coddistrit", "COD_DIS_TX", "codigo")
+PROPIEDADES_NOMBRE = ("nombre", "NOMBRE", "NOM_DIS", "distrito")
+
+NUM_DISTRITOS = 21
+
+# Elipsoide WGS84 / GRS80 y parámetros UTM
+SEMIEJE = 6378137.0
+APLANAMIENTO = 1 / 298.257223563
+K0 = 0.9996
+FALSO_ESTE = 500000.0
+HUSO_MADRID = 30
+
+_N = APLANAMIENTO / (2 - APLANAMIENTO)
+_A = SEMIEJE / (1 + _N) * (1 + _N ** 2 / 4 + _N ** 4 / 64)
+_E = math.sqrt(APLANAMIENTO * (2 - APLANAMIENTO))
+_ALFA = (
+    _N / 2 - 2 * _N ** 2 / 3 + 5 * _N ** 3 / 16,
+    13 * _N ** 2 / 48 - 3 * _N ** 3 / 5,
+    61 * _N ** 3 / 240,
+)
+_BETA = (
+    _N / 2 - 2 * _N ** 2 / 3 + 37 * _N ** 3 / 96,
+    _N ** 2 / 48 + _N ** 3 / 15,
+    17 * _N ** 3 / 480,
+)
+
+# Las mismas fórmulas sirven para escalares (math, sin la sobrecarga de NumPy
+# en valores sueltos) y para arrays (NumPy)
+_MATH = SimpleNamespace(
+    sin=math.sin, cos=math.cos, sinh=math.sinh, cosh=math.cosh, atanh=math.atanh,
+    atan2=math.atan2, atan=math.atan, sqrt=math.sqrt, radians=math.radians, degrees=math.degrees,
+)
+_NUMPY = SimpleNamespace(
+    sin=np.sin, cos=np.cos, sinh=np.sinh, cosh=np.cosh, atanh=np.arctanh,
+    atan2=np.arctan2, atan=np.arctan, sqrt=np.sqrt, radians=np.radians, degrees=np.degrees,
+)
+
+
+def _funciones(*valores):
+    if all(isinstance(v, (int, float)) for v in valores):
+        return _MATH, valores
+    return _NUMPY, tuple(np.asarray(v, dtype=np.float64) for v in valores)
+
+
+def meridiano_central(huso: int) -> float:
+    return huso * 6.0 - 183.0
+
+
+def wgs84_a_utm(latitud, longitud, huso: int = HUSO_MADRID):
+    """
+    Proyecta latitud/longitud (grados) a UTM del huso indicado (hemisferio norte).
+
+    Returns:
+        (x, y) en metros, escalares o arrays según la entrada
+    """
+    m, (latitud, longitud) = _funciones(latitud, longitud)
+    phi = m.radians(latitud)
+    lam = m.radians(longitud - meridiano_central(huso))
+
+    sen_phi = m.sin(phi)
+    t = m.sinh(m.atanh(sen_phi) - _E * m.atanh(_E * sen_phi))
+    xi = m.atan2(t, m.cos(lam))
+    eta = m.atanh(m.sin(lam) / m.sqrt(1 + t * t))
+
+    x, y = eta, xi
+    for j, alfa in enumerate(_ALFA, start=1):
+        x = x + alfa * m.cos(2 * j * xi) * m.sinh(2 * j * eta)
+        y = y + alfa * m.sin(2 * j * xi) * m.cosh(2 * j * eta)
+    return FALSO_ESTE + K0 * _A * x, K0 * _A * y
+
+
+def utm_a_wgs84(x, y, huso: int = HUSO_MADRID):
+    """
+    Inversa de wgs84_a_utm.
+
+    Returns:
+        (latitud, longitud) en grados
+    """
+    m, (x, y) = _funciones(x, y)
+    xi = y / (K0 * _A)
+    eta = (x - FALSO_ESTE) / (K0 * _A)
+
+    xi_p, eta_p = xi, eta
+    for j, beta in enumerate(_BETA, start=1):
+        xi_p = xi_p - beta * m.sin(2 * j * xi) * m.cosh(2 * j * eta)
+        eta_p = eta_p - beta * m.cos(2 * j * xi) * m.sinh(2 * j * eta)
+
+    sinh_eta, cos_xi = m.sinh(eta_p), m.cos(xi_p)
+    tau_p = m.sin(xi_p) / m.sqrt(sinh_eta * sinh_eta + cos_xi * cos_xi)
+    lam = m.atan2(sinh_eta, cos_xi)
+
+    # Newton sobre tau = tan(phi); converge en 2-3 iteraciones
+    tau = tau_p
+    for _ in range(4):
+        raiz_tau = m.sqrt(1 + tau * tau)
+        sigma = m.sinh(_E * m.atanh(_E * tau / raiz_tau))
+        tau_i = tau * m.sqrt(1 + sigma * sigma) - sigma * raiz_tau
+        tau = tau + (tau_p - tau_i) / m.sqrt(1 + tau_i * tau_i) * (
+            (1 + (1 - _E ** 2) * tau * tau) / ((1 - _E ** 2) * raiz_tau)
+        )
+    return m.degrees(m.atan(tau)), m.degrees(lam) + meridiano_central(huso)
+
+
+class IndiceDistritos:
+    """
+    Índice punto-en-polígono de los distritos en coordenadas UTM.
+
+    Args:
+        poligonos: {codigo: [anillos]}, cada anillo un array (k, 2) de
+            coordenadas UTM (los huecos y multipolígonos se tratan con la
+            regla par-impar)
+        nombres: {codigo: nombre}
+        tam_celda: Lado de las celdas de la rejilla en metros
+    """
+
+    def __init__(self, poligonos: Dict[int, List[np.ndarray]], nombres: Optional[Dict[int, str]] = None,
+                 tam_celda: float = 250.0):
+        self.nombres = nombres or {}
+        self.codigos = np.array(sorted(poligonos), dtype=np.int64)
+        self.tam_celda = float(tam_celda)
+
+        # Aristas empaquetadas: (x0, y0, x1, y1) y posición del distrito en self.codigos
+        aristas, distrito = [], []
+        for posicion, codigo in enumerate(self.codigos):
+            for anillo in poligonos[int(codigo)]:
+                anillo = np.asarray(anillo, dtype=np.float64)
+                if not np.array_equal(anillo[0], anillo[-1]):
+                    anillo = np.vstack([anillo, anillo[:1]])
+                aristas.append(np.hstack([anillo[:-1], anillo[1:]]))
+                distrito.append(np.full(len(anillo) - 1, posicion, dtype=np.int64))
+        aristas = np.vstack(aristas)
+        # Las aristas horizontales nunca cruzan el rayo horizontal
+        no_horizontales = aristas[:, 1] != aristas[:, 3]
+        self.aristas = np.ascontiguousarray(aristas[no_horizontales])
+        self.distrito_arista = np.concatenate(distrito)[no_horizontales]
+
+        todos = np.vstack([np.asarray(a) for anillos in poligonos.values() for a in anillos])
+        self.x0, self.y0 = todos.min(axis=0) - self.tam_celda
+        x1, y1 = todos.max(axis=0) + self.tam_celda
+        self.nx = int(math.ceil((x1 - self.x0) / self.tam_celda))
+        self.ny = int(math.ceil((y1 - self.y0) / self.tam_celda))
+
+        self._indexar_filas()
+        self._clasificar_celdas()
+
+    def _indexar_filas(self):
+        # Aristas que atraviesan cada franja horizontal de la rejilla (formato CSR)
+        ymin = np.minimum(self.aristas[:, 1], self.aristas[:, 3])
+        ymax = np.maximum(self.aristas[:, 1], self.aristas[:, 3])
+        primera = np.floor((ymin - self.y0) / self.tam_celda).astype(np.int64)
+        ultima = np.floor((ymax - self.y0) / self.tam_celda).astype(np.int64)
+        cuantas = ultima - primera + 1
+        indices = np.repeat(np.arange(len(self.aristas)), cuantas)
+        filas = np.repeat(primera, cuantas) + (np.arange(cuantas.sum()) - np.repeat(np.cumsum(cuantas) - cuantas, cuantas))
+        orden = np.argsort(filas, kind="stable")
+        self._aristas_fila = indices[orden]
+        self._inicio_fila = np.searchsorted(filas[orden], np.arange(self.ny + 1))
+
+    def _clasificar_celdas(self):
+        # Celdas que toca alguna frontera: se muestrea cada arista a paso
+        # inferior a media celda y se dilata una celda por seguridad
+        frontera = np.zeros((self.ny, self.nx), dtype=bool)
+        x0, y0, x1, y1 = self.aristas.T
+        longitud = np.hypot(x1 - x0, y1 - y0)
+        pasos = np.maximum(1, np.ceil(longitud / (self.tam_celda / 4)).astype(np.int64))
+        arista = np.repeat(np.arange(len(self.aristas)), pasos + 1)
+        t = (np.arange(arista.size) - np.repeat(np.cumsum(pasos + 1) - (pasos + 1), pasos + 1)) / np.repeat(pasos, pasos + 1)
+        columnas = ((x0[arista] + t * (x1 - x0)[arista] - self.x0) // self.tam_celda).astype(np.int64)
+        filas = ((y0[arista] + t * (y1 - y0)[arista] - self.y0) // self.tam_celda).astype(np.int64)
+        for df in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                f = np.clip(filas + df, 0, self.ny - 1)
+                c = np.clip(columnas + dc, 0, self.nx - 1)
+                frontera[f, c] = True
+
+        # El resto de celdas tienen un único distrito (o ninguno): se
+        # clasifica su centro con el test exacto
+        self.celdas = np.full((self.ny, self.nx), -1, dtype=np.int64)
+        filas_i, columnas_i = np.nonzero(~frontera)
+        centros_x = self.x0 + (columnas_i + 0.5) * self.tam_celda
+        centros_y = self.y0 + (filas_i + 0.5) * self.tam_celda
+        self.celdas[filas_i, columnas_i] = self._test_cruces(centros_x, centros_y, filas_i)
+        self.fraccion_frontera = float(frontera.mean())
+
+    def _test_cruces(self, x: np.ndarray, y: np.ndarray, filas: np.ndarray) -> np.ndarray:
+        """Código de distrito (0 si ninguno) por regla par-impar, agrupando por fila"""
+        resultado = np.zeros(len(x), dtype=np.int64)
+        orden = np.argsort(filas, kind="stable")
+        filas_ordenadas = filas[orden]
+        limites = np.flatnonzero(np.diff(filas_ordenadas)) + 1
+        for grupo in np.split(orden, limites):
+            if grupo.size == 0:
+                continue
+            fila = filas[grupo[0]]
+            aristas = self._aristas_fila[self._inicio_fila[fila]:self._inicio_fila[fila + 1]]
+            if aristas.size == 0:
+                continue
+            ex0, ey0, ex1, ey1 = self.aristas[aristas].T
+            px, py = x[grupo, None], y[grupo, None]
+            cruza = ((ey0 > py) != (ey1 > py)) & (px < ex0 + (py - ey0) * (ex1 - ex0) / (ey1 - ey0))
+            # Cruces por distrito: una columna por distrito presente en la fila
+            presentes, posicion = np.unique(self.distrito_arista[aristas], return_inverse=True)
+            cruces = np.zeros((grupo.size, presentes.size), dtype=np.int64)
+            for k in range(presentes.size):
+                cruces[:, k] = cruza[:, posicion == k].sum(axis=1)
+            dentro = cruces % 2 == 1
+            hay = dentro.any(axis=1)
+            resultado[grupo[hay]] = self.codigos[presentes[dentro[hay].argmax(axis=1)]]
+        return resultado
+
+    def distrito(self, x, y) -> np.ndarray:
+        """Código de distrito de cada punto UTM (0 si está fuera de todos)"""
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        columnas = np.floor((x - self.x0) / self.tam_celda)
+        filas = np.floor((y - self.y0) / self.tam_celda)
+        validas = np.isfinite(columnas) & np.isfinite(filas) & \
+            (columnas >= 0) & (columnas < self.nx) & (filas >= 0) & (filas < self.ny)
+
+        resultado = np.zeros(x.shape, dtype=np.int64)
+        f, c = filas[validas].astype(np.int64), columnas[validas].astype(np.int64)
+        resultado[validas] = self.celdas[f, c]
+
+        dudosos = np.flatnonzero(resultado < 0)
+        if dudosos.size:
+            resultado[dudosos] = self._test_cruces(x[dudosos], y[dudosos], filas[dudosos].astype(np.int64))
+        return resultado
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "distritos": len(self.codigos),
+            "aristas": len(self.aristas),
+            "rejilla": [self.ny, self.nx],
+            "tam_celda_m": self.tam_celda,
+            "fraccion_celdas_frontera": round(self.fraccion_frontera, 4),
+        }
+
+    @classmethod
+    def desde_geojson(cls, ruta: Path = RUTA_DISTRITOS, tam_celda: float = 250.0) -> "IndiceDistritos":
+        """Construye el índice desde un GeoJSON (en grados WGS84/ETRS89 o en UTM 30N)"""
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+
+        poligonos: Dict[int, List[np.ndarray]] = {}
+        nombres: Dict[int, str] = {}
+        for elemento in datos["features"]:
+            codigo, nombre = _codigo_nombre(elemento, ruta)
+            if nombre:
+                nombres[codigo] = str(nombre)
+
+            geometria = elemento["geometry"]
+            partes = geometria["coordinates"] if geometria["type"] == "MultiPolygon" else [geometria["coordinates"]]
+            for parte in partes:
+                for anillo in parte:
+                    poligonos.setdefault(codigo, []).append(np.asarray(anillo, dtype=np.float64)[:, :2])
+
+        # Coordenadas en grados: se proyectan a UTM 30N
+        if max(np.abs(a).max() for anillos in poligonos.values() for a in anillos) <= 180:
+            for anillos in poligonos.values():
+                for i, anillo in enumerate(anillos):
+                    anillos[i] = np.column_stack(wgs84_a_utm(anillo[:, 1], anillo[:, 0]))
+
+        indice = cls(poligonos, nombres, tam_celda)
+        logger.info(f"Índice de distritos cargado desde {ruta}: {indice.info()}")
+        return indice
+
+    @classmethod
+    def cargar(cls, ruta: Path = RUTA_DISTRITOS) -> Optional["IndiceDistritos"]:
+        """Carga el índice si existe el fichero de distritos; si no, devuelve None"""
+        if not Path(ruta).exists():
+            logger.warning(f"No hay fichero de distritos en {ruta}: la localización de distritos no está "
+                           f"disponible (genérelo con 'python backend/geo.py --construir <geojson>')")
+            return None
+        return cls.desde_geojson(Path(ruta))
+
+
+def _codigo_nombre(elemento: Dict[str, Any], ruta) -> Tuple[int, Optional[str]]:
+    """Código y nombre de distrito de un elemento GeoJSON"""
+    propiedades = elemento.get("properties") or {}
+    clave = next((p for p in PROPIEDADES_CODIGO if propiedades.get(p) not in (None, "")), None)
+    if clave is None:
+        raise ValueError(f"Distrito sin código en {ruta}; se espera una de las propiedades {PROPIEDADES_CODIGO}")
+    nombre = next((propiedades[p] for p in PROPIEDADES_NOMBRE if propiedades.get(p)), None)
+    return int(propiedades[clave]), None if nombre is None else str(nombre)
+
+
+def construir(entrada: Path, salida: Path = RUTA_DISTRITOS) -> IndiceDistritos:
+    """
+    Normaliza un GeoJSON de distritos descargado y lo guarda en `salida`:
+    propiedades cod_distrito y nombre, geometrías sin cambios.
+
+    Raises:
+        ValueError: Si no contiene exactamente los distritos 1 a NUM_DISTRITOS
+            o algún elemento no es un polígono
+    """
+    with open(entrada, encoding="utf-8") as f:
+        datos = json.load(f)
+
+    elementos = []
+    for elemento in datos["features"]:
+        codigo, nombre = _codigo_nombre(elemento, entrada)
+        geometria = elemento.get("geometry") or {}
+        if geometria.get("type") not in ("Polygon", "MultiPolygon"):
+            raise ValueError(f"El distrito {codigo} de {entrada} no es un polígono: {geometria.get('type')}")
+        elementos.append({
+            "type": "Feature",
+            "properties": {"cod_distrito": codigo, "nombre": nombre},
+            "geometry": geometria,
+        })
+
+    codigos = {e["properties"]["cod_distrito"] for e in elementos}
+    esperados = set(range(1, NUM_DISTRITOS + 1))
+    if codigos != esperados:
+        raise ValueError(f"{entrada} no contiene los {NUM_DISTRITOS} distritos: faltan {sorted(esperados - codigos)}, "
+                         f"sobran {sorted(codigos - esperados)}")
+
+    salida = Path(salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": elementos}, f, ensure_ascii=False)
+    return IndiceDistritos.desde_geojson(salida)
+
+
+def localizar(latitud, longitud, indice: Optional[IndiceDistritos] = None) -> Dict[str, Any]:
+    """
+    Proyecta puntos WGS84 a UTM 30N y, si hay índice, obtiene su distrito.
+
+    Returns:
+        Dict con arrays 'coordenada_x_utm', 'coordenada_y_utm' y 'cod_distrito'
+        (0 fuera de Madrid, o None sin índice)
+    """
+    latitud = np.asarray(latitud, dtype=np.float64)
+    longitud = np.asarray(longitud, dtype=np.float64)
+    x, y = wgs84_a_utm(latitud, longitud)
+    return {
+        "coordenada_x_utm": x,
+        "coordenada_y_utm": y,
+        "cod_distrito": indice.distrito(x, y) if indice is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Proyecta un punto WGS84 a UTM 30N y obtiene su distrito")
+    parser.add_argument("latitud", type=float, nargs="?")
+    parser.add_argument("longitud", type=float, nargs="?")
+    parser.add_argument("--distritos", default=str(RUTA_DISTRITOS), help="GeoJSON de distritos")
+    parser.add_argument("--construir", type=Path, default=None,
+                        help="GeoJSON descargado con los 21 distritos; se normaliza y se guarda en --distritos")
+    args = parser.parse_args()
+
+    if args.construir is not None:
+        indice = construir(args.construir, Path(args.distritos))
+        print(f"Distritos guardados en {args.distritos}: {indice.info()}")
+        raise SystemExit(0)
+    if args.latitud is None or args.longitud is None:
+        parser.error("indique latitud y longitud, o --construir")
+
+    x, y = wgs84_a_utm(args.latitud, args.longitud)
+    print(f"UTM 30N: x={x:.2f} y={y:.2f}")
+    indice = IndiceDistritos.cargar(Path(args.distritos))
+    if indice is not None:
+        codigo = int(indice.distrito(x, y)[0])
+        print(f"Distrito: {codigo} {indice.nombres.get(codigo, '')}")
@@ -0,0 +1,297 @@
+"""
+Ruta de inferencia rápida sin pandas.
+
+Convierte un ColumnTransformer ajustado (OneHotEncoder + StandardScaler) en
+diccionarios de búsqueda que escriben directamente sobre una fila NumPy
+preasignada, y llama al booster de XGBoost sin pasar por DataFrame ni por
+sklearn. Las contribuciones de pred_contribs se devuelven por campo de
+entrada, sumando las columnas one-hot de cada categórica.
+"""
+import itertools
+import logging
+import threading
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from vocabulario import VOCABULARIO
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineCompilado:
+    """Equivalente compilado de preprocessor.transform + model.predict_proba"""
+
+    # Si contribuciones() está disponible (necesita el booster de XGBoost)
+    admite_contribuciones = True
+
+    def __init__(self, model, preprocessor, label_encoder):
+        self.n_features = max(salida.stop for salida in preprocessor.output_indices_.values())
+        self.columnas_categoricas: List[str] = []
+        self.columnas_numericas: List[str] = []
+        # Por cada columna categórica: {categoría: índice de salida}
+        self.vocabularios: Dict[str, Dict[Any, int]] = {}
+        self._medias = np.empty(0)
+        self._escalas = np.empty(0)
+        self._indices_numericos = np.empty(0, dtype=np.intp)
+
+        for nombre, transformer, columnas in preprocessor.transformers_:
+            if nombre == "remainder":
+                if transformer != "drop":
+                    raise ValueError("El preprocesador tiene columnas 'remainder' no soportadas")
+                continue
+
+            salida = preprocessor.output_indices_[nombre]
+            tipo = type(transformer).__name__
+
+            if tipo == "OneHotEncoder":
+                if transformer.drop_idx_ is not None or transformer._infrequent_enabled:
+                    raise ValueError("OneHotEncoder con 'drop' o categorías infrecuentes no soportado")
+                if transformer.handle_unknown != "ignore":
+                    raise ValueError("OneHotEncoder debe usar handle_unknown='ignore'")
+                inicio = salida.start
+                for columna, categorias in zip(columnas, transformer.categories_):
+                    self.columnas_categoricas.append(columna)
+                    self.vocabularios[columna] = {
+                        categoria: inicio + i for i, categoria in enumerate(categorias)
+                    }
+                    inicio += len(categorias)
+
+            elif tipo == "StandardScaler":
+                n = len(columnas)
+                medias = transformer.mean_ if transformer.with_mean else np.zeros(n)
+                escalas = transformer.scale_ if transformer.with_std else np.ones(n)
+                self.columnas_numericas.extend(columnas)
+                self._medias = np.concatenate([self._medias, medias])
+                self._escalas = np.concatenate([self._escalas, escalas])
+                self._indices_numericos = np.concatenate(
+                    [self._indices_numericos, np.arange(salida.start, salida.stop)]
+                )
+
+            else:
+                raise ValueError(f"Transformador no soportado en la ruta rápida: {tipo}")
+
+        self._salida_codigos = self._indices_codigos()
+
+        # Campos de entrada en el orden de las contribuciones y campo de origen
+        # de cada columna de salida, según los nombres del preprocesador
+        self.campos = self.columnas_categoricas + self.columnas_numericas
+        self._agregacion = self._matriz_campos(preprocessor.get_feature_names_out())
+
+        self.booster = model.get_booster()
+        self.missing = model.missing
+        try:
+            self.iteration_range = (0, model.best_iteration + 1)
+        except AttributeError:
+            self.iteration_range = (0, 0)
+        self.clases = label_encoder.classes_
+
+        # Fila preasignada por hilo para la inferencia de un único registro
+        self._local = threading.local()
+
+    def _indices_codigos(self) -> Dict[str, np.ndarray]:
+        # Por cada columna categórica: índice de salida de cada código del
+        # vocabulario compartido, con un -1 final para el código -1 (desconocida)
+        return {
+            columna: np.asarray(
+                [self.vocabularios[columna].get(c, -1) for c in VOCABULARIO.get(columna, ())] + [-1],
+                dtype=np.intp
+            )
+            for columna in self.columnas_categoricas
+        }
+
+    def _matriz_campos(self, nombres_salida: Sequence[str]) -> np.ndarray:
+        # Matriz (columnas de salida x campos) con un 1 en el campo de origen de
+        # cada columna: multiplicar por ella suma las columnas one-hot de cada
+        # categórica. Las columnas se toman de la disposición ajustada
+        # (output_indices_ y categories_) y se contrastan con los nombres de
+        # salida ("cat__tipo_vehiculo_Turismo", "num__cod_distrito", ...)
+        origen = np.full(self.n_features, -1, dtype=np.intp)
+        for j, columna in enumerate(self.columnas_categoricas):
+            origen[list(self.vocabularios[columna].values())] = j
+        origen[self._indices_numericos] = np.arange(len(self.columnas_numericas)) + len(self.columnas_categoricas)
+
+        for nombre, campo in zip(nombres_salida, origen):
+            if campo < 0 or not nombre.split("__", 1)[-1].startswith(self.campos[campo]):
+                raise ValueError(f"No se puede asignar la columna de salida '{nombre}' a un campo de entrada")
+
+        matriz = np.zeros((self.n_features, len(self.campos)), dtype=np.float32)
+        matriz[np.arange(self.n_features), origen] = 1.0
+        return matriz
+
+    def _fila(self) -> np.ndarray:
+        fila = getattr(self._local, "fila", None)
+        if fila is None:
+            fila = np.zeros((1, self.n_features), dtype=np.float64)
+            self._local.fila = fila
+        else:
+            fila.fill(0.0)
+        return fila
+
+    @staticmethod
+    def _numerico(valor) -> float:
+        return np.nan if valor is None else float(valor)
+
+    def codificar_fila(self, registro) -> np.ndarray:
+        """Codifica un registro (InputData o similar) en la fila preasignada del hilo"""
+        fila = self._fila()
+        for columna in self.columnas_categoricas:
+            indice = self.vocabularios[columna].get(getattr(registro, columna))
+            if indice is not None:
+                fila[0, indice] = 1.0
+        for j, columna in enumerate(self.columnas_numericas):
+            valor = self._numerico(getattr(registro, columna))
+            fila[0, self._indices_numericos[j]] = (valor - self._medias[j]) / self._escalas[j]
+        return fila
+
+    def codificar(self, registros: Sequence) -> np.ndarray:
+        """Codifica varios registros en una matriz densa, equivalente a preprocessor.transform"""
+        columnas = {
+            columna: [getattr(registro, columna) for registro in registros]
+            for columna in self.columnas_categoricas + self.columnas_numericas
+        }
+        return self.codificar_columnas(columnas, len(registros))
+
+    def codificar_columnas(self, columnas: Mapping[str, Sequence], n: int) -> np.ndarray:
+        """
+        Codifica datos organizados por columnas (listas o arrays de longitud n),
+        equivalente a preprocessor.transform sobre un DataFrame con esas columnas.
+        """
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+        filas = np.arange(n)
+        for columna in self.columnas_categoricas:
+            vocabulario = self.vocabularios[columna]
+            indices = np.fromiter((vocabulario.get(v, -1) for v in columnas[columna]), dtype=np.intp, count=n)
+            conocidas = indices >= 0
+            X[filas[conocidas], indices[conocidas]] = 1.0
+        if self.columnas_numericas:
+            numericos = np.column_stack([
+                np.asarray([np.nan if v is None else v for v in columnas[c]], dtype=np.float64).reshape(n)
+                for c in self.columnas_numericas
+            ])
+            numericos -= self._medias
+            numericos /= self._escalas
+            X[:, self._indices_numericos] = numericos
+        return X
+
+    def codificar_codigos(self, codigos: Mapping[str, np.ndarray], numericas: Mapping[str, np.ndarray],
+                          n: int) -> np.ndarray:
+        """
+        Codifica columnas categóricas dadas como códigos del vocabulario
+        compartido (-1 = desconocida) y columnas numéricas float64, sin
+        construir objetos Python por fila.
+        """
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+        filas = np.arange(n)
+        for columna in self.columnas_categoricas:
+            indices = self._salida_codigos[columna][codigos[columna]]
+            conocidas = indices >= 0
+            X[filas[conocidas], indices[conocidas]] = 1.0
+        if self.columnas_numericas:
+            numericos = np.column_stack([np.asarray(numericas[c], dtype=np.float64) for c in self.columnas_numericas])
+            numericos -= self._medias
+            numericos /= self._escalas
+            X[:, self._indices_numericos] = numericos
+        return X
+
+    def predecir_proba(self, X: np.ndarray) -> np.ndarray:
+        """Equivalente a model.predict_proba para el objetivo binary:logistic"""
+        clase_uno = self.booster.inplace_predict(
+            X,
+            iteration_range=self.iteration_range,
+            predict_type="value",
+            missing=self.missing,
+        )
+        return np.vstack((1.0 - clase_uno, clase_uno)).transpose()
+
+    def contribuciones(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Contribuciones de cada campo de entrada al margen (log-odds de la clase
+        1) con pred_contribs de XGBoost, en una única llamada para todo el lote.
+
+        Returns:
+            (contribuciones de forma filas x campos en el orden de `campos`,
+            término base de cada fila); su suma es el margen de la fila
+        """
+        import xgboost as xgb
+
+        contribuciones = self.booster.predict(
+            xgb.DMatrix(X, missing=self.missing),
+            pred_contribs=True,
+            iteration_range=self.iteration_range,
+        )
+        return contribuciones[:, :-1] @ self._agregacion, contribuciones[:, -1]
+
+    def predecir(self, registro) -> Dict[str, Any]:
+        """Predice un único registro y devuelve prediction y probability"""
+        probas = self.predecir_proba(self.codificar_fila(registro))
+        clase = int(probas[0].argmax())
+        return {
+            "prediction": int(self.clases[clase]),
+            "probability": float(probas[0, clase]),
+        }
+
+
+def verificar_paridad(model, preprocessor, compilado: PipelineCompilado,
+                      valores_numericos: Sequence[Sequence[float]],
+                      tam_bloque: int = 50000, paso_fila: int = 97) -> int:
+    """
+    Comprueba que la ruta compilada coincide bit a bit con la ruta pandas en
+    toda la rejilla de categorías conocidas por el preprocesador.
+
+    Cada combinación de categorías se empareja de forma cíclica con uno de los
+    `valores_numericos`. Además de la ruta vectorizada, cada `paso_fila`
+    registros se comprueba también la ruta de un único registro.
+
+    Returns:
+        Número de combinaciones comprobadas
+    """
+    import pandas as pd
+    from types import SimpleNamespace
+
+    columnas = compilado.columnas_categoricas + compilado.columnas_numericas
+    rejilla = itertools.product(*(compilado.vocabularios[c].keys() for c in compilado.columnas_categoricas))
+    total = 0
+
+    while True:
+        bloque = list(itertools.islice(rejilla, tam_bloque))
+        if not bloque:
+            break
+        filas = [
+            tuple(categorias) + tuple(valores_numericos[(total + i) % len(valores_numericos)])
+            for i, categorias in enumerate(bloque)
+        ]
+        df = pd.DataFrame(filas, columns=columnas)
+        esperado = model.predict_proba(preprocessor.transform(df))
+
+        registros = [SimpleNamespace(**dict(zip(columnas, fila))) for fila in filas]
+        obtenido = compilado.predecir_proba(compilado.codificar(registros))
+        if not np.array_equal(esperado, obtenido):
+            raise AssertionError(f"Diferencias en el bloque que empieza en la combinación {total}")
+
+        for i in range(0, len(registros), paso_fila):
+            fila = compilado.predecir_proba(compilado.codificar_fila(registros[i]))
+            if not np.array_equal(esperado[i:i + 1], fila):
+                raise AssertionError(f"Diferencias en la ruta de un registro, combinación {total + i}")
+
+        total += len(bloque)
+        logger.info(f"Paridad verificada: {total} combinaciones")
+
+    return total
+
+
+if __name__ == "__main__":
+    # Verificación de paridad con los modelos de la API: python backend/inferencia_rapida.py
+    logging.basicConfig(level=logging.INFO)
+    from registro_modelos import ModelRegistry
+
+    registro = ModelRegistry()
+    valores = {
+        "distrito": [(float(d),) for d in range(1, 22)],
+        "coordenadas": [(x, y) for x in (436000.0, 441500.5, 447000.0) for y in (4470000.0, 4475250.5, 4481000.0)],
+    }
+    for nombre in valores:
+        bundle = registro.get(nombre)
+        compilado = PipelineCompilado(bundle.model, bundle.preprocessor, bundle.label_encoder)
+        n = verificar_paridad(bundle.model, bundle.preprocessor, compilado, valores[nombre])
+        logger.info(f"Modelo {nombre}: {n} combinaciones idénticas a la ruta pandas")
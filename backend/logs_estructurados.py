@@ -0,0 +1,129 @@
+"""
+Logging estructurado y no bloqueante.
+
+Los registros se encolan con un QueueHandler y un hilo aparte (QueueListener)
+los formatea como JSON y los escribe, de modo que el bucle de eventos solo
+paga el coste de crear el LogRecord. Los logs de éxito por petición se
+muestrean; los avisos y errores se registran siempre.
+
+Configuración por variables de entorno:
+    LOG_NIVEL            Nivel del logger raíz (INFO por defecto)
+    LOG_FORMATO          'json' (por defecto) o 'texto'
+    LOG_COLA             '0' para escribir de forma síncrona, como antes
+    LOG_MUESTREO_EXITO   Fracción de peticiones correctas que se registran (0.01)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Optional
+
+# Atributos estándar de LogRecord; el resto son campos pasados con extra=
+_ATRIBUTOS_ESTANDAR = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos de extra= al mismo nivel"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": round(record.created, 6),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR and not clave.startswith("_"):
+                datos[clave] = valor
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class Muestreo:
+    """
+    Decide qué eventos de éxito se registran.
+
+    Args:
+        tasa: Fracción de eventos registrados (1 = todos, 0 = ninguno)
+    """
+
+    def __init__(self, tasa: float = 0.01):
+        self.tasa = min(1.0, max(0.0, tasa))
+        self.registrados = 0
+        self.descartados = 0
+
+    def __call__(self) -> bool:
+        if self.tasa >= 1.0 or (self.tasa > 0.0 and random.random() < self.tasa):
+            self.registrados += 1
+            return True
+        self.descartados += 1
+        return False
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _detener_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _reiniciar_listener_tras_fork():
+    # El hilo del listener no sobrevive a fork: cada worker arranca el suyo
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(
+            _listener.queue, *_listener.handlers, respect_handler_level=_listener.respect_handler_level
+        )
+        _listener.start()
+
+
+def configurar_logging(nivel: Optional[str] = None, formato: Optional[str] = None,
+                       cola: Optional[bool] = None) -> Muestreo:
+    """
+    Sustituye los manejadores del logger raíz por los configurados y devuelve
+    el muestreador de logs de éxito.
+    """
+    global _listener
+    nivel = nivel or os.getenv("LOG_NIVEL", "INFO")
+    formato = formato or os.getenv("LOG_FORMATO", "json")
+    cola = os.getenv("LOG_COLA", "1") != "0" if cola is None else cola
+
+    destino = logging.StreamHandler(sys.stderr)
+    if formato == "json":
+        destino.setFormatter(FormateadorJSON())
+    else:
+        destino.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+
+    raiz = logging.getLogger()
+    _detener_listener()
+    for manejador in list(raiz.handlers):
+        raiz.removeHandler(manejador)
+    raiz.setLevel(nivel)
+
+    if cola:
+        cola_registros: queue.SimpleQueue = queue.SimpleQueue()
+        raiz.addHandler(logging.handlers.QueueHandler(cola_registros))
+        _listener = logging.handlers.QueueListener(cola_registros, destino, respect_handler_level=True)
+        _listener.start()
+    else:
+        raiz.addHandler(destino)
+
+    return Muestreo(float(os.getenv("LOG_MUESTREO_EXITO", "0.01")))
+
+
+atexit.register(_detener_listener)
+os.register_at_fork(after_in_child=_reiniciar_listener_tras_fork)
+
+
+def duracion_ms(inicio: float) -> float:
+    """Milisegundos transcurridos desde `inicio` (time.perf_counter)"""
+    return round((time.perf_counter() - inicio) * 1000, 3)
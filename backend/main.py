@@ -1,69 +1,306 @@
 from fastapi import FastAPI
-from pydantic import BaseModel
-import pickle
-import pandas as pd
-from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
+from pydantic import BaseModel, StrictInt, ValidationError, field_validator, model_validator
+from pydantic_core import PydanticCustomError
+import numpy as np
+from fastapi import Body, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.exceptions import RequestValidationError
-from typing import Optional
+from contextlib import asynccontextmanager
+import asyncio
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import json
 import logging
+import os
+import tempfile
+import time
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+from admision import ControlAdmision, PeticionRechazada
+from auditoria import RegistroAuditoria
+from cache_predicciones import CachePredicciones
+import evaluacion
+import formato_arrow
+from geo import IndiceDistritos, localizar, wgs84_a_utm
+from logs_estructurados import configurar_logging, duracion_ms
+from mapa_riesgo import GeneradorMapas, zooms_validos
+from metricas import MarcaLlegada, MetricasInferencia, PerfiladorMuestreo
+from microbatch import MicroBatcher
+from puntuacion_masiva import LectorStream, puntuar_codigos, puntuar_columnas, registros_salida
+from recarga import RecargadorModelos
+import sensibilidad
+from registro_modelos import VARIANTES, ModelBundle, ModelRegistry
+from trabajos import TERMINADOS, AlmacenTrabajos, ColaLlena, ProcesadorTrabajos
+import vocabulario
+
+# Configurar logging: JSON escrito desde un hilo aparte; los éxitos por petición se muestrean
+muestreo_exito = configurar_logging()
 logger = logging.getLogger(__name__)
 
 # Definir esquema de entrada con Pydantic
-class InputData(BaseModel):
-    tipo_vehiculo: str
-    tipo_persona: str
-    tipo_accidente: str
-    sexo: str
-    rango_edad: str
-    estado_meteorológico: str
+class CategoricasEntrada(BaseModel):
+    """
+    Variables categóricas del accidente. Cada una admite la categoría o su
+    código entero del vocabulario compartido (GET /vocabulario); tras la
+    validación siempre contiene la categoría. Los códigos son StrictInt para
+    que un booleano no se acepte como código 0/1.
+    """
+    tipo_vehiculo: Union[str, StrictInt]
+    tipo_persona: Union[str, StrictInt]
+    tipo_accidente: Union[str, StrictInt]
+    sexo: Union[str, StrictInt]
+    rango_edad: Union[str, StrictInt]
+    estado_meteorológico: Union[str, StrictInt]
+
+    @field_validator(*vocabulario.CAMPOS_CATEGORICOS)
+    @classmethod
+    def decodificar_categoria(cls, valor, info):
+        try:
+            return vocabulario.categoria(info.field_name, valor)
+        except ValueError as e:
+            # Error propio de Pydantic: el detalle del 422 queda serializable
+            raise PydanticCustomError("codigo_categoria", str(e))
+
+class InputData(CategoricasEntrada):
     cod_distrito: Optional[int] = None
     coordenada_x_utm: Optional[float] = None
     coordenada_y_utm: Optional[float] = None
+    latitud: Optional[float] = None
+    longitud: Optional[float] = None
+
+    @model_validator(mode="after")
+    def proyectar_latitud_longitud(self):
+        """Si llegan latitud/longitud WGS84 y no coordenadas UTM, se proyectan a UTM 30N"""
+        if (self.latitud is not None and self.longitud is not None
+                and (self.coordenada_x_utm is None or self.coordenada_y_utm is None)):
+            self.coordenada_x_utm, self.coordenada_y_utm = wgs84_a_utm(self.latitud, self.longitud)
+        return self
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Precarga los modelos indicados y arranca y detiene el micro-batching, la recarga de modelos, los trabajos asíncronos y la auditoría"""
+    for nombre_modelo in filter(None, os.getenv("MODELOS_PRECARGA", "").split(",")):
+        registro.get(nombre_modelo.strip())
+    registro_auditoria.iniciar()
+    microbatcher.iniciar()
+    recargador.iniciar_vigilancia()
+    procesador_trabajos.iniciar()
+    yield
+    await run_in_threadpool(procesador_trabajos.detener)
+    recargador.detener()
+    await microbatcher.detener()
+    await run_in_threadpool(registro_auditoria.detener)
+
+app = FastAPI(
+    title="API Predicción Lesividad",
+    description="API para predecir lesividad en accidentes de tráfico",
+    lifespan=lifespan
+)
+
+app.add_middleware(MarcaLlegada)
+
+# Latencia por etapa y variante (METRICAS_ACTIVAS=0 la desactiva) y perfilador bajo demanda
+metricas = MetricasInferencia(activas=os.getenv("METRICAS_ACTIVAS", "1") != "0")
+perfilador = PerfiladorMuestreo()
+
+# Registro de modelos: cada bundle se carga la primera vez que se usa
+registro = ModelRegistry(nthread=int(os.getenv("XGBOOST_NTHREAD", "0")) or None)
+
+# Recarga en caliente; RECARGA_VIGILAR_S > 0 activa la vigilancia de los artefactos
+recargador = RecargadorModelos(registro, intervalo_s=float(os.getenv("RECARGA_VIGILAR_S", "0")))
 
-app = FastAPI(title="API Predicción Lesividad", description="API para predecir lesividad en accidentes de tráfico")
+# Registro de auditoría de todas las predicciones servidas (AUDITORIA_ACTIVA=0 lo desactiva)
+registro_auditoria = RegistroAuditoria(
+    activo=os.getenv("AUDITORIA_ACTIVA", "1") != "0",
+    intervalo_s=float(os.getenv("AUDITORIA_INTERVALO_S", "1")),
+    filas_grupo=int(os.getenv("AUDITORIA_FILAS_GRUPO", "100000")),
+    rotacion_s=float(os.getenv("AUDITORIA_ROTACION_S", "300")),
+    max_pendientes=int(os.getenv("AUDITORIA_MAX_PENDIENTES", "1000000"))
+)
 
-# Cargar modelos al inicio de la aplicación
-try:
-    # Cargar modelo, preprocesador y label encoder al inicio (distrito)
-    with open('modelos/xgboost_binario_balanceado_smote_modelo_distrito.pkl', 'rb') as f:
-        model_distrito = pickle.load(f)
+# Número máximo de registros aceptados por /predict/batch
+MAX_REGISTROS_BATCH = 10000
 
-    with open('modelos/preprocessor/xgboost_binario_balanceado_smote_preprocessor_distrito.pkl', 'rb') as f:
-        preprocessor_distrito = pickle.load(f)
+# Número máximo de filas aceptadas por /predict/arrow
+MAX_FILAS_ARROW = int(os.getenv("ARROW_MAX_FILAS", "1000000"))
 
-    with open('modelos/label_encoder/xgboost_binario_balanceado_smote_label_encoder_distrito.pkl', 'rb') as f:
-        label_encoder_distrito = pickle.load(f)
+MENSAJE_UBICACION = "Debe proporcionar 'cod_distrito', ambas coordenadas UTM (coordenada_x_utm y coordenada_y_utm) o latitud y longitud"
 
-    # Cargar modelo, preprocesador y label encoder al inicio (coordenadas)
-    with open('modelos/xgboost_binario_balanceado_smote_modelo_coordenadas.pkl', 'rb') as f:
-        model_coordenadas = pickle.load(f)
+# Índice de distritos para localizar puntos (None si no hay fichero de distritos)
+indice_distritos = IndiceDistritos.cargar()
 
-    with open('modelos/preprocessor/xgboost_binario_balanceado_smote_preprocessor_coordenadas.pkl', 'rb') as f:
-        preprocessor_coordenadas = pickle.load(f)
+# Número máximo de puntos aceptados por /geo/localizar
+MAX_PUNTOS_GEO = 100000
 
-    with open('modelos/label_encoder/xgboost_binario_balanceado_smote_label_encoder_coordenadas.pkl', 'rb') as f:
-        label_encoder_coordenadas = pickle.load(f)
+# Mapas de riesgo por escenario (rejilla UTM y teselas en disco)
+generador_mapas = GeneradorMapas(
+    registro,
+    indice_distritos,
+    paso_m=float(os.getenv("MAPA_RIESGO_PASO_M", "100")),
+    max_escenarios=int(os.getenv("MAPA_RIESGO_MAX_ESCENARIOS", "16"))
+)
 
-    logger.info("Modelos cargados correctamente.")
+def seleccionar_modelo(data: InputData) -> Optional[str]:
+    """Devuelve el modelo a usar ('distrito' o 'coordenadas'), o None si faltan datos de ubicación"""
+    if data.cod_distrito is not None:
+        return "distrito"
+    if data.coordenada_x_utm is not None and data.coordenada_y_utm is not None:
+        return "coordenadas"
+    return None
 
-except FileNotFoundError as e:
-    logger.error(f"Archivo de modelo no encontrado: {e}")
-    raise HTTPException(status_code=500, detail="Modelos no encontrados")
-except Exception as e:
-    logger.error(f"Error cargando modelos: {e}")
-    raise HTTPException(status_code=500, detail="Error al cargar modelos")
+def admite_explicaciones(bundle: ModelBundle) -> bool:
+    """Si el bundle puede devolver contribuciones por campo (ruta compilada con booster de XGBoost)"""
+    return bundle.compilado is not None and bundle.compilado.admite_contribuciones
+
+MENSAJE_EXPLICACIONES = "Las explicaciones no están disponibles con el runtime de modelos actual"
+
+def predecir_grupo(bundle: ModelBundle, registros: List[InputData], explicar: bool = False) -> List[Dict[str, Any]]:
+    """
+    Predice un grupo de registros que usan el mismo modelo con una única
+    llamada a transform y otra a predict_proba.
+
+    Con `explicar` cada resultado incluye además la probabilidad de cada
+    clase y las contribuciones por campo, calculadas para todo el grupo con
+    una única llamada a pred_contribs sobre la misma matriz codificada.
+    """
+    nombre = bundle.nombre
+    if metricas.activas:
+        metricas.filas_lote.observar(len(registros), nombre)
+    if bundle.compilado is not None:
+        # En la ruta compilada la codificación sustituye a DataFrame + transform
+        with metricas.etapa("transform", nombre):
+            X_prep = bundle.compilado.codificar(registros)
+        with metricas.etapa("predict_proba", nombre):
+            probas = bundle.compilado.predecir_proba(X_prep)
+    else:
+        # pandas solo se importa si algún bundle no tiene ruta compilada
+        import pandas as pd
+
+        with metricas.etapa("dataframe", nombre):
+            df = pd.DataFrame([data.model_dump() for data in registros])
+        with metricas.etapa("transform", nombre):
+            X_prep = bundle.preprocessor.transform(df)
+        with metricas.etapa("predict_proba", nombre):
+            probas = bundle.model.predict_proba(X_prep)
+
+    with metricas.etapa("inverse_transform", nombre):
+        # Indexar classes_ equivale a inverse_transform sin su validación por llamada
+        pred_class_encoded = probas.argmax(axis=1)
+        y_pred = bundle.label_encoder.classes_[pred_class_encoded]
+        pred_prob = probas[np.arange(len(probas)), pred_class_encoded]
+
+    resultados = [
+        {"prediction": int(pred), "probability": float(prob)}
+        for pred, prob in zip(y_pred, pred_prob)
+    ]
+    if explicar:
+        explicar_grupo(bundle, X_prep, probas, resultados)
+    return resultados
+
+def explicar_grupo(bundle: ModelBundle, X_prep: np.ndarray, probas: np.ndarray,
+                   resultados: List[Dict[str, Any]]) -> None:
+    """
+    Añade a cada resultado `probabilidades` (por clase), `contribuciones` (por
+    campo de InputData, en log-odds de la clase 1) y `contribucion_base`; la
+    suma de las contribuciones y la base es el margen del modelo.
+    """
+    if not admite_explicaciones(bundle):
+        raise ValueError(MENSAJE_EXPLICACIONES)
+    with metricas.etapa("contribuciones", bundle.nombre):
+        contribuciones, base = bundle.compilado.contribuciones(X_prep)
+
+    etiquetas = [str(clase) for clase in bundle.label_encoder.classes_]
+    campos = bundle.compilado.campos
+    for resultado, fila_probas, fila_contribuciones, fila_base in zip(
+            resultados, probas.tolist(), contribuciones.tolist(), base.tolist()):
+        resultado["probabilidades"] = dict(zip(etiquetas, fila_probas))
+        resultado["contribuciones"] = dict(zip(campos, fila_contribuciones))
+        resultado["contribucion_base"] = fila_base
+
+def procesar_microlote(grupo, registros: List[InputData]) -> List[Tuple[ModelBundle, Dict[str, Any]]]:
+    """
+    Procesa un micro-lote de /predict; el grupo es (nombre_modelo, explicar).
+    Un único registro sin explicación usa la fila preasignada. Cada resultado
+    va acompañado del bundle que lo ha calculado.
+    """
+    nombre_modelo, explicar = grupo
+    # El bundle se obtiene una sola vez: si hay una recarga en curso, el lote
+    # termina con el bundle anterior
+    bundle = registro.get(nombre_modelo)
+    if len(registros) == 1 and bundle.compilado is not None and not explicar:
+        return [(bundle, predecir_fila(bundle, registros[0]))]
+    return [(bundle, resultado) for resultado in predecir_grupo(bundle, registros, explicar)]
+
+def predecir_fila(bundle: ModelBundle, data: InputData) -> Dict[str, Any]:
+    """Equivalente a compilado.predecir, con cada etapa cronometrada"""
+    compilado = bundle.compilado
+    t0 = time.perf_counter()
+    fila = compilado.codificar_fila(data)
+    t1 = time.perf_counter()
+    probas = compilado.predecir_proba(fila)
+    t2 = time.perf_counter()
+    clase = int(probas[0].argmax())
+    resultado = {"prediction": int(compilado.clases[clase]), "probability": float(probas[0, clase])}
+    t3 = time.perf_counter()
+
+    if metricas.activas:
+        metricas.filas_lote.observar(1, bundle.nombre)
+        metricas.observar_etapa("transform", bundle.nombre, t1 - t0)
+        metricas.observar_etapa("predict_proba", bundle.nombre, t2 - t1)
+        metricas.observar_etapa("inverse_transform", bundle.nombre, t3 - t2)
+    return resultado
+
+# Micro-batching de /predict (configurable por variables de entorno)
+microbatcher = MicroBatcher(
+    procesar_microlote,
+    ventana_ms=float(os.getenv("MICROBATCH_VENTANA_MS", "2")),
+    max_filas=int(os.getenv("MICROBATCH_MAX_FILAS", "64")),
+    hilos=int(os.getenv("MICROBATCH_HILOS", "1"))
+)
+
+# Trabajos de predicción asíncronos con resultados en SQLite (configurable por variables de entorno)
+procesador_trabajos = ProcesadorTrabajos(
+    registro,
+    AlmacenTrabajos(),
+    auditoria=registro_auditoria,
+    hilos=int(os.getenv("TRABAJOS_HILOS", "1")),
+    max_trabajos=int(os.getenv("TRABAJOS_MAX_PENDIENTES", "16")),
+    max_filas=int(os.getenv("TRABAJOS_MAX_FILAS", "2000000")),
+    tam_bloque=int(os.getenv("TRABAJOS_TAM_BLOQUE", "5000")),
+    retencion_s=float(os.getenv("TRABAJOS_RETENCION_H", "24")) * 3600
+)
+
+# Segundos sugeridos en Retry-After cuando la cola de trabajos está llena
+REINTENTO_TRABAJOS_S = 30
+
+# Máximo de resultados por página en GET /trabajos/{id}/resultados
+MAX_PAGINA_TRABAJOS = 10000
+
+# Control de admisión de /predict: peticiones en curso en el modelo por variante
+# (0 = sin límite) y presupuesto de latencia desde la llegada (0 = sin presupuesto)
+admision = ControlAdmision(
+    {
+        "distrito": int(os.getenv("ADMISION_MAX_DISTRITO", "256")),
+        "coordenadas": int(os.getenv("ADMISION_MAX_COORDENADAS", "256")),
+    },
+    presupuesto_s=float(os.getenv("ADMISION_PRESUPUESTO_MS", "1000")) / 1000
+)
+
+# Caché LRU de predicciones (configurable por variables de entorno)
+cache_predicciones = CachePredicciones(
+    max_entradas=int(os.getenv("CACHE_MAX_ENTRADAS", "10000")),
+    ttl_s=float(os.getenv("CACHE_TTL_S", "0")),
+    paso_coordenadas=float(os.getenv("CACHE_PASO_COORDENADAS", "1"))
+)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Maneja errores de validación de entrada"""
-    logger.warning(f"Error de validación: {exc.errors()}")
+    errores = jsonable_encoder(exc.errors())
+    logger.warning(f"Error de validación: {errores}")
     return JSONResponse(
         status_code=422,
-        content={"detail": exc.errors(), "body": exc.body}
+        content={"detail": errores, "body": jsonable_encoder(exc.body)}
     )
 
 @app.get("/")
@@ -72,103 +309,662 @@ async def root():
     return {
         "mensaje": "API Predicción Lesividad en Accidentes",
         "status": "activo",
-        "endpoints": ["/predict", "/docs"]
+        "endpoints": ["/predict", "/predict/batch", "/predict/arrow", "/predict/sensibilidad", "/predict/stream", "/trabajos", "/vocabulario", "/microbatch/estadisticas", "/admision/estadisticas", "/auditoria/estadisticas", "/cache/estadisticas", "/geo/localizar", "/mapa/riesgo", "/metrics", "/docs"]
     }
 
 @app.get("/health")
 async def health_check():
     """Endpoint para verificar el estado de la API"""
-    return {"status": "healthy", "modelos": "cargados"}
+    return {"status": "healthy", "modelos": registro.cargados()}
 
 @app.post("/predict")
-async def predict(data: InputData):
+async def predict(data: InputData, request: Request, explicar: bool = False):
     """
     Predice la lesividad de un accidente basándose en las características proporcionadas.
     
     Args:
         data: Datos del accidente (InputData)
+        explicar: Si se devuelven también la probabilidad de cada clase y las
+            contribuciones de cada campo (no usa la tabla ni la caché)
     
     Returns:
-        Dict con prediction (0/1) y probability (float)
+        Dict con prediction (0/1) y probability (float); con `explicar`,
+        además probabilidades, contribuciones y contribucion_base. Si la
+        variante está saturada (ver admision.py) responde 503 con Retry-After
     """
+    inicio = time.perf_counter()
     try:
-        logger.info(f"Recibida solicitud de predicción")
-        
         # Validar datos de entrada
         if data.cod_distrito is None and (data.coordenada_x_utm is None or data.coordenada_y_utm is None):
-            logger.warning("Datos de ubicación insuficientes")
+            logger.warning("Datos de ubicación insuficientes", extra={"evento": "prediccion_rechazada"})
             raise HTTPException(
                 status_code=400, 
-                detail="Debe proporcionar 'cod_distrito' o ambas coordenadas UTM (coordenada_x_utm y coordenada_y_utm)"
+                detail=MENSAJE_UBICACION
             )
         
         # Determinar qué modelo usar
-        if data.cod_distrito is not None:
-            # Usar modelo con distrito
-            preprocessor = preprocessor_distrito
-            model = model_distrito
-            label_encoder = label_encoder_distrito
-            logger.info("Usando modelo con distrito")
-        elif data.coordenada_x_utm is not None and data.coordenada_y_utm is not None:
-            # Usar modelo con coordenadas
-            preprocessor = preprocessor_coordenadas
-            model = model_coordenadas
-            label_encoder = label_encoder_coordenadas
-            logger.info("Usando modelo con coordenadas")
-        else:
-            logger.error("Lógica de selección de modelo falló")
-            raise HTTPException(
-                status_code=400,
-                detail="Error interno: no se pudo determinar qué modelo usar"
-            )
-        
-        # Crear DataFrame y preprocesar
-        data_dict = data.model_dump()
-        df = pd.DataFrame([data_dict])
-        
-        logger.info(f"Datos procesados: {len(df)} filas, {len(df.columns)} columnas")
-        
-        # Preprocesar datos
-        X_prep = preprocessor.transform(df)
-        
-        # Realizar predicción
-        probas = model.predict_proba(X_prep)
-        pred_class_encoded = probas.argmax(axis=1)
-        y_pred = label_encoder.inverse_transform(pred_class_encoded)
-        pred_prob = probas[0, pred_class_encoded[0]]
-        
-        resultado = {
-            "prediction": int(y_pred[0]),
-            "probability": float(pred_prob)
-        }
+        nombre_modelo = seleccionar_modelo(data)
+        # Desde la llegada de la petición: lectura del cuerpo, validación con
+        # Pydantic y comprobación de la ubicación
+        llegada = getattr(request.state, "llegada", inicio)
+        metricas.observar_etapa("validacion", nombre_modelo, time.perf_counter() - llegada)
+
+        resultado = None
+        origen = "tabla"
+        bundle = registro.obtener_si_cargado(nombre_modelo)
+        if explicar:
+            if bundle is None:
+                bundle = await run_in_threadpool(registro.get, nombre_modelo)
+            if not admite_explicaciones(bundle):
+                raise HTTPException(status_code=501, detail=MENSAJE_EXPLICACIONES)
+        elif bundle is not None and bundle.tabla is not None:
+            # Búsqueda directa en la tabla precalculada
+            with metricas.etapa("tabla", nombre_modelo):
+                resultado = bundle.tabla.buscar(data)
+
+        clave_cache = None
+        # Versión leída una sola vez: una recarga durante el await no debe
+        # guardar en la caché un resultado bajo una versión que no lo calculó
+        version_cache = registro.version
+        if resultado is None and cache_predicciones.activa and not explicar:
+            origen = "cache"
+            with metricas.etapa("cache", nombre_modelo):
+                clave_cache = cache_predicciones.clave(nombre_modelo, data)
+                resultado = cache_predicciones.obtener(version_cache, clave_cache)
+
+        if resultado is None:
+            origen = "modelo"
+            # Solo las peticiones que necesitan el modelo pasan por el control de
+            # admisión: la tabla y la caché responden sin ocupar el modelo.
+            # La carga perezosa del bundle no cuenta contra el presupuesto ni
+            # entra en la latencia observada: la espera se mide desde que termina
+            desde = llegada
+            if bundle is None:
+                bundle = await run_in_threadpool(registro.get, nombre_modelo)
+                desde = time.perf_counter()
+            admitida = time.perf_counter()
+            try:
+                admision.admitir(nombre_modelo, admitida - desde)
+            except PeticionRechazada as e:
+                metricas.rechazos.incrementar(nombre_modelo, e.motivo)
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.reintento_s)})
+            try:
+                # Se agrupa con otras peticiones concurrentes y se procesa en un hilo de trabajo
+                with metricas.etapa("microbatch", nombre_modelo):
+                    bundle, resultado = await microbatcher.predecir((nombre_modelo, explicar), data)
+            finally:
+                admision.liberar(nombre_modelo, time.perf_counter() - admitida)
+            if clave_cache is not None and registro.version == version_cache:
+                cache_predicciones.guardar(version_cache, clave_cache, resultado)
         
-        logger.info(f"Predicción exitosa: {resultado}")
+        metricas.observar_peticion(nombre_modelo, origen, time.perf_counter() - llegada)
+        # En el camino del modelo, la versión es la del bundle que ha puntuado
+        version_modelo = (bundle.etiqueta, bundle.version) if bundle is not None else None
+        registro_auditoria.registrar("/predict", nombre_modelo, version_modelo, origen, data, resultado)
+        if muestreo_exito():
+            logger.info("Predicción exitosa", extra={
+                "evento": "prediccion", "modelo": nombre_modelo, "origen": origen,
+                "prediction": resultado["prediction"], "probability": resultado["probability"],
+                "duracion_ms": duracion_ms(inicio),
+            })
         return resultado
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error inesperado en predicción: {str(e)}")
+        logger.error(f"Error inesperado en predicción: {str(e)}", extra={
+            "evento": "prediccion_error", "duracion_ms": duracion_ms(inicio),
+        })
         raise HTTPException(
             status_code=500, 
             detail="Error interno del servidor durante la predicción"
         )
 
+@app.post("/predict/batch")
+def predict_batch(registros: List[Dict[str, Any]] = Body(...), explicar: bool = False):
+    """
+    Predice la lesividad de un lote de accidentes, que puede mezclar registros
+    con distrito y con coordenadas UTM.
+
+    Los registros se agrupan por modelo y cada grupo se procesa de forma
+    vectorizada. Los errores de validación de un registro no hacen fallar el
+    lote: se devuelven en su posición.
+
+    Args:
+        registros: Lista de registros con el esquema de InputData
+        explicar: Si cada resultado incluye la probabilidad de cada clase y
+            las contribuciones de cada campo (una llamada a pred_contribs por modelo)
+
+    Returns:
+        Dict con la lista de resultados en el mismo orden de entrada
+    """
+    if len(registros) > MAX_REGISTROS_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote no puede superar {MAX_REGISTROS_BATCH} registros"
+        )
+
+    logger.info(f"Recibida solicitud de predicción por lotes: {len(registros)} registros")
+
+    resultados: List[Optional[Dict[str, Any]]] = [None] * len(registros)
+    grupos: Dict[str, List[int]] = {"distrito": [], "coordenadas": []}
+    validos: Dict[int, InputData] = {}
+
+    # Validar cada registro por separado
+    for i, entrada in enumerate(registros):
+        try:
+            data = InputData.model_validate(entrada)
+        except ValidationError as e:
+            resultados[i] = {"error": e.errors(include_url=False, include_context=False)}
+            continue
+
+        nombre_modelo = seleccionar_modelo(data)
+        if nombre_modelo is None:
+            resultados[i] = {"error": MENSAJE_UBICACION}
+            continue
+
+        grupos[nombre_modelo].append(i)
+        validos[i] = data
+
+    # Una llamada a transform + predict_proba por modelo
+    for nombre_modelo, indices in grupos.items():
+        if not indices:
+            continue
+        try:
+            bundle = registro.get(nombre_modelo)
+            if explicar and not admite_explicaciones(bundle):
+                raise HTTPException(status_code=501, detail=MENSAJE_EXPLICACIONES)
+            predicciones = predecir_grupo(bundle, [validos[i] for i in indices], explicar)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error inesperado en predicción por lotes ({nombre_modelo}): {str(e)}")
+            predicciones = [{"error": "Error interno del servidor durante la predicción"}] * len(indices)
+
+        for i, prediccion in zip(indices, predicciones):
+            resultados[i] = prediccion
+
+    modelos: List[Optional[str]] = [None] * len(registros)
+    for nombre_modelo, indices in grupos.items():
+        for i in indices:
+            modelos[i] = nombre_modelo
+    registro_auditoria.registrar_lote(
+        "/predict/batch", registro.versiones(), [validos.get(i, entrada) for i, entrada in enumerate(registros)],
+        modelos, resultados
+    )
+
+    errores = sum(1 for resultado in resultados if "error" in resultado)
+    logger.info(f"Predicción por lotes completada: {len(registros) - errores} correctas, {errores} con error")
+
+    return {
+        "total": len(registros),
+        "errores": errores,
+        "resultados": resultados
+    }
+
+class SensibilidadRequest(BaseModel):
+    base: InputData
+    campos: List[str]
+    valores: Optional[Dict[str, List[Union[str, StrictInt]]]] = None
+
+@app.post("/predict/sensibilidad")
+def predict_sensibilidad(peticion: SensibilidadRequest):
+    """
+    Barrido de sensibilidad: puntúa el registro base con uno o dos campos
+    recorriendo todos sus valores (o los indicados en `valores`), con una
+    única llamada al modelo para toda la rejilla.
+
+    Returns:
+        Valores de cada eje y matrices (un eje por campo, en el orden de
+        `campos`) con prediction, probability y la probabilidad de cada clase
+    """
+    campos = peticion.campos
+    if not 0 < len(campos) <= sensibilidad.MAX_CAMPOS or len(set(campos)) != len(campos):
+        raise HTTPException(status_code=400, detail=f"Indique entre 1 y {sensibilidad.MAX_CAMPOS} campos distintos")
+    try:
+        valores = {c: sensibilidad.valores_campo(c, (peticion.valores or {}).get(c)) for c in campos}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    nombre_modelo = "distrito" if "cod_distrito" in campos else seleccionar_modelo(peticion.base)
+    if nombre_modelo is None:
+        raise HTTPException(status_code=400, detail=MENSAJE_UBICACION)
+
+    inicio = time.perf_counter()
+    try:
+        with metricas.etapa("sensibilidad", nombre_modelo):
+            bundle = registro.get(nombre_modelo)
+            matrices = sensibilidad.barrer(bundle, peticion.base.model_dump(), valores)
+    except Exception as e:
+        logger.error(f"Error en el barrido de sensibilidad: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor durante la predicción")
+
+    # Cada punto de la rejilla es una predicción servida: se audita como un bloque columnar
+    codigos, numericas, n = sensibilidad.rejilla(peticion.base.model_dump(), valores)
+    registro_auditoria.registrar_columnas(
+        "/predict/sensibilidad", {nombre_modelo: (bundle.etiqueta, bundle.version)}, codigos, numericas, {
+            "prediction": np.ravel(matrices["prediction"]),
+            "probability": np.ravel(matrices["probability"]),
+            "modelo": np.full(n, nombre_modelo, dtype=object),
+            "error": np.full(n, None, dtype=object),
+        }
+    )
+
+    combinaciones = int(np.prod([len(v) for v in valores.values()]))
+    logger.info(f"Barrido de sensibilidad {campos} ({nombre_modelo}): {combinaciones} combinaciones "
+                f"en {duracion_ms(inicio)} ms")
+    return {"modelo": nombre_modelo, "campos": campos, "valores": valores, **matrices}
+
+def puntuar_arrow(cuerpo: bytes) -> bytes:
+    """Decodifica, puntúa y serializa una petición Arrow IPC"""
+    tabla = formato_arrow.leer_tabla(cuerpo)
+    if tabla.num_rows > MAX_FILAS_ARROW:
+        raise HTTPException(status_code=413, detail=f"La petición no puede superar {MAX_FILAS_ARROW} filas")
+    codigos, numericas, n = formato_arrow.decodificar(tabla)
+    resultado = puntuar_codigos(registro, codigos, numericas, n)
+    registro_auditoria.registrar_columnas("/predict/arrow", registro.versiones(), codigos, numericas, resultado)
+    return formato_arrow.codificar_resultado(resultado)
+
+@app.post("/predict/arrow")
+async def predict_arrow(request: Request):
+    """
+    Variante columnar de /predict/batch para clientes de alto volumen: el
+    cuerpo y la respuesta son streams Arrow IPC (ver formato_arrow.py). Las
+    filas que no se pueden predecir vuelven con prediction y probability
+    nulos y el motivo en la columna error.
+    """
+    tipo = request.headers.get("content-type", "").split(";")[0].strip()
+    if tipo != formato_arrow.TIPO_ARROW:
+        raise HTTPException(status_code=415, detail=f"Content-Type no soportado; use {formato_arrow.TIPO_ARROW}")
+
+    inicio = time.perf_counter()
+    cuerpo = await request.body()
+    try:
+        respuesta = await run_in_threadpool(puntuar_arrow, cuerpo)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # Incluye pyarrow.ArrowInvalid (cuerpo Arrow no válido)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error inesperado en /predict/arrow: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor durante la predicción")
+
+    if muestreo_exito():
+        logger.info("Predicción Arrow completada", extra={
+            "evento": "prediccion_arrow", "bytes": len(cuerpo), "duracion_ms": duracion_ms(inicio),
+        })
+    return Response(respuesta, media_type=formato_arrow.TIPO_ARROW)
+
+@app.post("/trabajos", status_code=202)
+def crear_trabajo(registros: List[Dict[str, Any]] = Body(...)):
+    """
+    Encola un lote grande de registros (esquema de InputData, con las
+    categorías como texto o código) para procesarlo en segundo plano.
+
+    Returns:
+        Estado inicial del trabajo; su id sirve para consultar el progreso en
+        GET /trabajos/{id} y los resultados en GET /trabajos/{id}/resultados
+    """
+    if not registros:
+        raise HTTPException(status_code=400, detail="El trabajo no tiene registros")
+    for i, entrada in enumerate(registros):
+        faltan = [c for c in vocabulario.CAMPOS_CATEGORICOS if c not in entrada]
+        if faltan:
+            raise HTTPException(status_code=400, detail=f"Al registro {i} le faltan campos obligatorios: {faltan}")
+
+    try:
+        estado = procesador_trabajos.enviar(registros)
+    except ColaLlena as e:
+        logger.warning(str(e), extra={"evento": "trabajo_rechazado"})
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(REINTENTO_TRABAJOS_S)})
+
+    logger.info(f"Trabajo {estado['id']} encolado: {len(registros)} registros")
+    return estado
+
+def estado_trabajo(identificador: str) -> Dict[str, Any]:
+    estado = procesador_trabajos.almacen.estado(identificador)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Trabajo desconocido o caducado")
+    return estado
+
+@app.get("/trabajos/estadisticas")
+def trabajos_estadisticas():
+    """Profundidad de la cola de trabajos y contadores de envíos y rechazos"""
+    return procesador_trabajos.estadisticas()
+
+@app.get("/trabajos/{identificador}")
+def consultar_trabajo(identificador: str):
+    """Estado y progreso de un trabajo"""
+    return estado_trabajo(identificador)
+
+@app.get("/trabajos/{identificador}/resultados")
+def resultados_trabajo(identificador: str, desde: int = 0, limite: int = 1000):
+    """
+    Página de resultados de un trabajo (filas >= desde, en orden). Se pueden
+    pedir mientras el trabajo avanza; `siguiente` es el valor de `desde` para
+    la página siguiente, o None si el trabajo ha terminado y no quedan más.
+    """
+    if desde < 0 or not 0 < limite <= MAX_PAGINA_TRABAJOS:
+        raise HTTPException(status_code=400, detail=f"desde debe ser >= 0 y limite estar entre 1 y {MAX_PAGINA_TRABAJOS}")
+    estado = estado_trabajo(identificador)
+    resultados = procesador_trabajos.almacen.resultados(identificador, desde, limite)
+    siguiente = resultados[-1]["fila"] + 1 if resultados else desde
+    if estado["estado"] in TERMINADOS and siguiente >= estado["total"]:
+        siguiente = None
+    return {"trabajo": estado, "resultados": resultados, "siguiente": siguiente}
+
+@app.get("/trabajos/{identificador}/resultados/stream")
+async def resultados_trabajo_stream(identificador: str, desde: int = 0):
+    """Resultados de un trabajo como NDJSON, a medida que se calculan, hasta que termina"""
+    await run_in_threadpool(estado_trabajo, identificador)
+
+    async def generar():
+        posicion = desde
+        while True:
+            resultados = await run_in_threadpool(
+                procesador_trabajos.almacen.resultados, identificador, posicion, MAX_PAGINA_TRABAJOS
+            )
+            if resultados:
+                posicion = resultados[-1]["fila"] + 1
+                yield "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in resultados)
+                continue
+            estado = await run_in_threadpool(procesador_trabajos.almacen.estado, identificador)
+            if estado is None or estado["estado"] in TERMINADOS:
+                if estado is not None and estado["error"]:
+                    yield json.dumps({"fila": posicion, "error": estado["error"]}, ensure_ascii=False) + "\n"
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+@app.delete("/trabajos/{identificador}")
+def borrar_trabajo(identificador: str):
+    """Cancela un trabajo (si está en curso, se abandona tras el bloque actual) y borra sus resultados"""
+    if not procesador_trabajos.almacen.borrar(identificador):
+        raise HTTPException(status_code=404, detail="Trabajo desconocido o caducado")
+    return {"id": identificador, "borrado": True}
+
+@app.get("/vocabulario")
+async def vocabulario_categorias():
+    """
+    Categorías de cada variable en el orden de sus códigos enteros: el código
+    de una categoría es su posición en la lista. La huella cambia si cambia el
+    vocabulario de los modelos.
+    """
+    return {"huella": vocabulario.HUELLA, "categorias": vocabulario.VOCABULARIO}
+
+@app.get("/microbatch/estadisticas")
+async def microbatch_estadisticas():
+    """Profundidad de la cola e histograma de tamaños de lote del micro-batching"""
+    return microbatcher.estadisticas()
+
+@app.get("/admision/estadisticas")
+async def admision_estadisticas():
+    """Peticiones en curso, latencia media, admitidas y rechazadas por variante del control de admisión"""
+    return admision.estadisticas()
+
+@app.get("/auditoria/estadisticas")
+async def auditoria_estadisticas():
+    """Filas registradas, escritas, pendientes y descartadas del registro de auditoría"""
+    return registro_auditoria.estadisticas()
+
+@app.get("/cache/estadisticas")
+async def cache_estadisticas():
+    """Aciertos, fallos y desalojos de la caché de predicciones"""
+    return cache_predicciones.estadisticas()
+
+class LocalizarRequest(BaseModel):
+    latitud: List[float]
+    longitud: List[float]
+
+@app.post("/geo/localizar")
+def geo_localizar(peticion: LocalizarRequest):
+    """
+    Proyecta puntos WGS84 a UTM 30N y obtiene su distrito, para usar
+    cualquiera de los dos modelos con una ubicación en latitud/longitud.
+
+    Returns:
+        Listas coordenada_x_utm, coordenada_y_utm y cod_distrito (None fuera
+        de Madrid o si no hay fichero de distritos), en el orden de entrada
+    """
+    n = len(peticion.latitud)
+    if len(peticion.longitud) != n:
+        raise HTTPException(status_code=400, detail="latitud y longitud deben tener la misma longitud")
+    if n > MAX_PUNTOS_GEO:
+        raise HTTPException(status_code=413, detail=f"No se pueden localizar más de {MAX_PUNTOS_GEO} puntos")
+
+    resultado = localizar(peticion.latitud, peticion.longitud, indice_distritos)
+    distritos = resultado["cod_distrito"]
+    return {
+        "coordenada_x_utm": resultado["coordenada_x_utm"].round(2).tolist(),
+        "coordenada_y_utm": resultado["coordenada_y_utm"].round(2).tolist(),
+        "cod_distrito": [int(d) or None for d in distritos] if distritos is not None else [None] * n,
+        "indice_distritos": indice_distritos is not None,
+    }
+
+class EscenarioRequest(CategoricasEntrada):
+    pass
+
+@app.post("/mapa/riesgo")
+def mapa_riesgo(escenario: EscenarioRequest, request: Request):
+    """
+    Calcula (o reutiliza) el mapa de riesgo de un escenario sobre toda la
+    ciudad con el modelo de coordenadas.
+
+    Returns:
+        Clave del mapa, plantilla de URL de las teselas XYZ para folium,
+        límites en WGS84 y estadísticas del riesgo
+    """
+    inicio = time.perf_counter()
+    try:
+        mapa = generador_mapas.calcular(escenario.model_dump())
+    except Exception as e:
+        logger.error(f"Error calculando el mapa de riesgo: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor calculando el mapa de riesgo")
+
+    base = str(request.base_url).rstrip("/")
+    return {
+        "clave": mapa.clave,
+        "teselas": f"{base}/mapa/riesgo/{mapa.clave}/{{z}}/{{x}}/{{y}}.png",
+        "limites": mapa.limites_wgs84(),
+        "paso_m": mapa.paso_m,
+        "estadisticas": mapa.estadisticas(),
+        "duracion_ms": duracion_ms(inicio),
+    }
+
+@app.get("/mapa/riesgo/{clave}/{z}/{x}/{y}.png")
+def mapa_riesgo_tesela(clave: str, z: int, x: int, y: int):
+    """Tesela PNG de un mapa de riesgo calculado con POST /mapa/riesgo"""
+    if not zooms_validos(z) or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tesela fuera de rango")
+    mapa = generador_mapas.obtener(clave)
+    if mapa is None:
+        raise HTTPException(status_code=404, detail="Mapa de riesgo desconocido; calcúlelo con POST /mapa/riesgo")
+    # El contenido de una clave no cambia: la huella del modelo forma parte de ella
+    return Response(mapa.tesela(z, x, y), media_type="image/png",
+                    headers={"Cache-Control": "public, max-age=86400, immutable"})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Histogramas de latencia por etapa y variante en formato Prometheus"""
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+class PerfiladorRequest(BaseModel):
+    intervalo_ms: float = 5.0
+    duracion_s: float = 30.0
+
+@app.post("/admin/perfilador", status_code=202)
+async def admin_perfilador_iniciar(peticion: PerfiladorRequest):
+    """
+    Arranca el perfilador de muestreo durante `duracion_s` segundos. Las pilas
+    más frecuentes se consultan en GET /admin/perfilador y el volcado completo
+    en GET /admin/perfilador/collapsed.
+    """
+    if peticion.intervalo_ms <= 0 or peticion.duracion_s <= 0:
+        raise HTTPException(status_code=400, detail="intervalo_ms y duracion_s deben ser positivos")
+    if not perfilador.iniciar(peticion.intervalo_ms, peticion.duracion_s):
+        raise HTTPException(status_code=409, detail="El perfilador ya está activo")
+    logger.info(f"Perfilador de muestreo activado: cada {peticion.intervalo_ms} ms durante {peticion.duracion_s} s")
+    return perfilador.estado()
+
+@app.delete("/admin/perfilador")
+async def admin_perfilador_detener():
+    """Detiene el perfilador antes de tiempo, conservando las muestras"""
+    await run_in_threadpool(perfilador.detener)
+    return perfilador.estado()
+
+@app.get("/admin/perfilador")
+async def admin_perfilador_estado(top: int = 20):
+    """Estado del perfilador y pilas más frecuentes"""
+    return perfilador.estado(top)
+
+@app.get("/admin/perfilador/collapsed", response_class=PlainTextResponse)
+async def admin_perfilador_collapsed():
+    """Pilas muestreadas en formato collapsed, para flamegraph.pl o speedscope"""
+    return perfilador.collapsed()
+
+# Filas por bloque en /predict/stream
+TAM_BLOQUE_STREAM = int(os.getenv("STREAM_TAM_BLOQUE", "5000"))
+
+FORMATOS_STREAM = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+def puntuar_bloque_stream(bloques: Iterator[Dict[str, List[Any]]], inicio: int) -> Optional[Tuple[int, str]]:
+    """
+    Lee el siguiente bloque de /predict/stream, lo puntúa y lo devuelve como
+    líneas NDJSON junto con su número de filas (None al terminar el cuerpo).
+    Se ejecuta entero en un hilo de trabajo: el análisis del CSV/NDJSON
+    tampoco ocupa el bucle de eventos.
+    """
+    columnas = next(bloques, None)
+    if columnas is None:
+        return None
+    n = len(next(iter(columnas.values())))
+    resultado = puntuar_columnas(registro, columnas, n)
+    registro_auditoria.registrar_columnas("/predict/stream", registro.versiones(), columnas, columnas, resultado)
+    return n, "".join(json.dumps(fila, ensure_ascii=False) + "\n" for fila in registros_salida(resultado, inicio))
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request):
+    """
+    Puntúa un cuerpo CSV (con cabecera) o NDJSON por bloques y devuelve los
+    resultados como NDJSON a medida que se procesa cada bloque, sin cargar
+    el fichero completo en memoria.
+    """
+    tipo = request.headers.get("content-type", "").split(";")[0].strip()
+    formato = FORMATOS_STREAM.get(tipo)
+    if formato is None:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Content-Type no soportado; use uno de {list(FORMATOS_STREAM)}"
+        )
+
+    # El cuerpo se vuelca a un fichero temporal (en memoria hasta 8 MB) antes
+    # de empezar la respuesta: StreamingResponse escucha desconexiones en el
+    # mismo canal de recepción y no puede leerse el cuerpo mientras responde
+    cuerpo = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    async for trozo in request.stream():
+        cuerpo.write(trozo)
+    cuerpo.seek(0)
+
+    async def generar():
+        lector = LectorStream(formato, TAM_BLOQUE_STREAM)
+        total = 0
+        inicio = time.perf_counter()
+
+        def bloques():
+            for trozo in iter(lambda: cuerpo.read(1024 * 1024), b""):
+                yield from lector.alimentar(trozo)
+            yield from lector.finalizar()
+
+        try:
+            pendientes = bloques()
+            while True:
+                bloque = await run_in_threadpool(puntuar_bloque_stream, pendientes, total)
+                if bloque is None:
+                    break
+                n, lineas = bloque
+                yield lineas
+                total += n
+                logger.info(f"/predict/stream: {total} filas ({total / (time.perf_counter() - inicio):,.0f} filas/s)")
+        except Exception as e:
+            # La respuesta ya ha empezado: el error se comunica como última línea
+            logger.error(f"Error en /predict/stream tras {total} filas: {str(e)}")
+            yield json.dumps({"fila": total, "error": str(e)}, ensure_ascii=False) + "\n"
+        finally:
+            cuerpo.close()
+
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+class RecargaRequest(BaseModel):
+    modelos: Optional[List[str]] = None
+    version: Optional[str] = None
+
+@app.post("/admin/recargar", status_code=202)
+async def admin_recargar(peticion: RecargaRequest):
+    """
+    Carga en segundo plano una versión de los modelos y la activa de forma
+    atómica cuando está lista. El progreso se consulta en /modelo/info.
+    """
+    try:
+        lanzada = recargador.recargar_en_segundo_plano(peticion.modelos, peticion.version)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if not lanzada:
+        raise HTTPException(status_code=409, detail="Ya hay una recarga de modelos en curso")
+
+    logger.info(f"Recarga de modelos solicitada: {recargador.ultima}")
+    return recargador.estado()
+
+def evaluacion_activa() -> Optional[Dict[str, Any]]:
+    """
+    Informe de evaluación offline (backend/evaluacion.py) de la versión de
+    modelos en uso, con `vigente` a False si los bundles cargados no son los
+    evaluados
+    """
+    cargados = {nombre: registro.obtener_si_cargado(nombre) for nombre in registro.cargados()}
+    directorio = next((bundle.directorio for bundle in cargados.values()), None)
+    if directorio is None:
+        directorio = registro.directorio_version(registro.version_configurada())
+    informe = evaluacion.cargar_informe(evaluacion.ruta_informe(directorio))
+    if informe is None:
+        return None
+    vigente = all(
+        bundle.version == informe["modelos"].get(nombre, {}).get("huella")
+        for nombre, bundle in cargados.items()
+    )
+    return {**informe, "vigente": vigente}
+
 @app.get("/modelo/info")
 async def modelo_info():
     """Información sobre los modelos cargados"""
     try:
         return {
-            "modelos_disponibles": ["distrito", "coordenadas"],
+            "modelos_disponibles": list(VARIANTES),
             "variables_entrada": [
                 "tipo_vehiculo", "tipo_persona", "tipo_accidente", 
                 "sexo", "rango_edad", "estado_meteorológico"
             ],
-            "ubicacion_opciones": ["cod_distrito", "coordenada_x_utm + coordenada_y_utm"],
+            "vocabulario": vocabulario.HUELLA,
+            "ubicacion_opciones": ["cod_distrito", "coordenada_x_utm + coordenada_y_utm", "latitud + longitud"],
+            "indice_distritos": indice_distritos.info() if indice_distritos is not None else None,
             "salida": {
                 "prediction": "0 = Con asistencia, 1 = Sin asistencia",
                 "probability": "Probabilidad de la clase predicha (0.0-1.0)"
-            }
+            },
+            "version_activa": {
+                nombre: registro.obtener_si_cargado(nombre).etiqueta for nombre in registro.cargados()
+            },
+            "registro": registro.info(),
+            "recarga": recargador.estado(),
+            "evaluacion": evaluacion_activa()
         }
     except Exception as e:
         logger.error(f"Error obteniendo info del modelo: {e}")
@@ -0,0 +1,317 @@
+"""
+Mapa de riesgo precalculado para el dashboard.
+
+Para un escenario (tipo de vehículo, persona, accidente, sexo, edad y
+meteorología) se puntúa de una vez una rejilla UTM regular sobre Madrid con el
+modelo de coordenadas. La rejilla se guarda cuantizada (uint8) en disco y a
+partir de ella se generan teselas XYZ (Web Mercator, 256x256 PNG) para una capa
+de folium; las teselas se escriben en disco la primera vez que se piden.
+
+El riesgo representado es la probabilidad de la clase 0 (con asistencia
+sanitaria), con la escala de color entre el mínimo y el máximo del escenario.
+Los escenarios ya calculados se memorizan en memoria y en disco, con la huella
+del modelo en la clave, de modo que una recarga de modelos invalida los mapas
+anteriores.
+
+Uso (desde cualquier directorio), para precalcular teselas:
+    python backend/mapa_riesgo.py --tipo_vehiculo Turismo --zooms 11 12 13
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geo import IndiceDistritos, utm_a_wgs84, wgs84_a_utm
+from registro_modelos import ModelRegistry
+from vocabulario import CAMPOS_CATEGORICOS
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_MAPAS = Path(os.getenv(
+    "MAPA_RIESGO_DIR", Path(__file__).resolve().parent.parent / "cache" / "mapa_riesgo"
+))
+
+# Extensión del municipio de Madrid en UTM 30N (ETRS89), con margen
+EXTENSION_MADRID = (424000.0, 4462000.0, 456000.0, 4500000.0)
+
+TAM_TESELA = 256
+ZOOM_MIN, ZOOM_MAX = 8, 18
+
+# Valor de la rejilla para celdas sin dato (fuera de Madrid)
+SIN_DATO = 255
+
+
+def _paleta() -> np.ndarray:
+    """Verde -> amarillo -> rojo, semitransparente; el índice 255 es transparente"""
+    paradas = np.array([[26, 152, 80], [254, 224, 139], [215, 48, 39]], dtype=np.float64)
+    t = np.linspace(0, 2, 255)
+    izquierda = np.minimum(t.astype(int), 1)
+    fraccion = (t - izquierda)[:, None]
+    rgb = paradas[izquierda] * (1 - fraccion) + paradas[izquierda + 1] * fraccion
+    paleta = np.zeros((256, 4), dtype=np.uint8)
+    paleta[:255, :3] = rgb.round()
+    paleta[:255, 3] = 170
+    return paleta
+
+
+PALETA = _paleta()
+
+
+def codificar_png(rgba: np.ndarray) -> bytes:
+    """Codifica una imagen RGBA (alto, ancho, 4) uint8 como PNG"""
+    alto, ancho, _ = rgba.shape
+    filas = np.hstack([np.zeros((alto, 1), dtype=np.uint8), rgba.reshape(alto, ancho * 4)])
+
+    def bloque(tipo: bytes, datos: bytes) -> bytes:
+        return struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + bloque(b"IHDR", struct.pack(">IIBBBBB", ancho, alto, 8, 6, 0, 0, 0))
+        + bloque(b"IDAT", zlib.compress(filas.tobytes(), 6))
+        + bloque(b"IEND", b"")
+    )
+
+
+def clave_escenario(escenario: Mapping[str, str], huella_modelo: str, paso_m: float) -> str:
+    datos = json.dumps({"escenario": {c: escenario[c] for c in CAMPOS_CATEGORICOS},
+                        "modelo": huella_modelo, "paso_m": paso_m}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(datos.encode()).hexdigest()[:16]
+
+
+class MapaRiesgo:
+    """Rejilla de riesgo cuantizada de un escenario"""
+
+    def __init__(self, clave: str, rejilla: np.ndarray, origen: Tuple[float, float], paso_m: float,
+                 escenario: Dict[str, str], directorio: Path):
+        self.clave = clave
+        self.rejilla = rejilla
+        self.x0, self.y0 = origen
+        self.paso_m = paso_m
+        self.escenario = escenario
+        self.directorio = directorio
+
+        # Escala de color estirada entre el mínimo y el máximo del escenario
+        validos = rejilla[rejilla != SIN_DATO]
+        minimo, maximo = (int(validos.min()), int(validos.max())) if validos.size else (0, 254)
+        indices = np.arange(256, dtype=np.float64)
+        color = np.clip((indices - minimo) / max(1, maximo - minimo) * 254, 0, 254).round().astype(np.uint8)
+        color[SIN_DATO] = SIN_DATO
+        self._lut = PALETA[color]
+
+    @property
+    def limites_utm(self) -> Tuple[float, float, float, float]:
+        alto, ancho = self.rejilla.shape
+        return self.x0, self.y0, self.x0 + ancho * self.paso_m, self.y0 + alto * self.paso_m
+
+    def limites_wgs84(self) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+        """[[lat_sur, lon_oeste], [lat_norte, lon_este]] para folium"""
+        x0, y0, x1, y1 = self.limites_utm
+        latitudes, longitudes = utm_a_wgs84(np.array([x0, x1, x0, x1]), np.array([y0, y0, y1, y1]))
+        return (float(latitudes.min()), float(longitudes.min())), (float(latitudes.max()), float(longitudes.max()))
+
+    def estadisticas(self) -> Dict[str, Any]:
+        validos = self.rejilla[self.rejilla != SIN_DATO].astype(np.float64) / 254
+        return {
+            "celdas": int(self.rejilla.size),
+            "celdas_con_dato": int(validos.size),
+            "riesgo_min": float(validos.min()) if validos.size else None,
+            "riesgo_medio": float(validos.mean()) if validos.size else None,
+            "riesgo_max": float(validos.max()) if validos.size else None,
+        }
+
+    def guardar(self):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        np.save(self.directorio / "rejilla.npy", self.rejilla)
+        with open(self.directorio / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"origen": [self.x0, self.y0], "paso_m": self.paso_m, "escenario": self.escenario},
+                      f, ensure_ascii=False)
+
+    @classmethod
+    def cargar(cls, clave: str, directorio: Path) -> Optional["MapaRiesgo"]:
+        if not (directorio / "meta.json").exists():
+            return None
+        with open(directorio / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        rejilla = np.load(directorio / "rejilla.npy")
+        return cls(clave, rejilla, tuple(meta["origen"]), meta["paso_m"], meta["escenario"], directorio)
+
+    def tesela(self, z: int, x: int, y: int) -> bytes:
+        """Tesela XYZ en PNG; se guarda en disco la primera vez"""
+        ruta = self.directorio / str(z) / str(x) / f"{y}.png"
+        if ruta.exists():
+            return ruta.read_bytes()
+
+        # Centros de los píxeles de la tesela en Web Mercator -> WGS84 -> UTM
+        n = 2.0 ** z
+        centros = (np.arange(TAM_TESELA) + 0.5) / TAM_TESELA
+        longitudes = (x + centros) / n * 360.0 - 180.0
+        latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + centros) / n))))
+        lat, lon = np.meshgrid(latitudes, longitudes, indexing="ij")
+        ux, uy = wgs84_a_utm(lat, lon)
+
+        alto, ancho = self.rejilla.shape
+        columnas = np.floor((ux - self.x0) / self.paso_m).astype(np.int64)
+        filas = np.floor((uy - self.y0) / self.paso_m).astype(np.int64)
+        dentro = (columnas >= 0) & (columnas < ancho) & (filas >= 0) & (filas < alto)
+        valores = np.full(lat.shape, SIN_DATO, dtype=np.uint8)
+        valores[dentro] = self.rejilla[filas[dentro], columnas[dentro]]
+
+        png = codificar_png(self._lut[valores])
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        temporal = ruta.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        temporal.write_bytes(png)
+        os.replace(temporal, ruta)
+        return png
+
+
+class GeneradorMapas:
+    """
+    Calcula y memoriza mapas de riesgo por escenario.
+
+    Args:
+        registro: Registro de modelos (se usa la variante 'coordenadas')
+        indice_distritos: Si se indica, las celdas fuera de los distritos quedan sin dato
+        directorio: Directorio de la caché en disco
+        paso_m: Lado de las celdas de la rejilla en metros
+        max_escenarios: Escenarios que se mantienen en memoria
+    """
+
+    def __init__(self, registro: ModelRegistry, indice_distritos: Optional[IndiceDistritos] = None,
+                 directorio: Path = DIRECTORIO_MAPAS, paso_m: float = 100.0, max_escenarios: int = 16):
+        self.registro = registro
+        self.indice_distritos = indice_distritos
+        self.directorio = Path(directorio)
+        self.paso_m = paso_m
+        self.max_escenarios = max(1, max_escenarios)
+        self._mapas: "OrderedDict[str, MapaRiesgo]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._mascara: Optional[np.ndarray] = None
+
+    def _rejilla_centros(self) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+        x0, y0, x1, y1 = EXTENSION_MADRID
+        ancho = int(math.ceil((x1 - x0) / self.paso_m))
+        alto = int(math.ceil((y1 - y0) / self.paso_m))
+        xs = x0 + (np.arange(ancho) + 0.5) * self.paso_m
+        ys = y0 + (np.arange(alto) + 0.5) * self.paso_m
+        gx, gy = np.meshgrid(xs, ys)
+        return gx.ravel(), gy.ravel(), (alto, ancho)
+
+    def calcular(self, escenario: Mapping[str, str]) -> MapaRiesgo:
+        """Devuelve el mapa del escenario, calculándolo si no está en memoria ni en disco"""
+        escenario = {c: escenario[c] for c in CAMPOS_CATEGORICOS}
+        bundle = self.registro.get("coordenadas")
+        clave = clave_escenario(escenario, bundle.version, self.paso_m)
+
+        mapa = self.obtener(clave)
+        if mapa is not None:
+            return mapa
+
+        inicio = time.perf_counter()
+        gx, gy, forma = self._rejilla_centros()
+        n = gx.size
+        columnas = {c: [v] * n for c, v in escenario.items()}
+        columnas.update(coordenada_x_utm=gx, coordenada_y_utm=gy)
+
+        if bundle.compilado is not None:
+            probas = bundle.compilado.predecir_proba(bundle.compilado.codificar_columnas(columnas, n))
+            clases = list(bundle.compilado.clases)
+        else:
+            import pandas as pd
+
+            probas = bundle.model.predict_proba(bundle.preprocessor.transform(pd.DataFrame(columnas)))
+            clases = list(bundle.label_encoder.classes_)
+        riesgo = probas[:, clases.index(0)]
+
+        rejilla = np.round(riesgo * 254).astype(np.uint8)
+        if self.indice_distritos is not None:
+            if self._mascara is None:
+                self._mascara = self.indice_distritos.distrito(gx, gy) == 0
+            rejilla[self._mascara] = SIN_DATO
+        rejilla = rejilla.reshape(forma)
+
+        mapa = MapaRiesgo(clave, rejilla, EXTENSION_MADRID[:2], self.paso_m, escenario, self.directorio / clave)
+        mapa.guardar()
+        self._memorizar(mapa)
+        logger.info(f"Mapa de riesgo {clave} calculado: {n} celdas en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return mapa
+
+    def obtener(self, clave: str) -> Optional[MapaRiesgo]:
+        """Mapa ya calculado (en memoria o en disco), o None"""
+        with self._lock:
+            mapa = self._mapas.get(clave)
+            if mapa is not None:
+                self._mapas.move_to_end(clave)
+                return mapa
+        if not clave.isalnum():
+            return None
+        mapa = MapaRiesgo.cargar(clave, self.directorio / clave)
+        if mapa is not None:
+            self._memorizar(mapa)
+        return mapa
+
+    def _memorizar(self, mapa: MapaRiesgo):
+        with self._lock:
+            self._mapas[mapa.clave] = mapa
+            self._mapas.move_to_end(mapa.clave)
+            while len(self._mapas) > self.max_escenarios:
+                self._mapas.popitem(last=False)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {"escenarios_en_memoria": len(self._mapas), "paso_m": self.paso_m, "directorio": str(self.directorio)}
+
+
+def zooms_validos(z: int) -> bool:
+    return ZOOM_MIN <= z <= ZOOM_MAX
+
+
+def teselas_cubiertas(mapa: MapaRiesgo, z: int) -> Sequence[Tuple[int, int]]:
+    """Teselas XYZ del nivel z que cubren la extensión del mapa"""
+    (lat_s, lon_o), (lat_n, lon_e) = mapa.limites_wgs84()
+    n = 2 ** z
+
+    def xy(lat, lon):
+        x = int((lon + 180.0) / 360.0 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+        return x, y
+
+    x0, y0 = xy(lat_n, lon_o)
+    x1, y1 = xy(lat_s, lon_e)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Calcula el mapa de riesgo de un escenario y precalcula sus teselas")
+    parser.add_argument("--tipo_vehiculo", default="Turismo")
+    parser.add_argument("--tipo_persona", default="Conductor")
+    parser.add_argument("--tipo_accidente", default="Colisión lateral")
+    parser.add_argument("--sexo", default="Hombre")
+    parser.add_argument("--rango_edad", default="De 30 a 34 años")
+    parser.add_argument("--estado_meteorologico", default="Despejado")
+    parser.add_argument("--paso", type=float, default=100.0, help="Lado de las celdas en metros")
+    parser.add_argument("--zooms", type=int, nargs="*", default=[11, 12, 13], help="Niveles de zoom a precalcular")
+    args = parser.parse_args()
+
+    escenario = {c: getattr(args, c) for c in CAMPOS_CATEGORICOS[:-1]}
+    escenario["estado_meteorológico"] = args.estado_meteorologico
+    generador = GeneradorMapas(ModelRegistry(), IndiceDistritos.cargar(), paso_m=args.paso)
+    mapa = generador.calcular(escenario)
+    for z in args.zooms:
+        teselas = teselas_cubiertas(mapa, z)
+        inicio = time.perf_counter()
+        for x, y in teselas:
+            mapa.tesela(z, x, y)
+        logger.info(f"Zoom {z}: {len(teselas)} teselas en {time.perf_counter() - inicio:.1f} s")
+    print(f"Mapa {mapa.clave} en {mapa.directorio}: {mapa.estadisticas()}")
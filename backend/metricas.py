@@ -0,0 +1,286 @@
+"""
+Métricas de latencia por etapa en formato Prometheus y perfilador de muestreo.
+
+Los histogramas se implementan aquí (sin dependencias externas) y se exponen
+en formato de texto de Prometheus. Cada etapa de /predict (validación,
+búsqueda en tabla y caché, espera en el micro-batching, construcción del
+DataFrame, transform, predict_proba e inverse_transform) se registra con su
+variante de modelo como etiqueta.
+
+El perfilador de muestreo es un hilo que, mientras está activo, toma cada
+pocos milisegundos la pila de todos los hilos de la API (sys._current_frames)
+y acumula las pilas en formato "collapsed", apto para generar un flamegraph.
+"""
+import bisect
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Cubos por defecto de los histogramas de latencia, en segundos
+CUBOS_LATENCIA = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+def _etiquetas_texto(nombres: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    pares = [f'{n}="{v}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Histograma:
+    """
+    Histograma acumulativo con etiquetas, compatible con Prometheus.
+
+    Args:
+        nombre: Nombre de la métrica
+        ayuda: Descripción para la línea HELP
+        etiquetas: Nombres de las etiquetas
+        cubos: Límites superiores de los cubos
+    """
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 cubos: Sequence[float] = CUBOS_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubos = tuple(sorted(cubos))
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *etiquetas: str):
+        indice = bisect.bisect_left(self.cubos, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                # [conteos por cubo (el último es +Inf), suma, total]
+                serie = self._series[etiquetas] = [[0] * (len(self.cubos) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self) -> Iterator[str]:
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for valores, (conteos, suma, total) in sorted(series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.cubos + (float("inf"),), conteos):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                etiquetas = _etiquetas_texto(self.etiquetas, valores, 'le="' + le + '"')
+                yield f"{self.nombre}_bucket{etiquetas} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas_texto(self.etiquetas, valores)} {suma}"
+            yield f"{self.nombre}_count{_etiquetas_texto(self.etiquetas, valores)} {total}"
+
+    def resumen(self) -> Dict[str, Dict[str, float]]:
+        """Conteo y media por serie, para consultas rápidas en JSON"""
+        with self._lock:
+            return {
+                "/".join(valores): {"conteo": total, "media_ms": suma / total * 1000 if total else 0.0}
+                for valores, (_, suma, total) in self._series.items()
+            }
+
+
+class Contador:
+    """Contador monótono con etiquetas, compatible con Prometheus"""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *etiquetas: str, valor: float = 1.0):
+        with self._lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0.0) + valor
+
+    def exponer(self) -> Iterator[str]:
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        with self._lock:
+            series = dict(self._series)
+        for valores, total in sorted(series.items()):
+            yield f"{self.nombre}{_etiquetas_texto(self.etiquetas, valores)} {total}"
+
+
+class MetricasInferencia:
+    """
+    Métricas de la API: latencia por etapa y variante, latencia total de
+    /predict por resultado, contador de peticiones y de peticiones rechazadas
+    por el control de admisión.
+
+    Args:
+        activas: Si es False, `etapa` y `observar_etapa` no registran nada
+    """
+
+    def __init__(self, activas: bool = True):
+        self.activas = activas
+        self.latencia_etapa = Histograma(
+            "lesividad_etapa_segundos",
+            "Latencia de cada etapa de la inferencia por variante de modelo",
+            ("etapa", "modelo"),
+        )
+        self.latencia_peticion = Histograma(
+            "lesividad_peticion_segundos",
+            "Latencia total de /predict dentro de la aplicación por variante y origen del resultado",
+            ("modelo", "origen"),
+        )
+        self.peticiones = Contador(
+            "lesividad_peticiones_total",
+            "Peticiones a /predict por variante y origen del resultado",
+            ("modelo", "origen"),
+        )
+        self.rechazos = Contador(
+            "lesividad_rechazos_total",
+            "Peticiones a /predict rechazadas por el control de admisión por variante y motivo",
+            ("modelo", "motivo"),
+        )
+        self.filas_lote = Histograma(
+            "lesividad_filas_lote",
+            "Filas por lote procesado por el modelo",
+            ("modelo",),
+            cubos=(1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 10000),
+        )
+
+    def observar_etapa(self, etapa: str, modelo: str, segundos: float):
+        if self.activas:
+            self.latencia_etapa.observar(segundos, etapa, modelo)
+
+    @contextmanager
+    def etapa(self, etapa: str, modelo: str):
+        """Cronometra el bloque como una etapa de la variante indicada"""
+        if not self.activas:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencia_etapa.observar(time.perf_counter() - inicio, etapa, modelo)
+
+    def observar_peticion(self, modelo: str, origen: str, segundos: float):
+        if self.activas:
+            self.latencia_peticion.observar(segundos, modelo, origen)
+            self.peticiones.incrementar(modelo, origen)
+
+    def exponer(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus"""
+        lineas: List[str] = []
+        for metrica in (self.latencia_etapa, self.latencia_peticion, self.peticiones, self.rechazos, self.filas_lote):
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+class PerfiladorMuestreo:
+    """
+    Perfilador de muestreo activable en tiempo de ejecución.
+
+    Mientras está activo, un hilo toma la pila de cada hilo del proceso cada
+    `intervalo_ms` y cuenta las pilas. Se detiene solo al cabo de `duracion_s`
+    para que no quede encendido por olvido.
+    """
+
+    def __init__(self, max_profundidad: int = 64):
+        self.max_profundidad = max_profundidad
+        self._pilas: Counter = Counter()
+        self._hilo: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self.intervalo_ms = 0.0
+        self.muestras = 0
+        self.inicio: Optional[float] = None
+        self.fin: Optional[float] = None
+
+    @property
+    def activo(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self, intervalo_ms: float = 5.0, duracion_s: float = 30.0) -> bool:
+        """Arranca un nuevo muestreo (descarta el anterior). False si ya hay uno activo"""
+        with self._lock:
+            if self.activo:
+                return False
+            self._pilas = Counter()
+            self.muestras = 0
+            self.intervalo_ms = intervalo_ms
+            self.inicio, self.fin = time.time(), None
+            self._parar.clear()
+            self._hilo = threading.Thread(
+                target=self._muestrear, args=(intervalo_ms / 1000.0, duracion_s),
+                name="perfilador-muestreo", daemon=True,
+            )
+            self._hilo.start()
+        return True
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def _pila(self, frame) -> str:
+        marcos = []
+        while frame is not None and len(marcos) < self.max_profundidad:
+            codigo = frame.f_code
+            marcos.append(f"{codigo.co_name} ({codigo.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(marcos))
+
+    def _muestrear(self, intervalo: float, duracion_s: float):
+        propio = threading.get_ident()
+        nombres = {}
+        limite = time.monotonic() + duracion_s
+        while not self._parar.wait(intervalo) and time.monotonic() < limite:
+            if len(nombres) != threading.active_count():
+                nombres = {h.ident: h.name for h in threading.enumerate()}
+            pilas = [
+                f"{nombres.get(ident, ident)};{self._pila(frame)}"
+                for ident, frame in sys._current_frames().items() if ident != propio
+            ]
+            with self._lock:
+                self._pilas.update(pilas)
+                self.muestras += 1
+        self.fin = time.time()
+
+    def collapsed(self) -> str:
+        """Pilas en formato collapsed ("marco;marco;... conteo"), para flamegraph.pl o speedscope"""
+        with self._lock:
+            pilas = self._pilas.copy()
+        return "\n".join(f"{pila} {n}" for pila, n in pilas.most_common()) + "\n"
+
+    def estado(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            pilas = self._pilas.copy()
+        return {
+            "activo": self.activo,
+            "intervalo_ms": self.intervalo_ms,
+            "muestras": self.muestras,
+            "inicio": self.inicio,
+            "fin": self.fin,
+            "pilas_mas_frecuentes": [
+                {"pila": pila, "muestras": n} for pila, n in pilas.most_common(top)
+            ],
+        }
+
+
+class MarcaLlegada:
+    """
+    Middleware ASGI que anota en el estado de la petición el instante de
+    llegada, para medir lo que ocurre antes del endpoint (lectura del cuerpo y
+    validación con Pydantic).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["llegada"] = time.perf_counter()
+        await self.app(scope, receive, send)
@@ -0,0 +1,145 @@
+"""
+Agrupación de peticiones concurrentes de /predict en micro-lotes.
+
+Las peticiones que llegan dentro de una ventana de tiempo (o hasta alcanzar un
+número máximo de filas) se agrupan por modelo (y por el tipo de respuesta
+pedida) y cada grupo se procesa como un
+único lote vectorizado en un hilo de trabajo, sin bloquear el bucle de eventos.
+"""
+import asyncio
+import bisect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores de los cubos del histograma de tamaños de lote
+CUBOS_TAMANO_LOTE = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """
+    Coalescedor de peticiones en proceso.
+
+    Args:
+        procesar: Función (grupo, registros) -> lista de resultados,
+            ejecutada en un hilo de trabajo; el grupo es la clave con la que
+            se encoló cada registro (por ejemplo, el nombre del modelo)
+        ventana_ms: Tiempo máximo que se espera a completar un lote
+        max_filas: Número máximo de filas por lote
+        hilos: Número de hilos de trabajo
+    """
+
+    def __init__(self, procesar: Callable[[Hashable, List[Any]], List[Dict[str, Any]]],
+                 ventana_ms: float = 2.0, max_filas: int = 64, hilos: int = 1):
+        self.procesar = procesar
+        self.ventana = ventana_ms / 1000.0
+        self.max_filas = max(1, max_filas)
+        self.hilos = max(1, hilos)
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cola: Optional[asyncio.Queue] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._en_proceso = 0
+        self._lotes = 0
+        self._filas = 0
+        self._histograma = [0] * (len(CUBOS_TAMANO_LOTE) + 1)
+
+    def iniciar(self):
+        """Arranca el bucle de agrupación en el bucle de eventos actual"""
+        self._loop = asyncio.get_running_loop()
+        self._cola = asyncio.Queue()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="microbatch")
+        self._tarea = self._loop.create_task(self._bucle())
+        logger.info(f"Micro-batching activo: ventana {self.ventana * 1000:.1f} ms, máximo {self.max_filas} filas")
+
+    async def detener(self):
+        """Detiene el bucle de agrupación y libera los hilos de trabajo"""
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def predecir(self, grupo: Hashable, registro) -> Dict[str, Any]:
+        """Encola un registro en su grupo y espera su resultado"""
+        if self._tarea is None or self._tarea.done() or self._loop is not asyncio.get_running_loop():
+            self.iniciar()
+        futuro = self._loop.create_future()
+        self._cola.put_nowait((grupo, registro, futuro))
+        return await futuro
+
+    async def _bucle(self):
+        while True:
+            pendientes = [await self._cola.get()]
+            limite = self._loop.time() + self.ventana
+
+            # Completar el lote hasta agotar la ventana o el máximo de filas
+            while len(pendientes) < self.max_filas:
+                restante = limite - self._loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    pendientes.append(await asyncio.wait_for(self._cola.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            grupos: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+            for grupo, registro, futuro in pendientes:
+                if not futuro.cancelled():
+                    grupos.setdefault(grupo, []).append((registro, futuro))
+
+            for grupo, elementos in grupos.items():
+                self._loop.create_task(self._ejecutar(grupo, elementos))
+
+    async def _ejecutar(self, grupo: Hashable, elementos: List[Tuple[Any, asyncio.Future]]):
+        registros = [registro for registro, _ in elementos]
+        self._registrar_lote(len(registros))
+        self._en_proceso += len(registros)
+        try:
+            resultados = await self._loop.run_in_executor(
+                self._executor, self.procesar, grupo, registros
+            )
+        except Exception as e:
+            for _, futuro in elementos:
+                if not futuro.done():
+                    futuro.set_exception(e)
+        else:
+            for (_, futuro), resultado in zip(elementos, resultados):
+                if not futuro.done():
+                    futuro.set_result(resultado)
+        finally:
+            self._en_proceso -= len(registros)
+
+    def _registrar_lote(self, tamano: int):
+        self._lotes += 1
+        self._filas += tamano
+        self._histograma[bisect.bisect_left(CUBOS_TAMANO_LOTE, tamano)] += 1
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Profundidad de cola e histograma de tamaños de lote"""
+        acumulado = 0
+        histograma = {}
+        for limite, cuenta in zip(list(CUBOS_TAMANO_LOTE) + ["+Inf"], self._histograma):
+            acumulado += cuenta
+            histograma[f"le_{limite}"] = acumulado
+        return {
+            "ventana_ms": self.ventana * 1000,
+            "max_filas": self.max_filas,
+            "hilos": self.hilos,
+            "cola": self._cola.qsize() if self._cola is not None else 0,
+            "en_proceso": self._en_proceso,
+            "lotes": self._lotes,
+            "filas": self._filas,
+            "tamano_medio_lote": self._filas / self._lotes if self._lotes else 0.0,
+            "histograma_tamano_lote": histograma,
+        }
@@ -0,0 +1,357 @@
+"""
+Puntuación masiva de ficheros históricos de accidentes.
+
+Lee ficheros CSV o Parquet en bloques de tamaño fijo, puntúa cada bloque con
+los mismos modelos que la API y escribe el resultado de forma incremental
+(NDJSON o Parquet), de modo que la memoria no depende del tamaño del fichero.
+
+Uso (desde cualquier directorio):
+    python backend/puntuacion_masiva.py accidentes.csv puntuados.parquet --bloque 50000
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from geo import wgs84_a_utm
+from registro_modelos import ModelRegistry
+from vocabulario import CAMPOS_CATEGORICOS, CODIGO_INVALIDO, VOCABULARIO, categorias_columna, filas_invalidas
+
+logger = logging.getLogger(__name__)
+
+ERROR_UBICACION = "ubicacion_insuficiente"
+ERROR_CODIGO = "codigo_categoria_invalido"
+
+TAM_BLOQUE = 50000
+
+
+def columna_numerica(columnas: Mapping[str, Sequence], columna: str, n: int) -> np.ndarray:
+    """Columna numérica de un bloque como float64 (NaN si falta la columna, el valor es None o vacío)"""
+    valores = columnas.get(columna)
+    if valores is None:
+        return np.full(n, np.nan)
+    return np.asarray([np.nan if v is None or v == "" else v for v in valores], dtype=np.float64).reshape(n)
+
+
+def enrutar_ubicacion(distrito: np.ndarray, x: np.ndarray, y: np.ndarray,
+                      latitud: Optional[np.ndarray] = None, longitud: Optional[np.ndarray] = None):
+    """
+    Modelo de cada fila: distrito si tiene cod_distrito, coordenadas si tiene
+    ambas coordenadas UTM (o latitud y longitud, que se proyectan a UTM 30N).
+
+    Returns:
+        Máscaras (usa_distrito, usa_coordenadas) y las coordenadas x, y completadas
+    """
+    if latitud is not None and longitud is not None:
+        proyectar = (np.isnan(x) | np.isnan(y)) & ~np.isnan(latitud) & ~np.isnan(longitud)
+        if proyectar.any():
+            x, y = x.copy(), y.copy()
+            x[proyectar], y[proyectar] = wgs84_a_utm(latitud[proyectar], longitud[proyectar])
+    usa_distrito = ~np.isnan(distrito)
+    usa_coordenadas = ~usa_distrito & ~np.isnan(x) & ~np.isnan(y)
+    return usa_distrito, usa_coordenadas, x, y
+
+
+def _resultado(n: int, usa_distrito: np.ndarray, usa_coordenadas: np.ndarray) -> Dict[str, np.ndarray]:
+    resultado = {
+        "prediction": np.full(n, -1, dtype=np.int64),
+        "probability": np.full(n, np.nan),
+        "modelo": np.full(n, None, dtype=object),
+        "error": np.full(n, None, dtype=object),
+    }
+    resultado["error"][~(usa_distrito | usa_coordenadas)] = ERROR_UBICACION
+    return resultado
+
+
+def _asignar(resultado: Dict[str, np.ndarray], bundle, mascara: np.ndarray, probas: np.ndarray):
+    clase = probas.argmax(axis=1)
+    resultado["prediction"][mascara] = bundle.label_encoder.inverse_transform(clase)
+    resultado["probability"][mascara] = probas[np.arange(len(probas)), clase]
+    resultado["modelo"][mascara] = bundle.nombre
+
+
+def categorias_codigos(campo: str, codigos: np.ndarray) -> np.ndarray:
+    """Categorías (array de objetos) de un array de códigos; -1 pasa a None"""
+    categorias = np.asarray(VOCABULARIO[campo] + (None,), dtype=object)
+    return categorias[codigos]
+
+
+def predecir_proba_columnas(bundle, columnas: Mapping[str, Sequence], n: int) -> np.ndarray:
+    """predict_proba de un bundle sobre columnas ya decodificadas (categorías y numéricas)"""
+    if bundle.compilado is not None:
+        return bundle.compilado.predecir_proba(bundle.compilado.codificar_columnas(columnas, n))
+    import pandas as pd
+
+    return bundle.model.predict_proba(bundle.preprocessor.transform(pd.DataFrame(columnas)))
+
+
+def puntuar_columnas(registro: ModelRegistry, columnas: Mapping[str, Sequence], n: int) -> Dict[str, np.ndarray]:
+    """
+    Puntúa un bloque organizado por columnas. Cada fila usa el modelo de
+    distrito si tiene cod_distrito, o el de coordenadas si tiene ambas
+    coordenadas UTM (o latitud y longitud, que se proyectan a UTM 30N). Las
+    columnas categóricas pueden traer códigos enteros del vocabulario; las
+    filas con un código fuera de rango o un booleano no se puntúan (error
+    ERROR_CODIGO), igual que /predict las rechaza.
+
+    Returns:
+        Dict con los arrays 'prediction' (-1 si no se puede predecir),
+        'probability' (NaN si no se puede predecir), 'modelo' y 'error'
+        (motivo por el que no se ha predicho la fila, o None)
+    """
+    faltan = [c for c in CAMPOS_CATEGORICOS if c not in columnas]
+    if faltan:
+        raise ValueError(f"Faltan columnas obligatorias: {faltan}")
+
+    latitud = longitud = None
+    if "latitud" in columnas and "longitud" in columnas:
+        latitud = columna_numerica(columnas, "latitud", n)
+        longitud = columna_numerica(columnas, "longitud", n)
+    distrito = columna_numerica(columnas, "cod_distrito", n)
+    usa_distrito, usa_coordenadas, x, y = enrutar_ubicacion(
+        distrito, columna_numerica(columnas, "coordenada_x_utm", n), columna_numerica(columnas, "coordenada_y_utm", n),
+        latitud, longitud
+    )
+    invalidas = np.zeros(n, dtype=bool)
+    for c in CAMPOS_CATEGORICOS:
+        invalidas[filas_invalidas(c, columnas[c])] = True
+    usa_distrito &= ~invalidas
+    usa_coordenadas &= ~invalidas
+    resultado = _resultado(n, usa_distrito, usa_coordenadas)
+    resultado["error"][invalidas] = ERROR_CODIGO
+
+    for nombre, mascara, numericas in (
+        ("distrito", usa_distrito, {"cod_distrito": distrito}),
+        ("coordenadas", usa_coordenadas, {"coordenada_x_utm": x, "coordenada_y_utm": y}),
+    ):
+        m = int(mascara.sum())
+        if m == 0:
+            continue
+        bundle = registro.get(nombre)
+        sub = {c: np.asarray(categorias_columna(c, columnas[c]), dtype=object)[mascara] for c in CAMPOS_CATEGORICOS}
+        sub.update({c: v[mascara] for c, v in numericas.items()})
+        _asignar(resultado, bundle, mascara, predecir_proba_columnas(bundle, sub, m))
+
+    return resultado
+
+
+def puntuar_codigos(registro: ModelRegistry, codigos: Mapping[str, np.ndarray],
+                    numericas: Mapping[str, np.ndarray], n: int) -> Dict[str, np.ndarray]:
+    """
+    Como puntuar_columnas, pero con las variables categóricas ya convertidas
+    en códigos del vocabulario (arrays enteros, -1 = desconocida,
+    CODIGO_INVALIDO = no interpretable) y las numéricas en arrays float64
+    (NaN = ausente). No crea objetos Python por
+    fila salvo en la ruta pandas de los bundles sin ruta compilada.
+    """
+    faltan = [c for c in CAMPOS_CATEGORICOS if c not in codigos]
+    if faltan:
+        raise ValueError(f"Faltan columnas obligatorias: {faltan}")
+
+    def numerica(columna: str) -> np.ndarray:
+        valores = numericas.get(columna)
+        return np.full(n, np.nan) if valores is None else valores
+
+    distrito = numerica("cod_distrito")
+    usa_distrito, usa_coordenadas, x, y = enrutar_ubicacion(
+        distrito, numerica("coordenada_x_utm"), numerica("coordenada_y_utm"),
+        numericas.get("latitud"), numericas.get("longitud")
+    )
+    invalidas = np.logical_or.reduce([codigos[c] == CODIGO_INVALIDO for c in CAMPOS_CATEGORICOS])
+    usa_distrito &= ~invalidas
+    usa_coordenadas &= ~invalidas
+    resultado = _resultado(n, usa_distrito, usa_coordenadas)
+    resultado["error"][invalidas] = ERROR_CODIGO
+
+    for nombre, mascara, sub_numericas in (
+        ("distrito", usa_distrito, {"cod_distrito": distrito}),
+        ("coordenadas", usa_coordenadas, {"coordenada_x_utm": x, "coordenada_y_utm": y}),
+    ):
+        m = int(mascara.sum())
+        if m == 0:
+            continue
+        bundle = registro.get(nombre)
+        sub_codigos = {c: codigos[c][mascara] for c in CAMPOS_CATEGORICOS}
+        sub_numericas = {c: v[mascara] for c, v in sub_numericas.items()}
+
+        if bundle.compilado is not None:
+            probas = bundle.compilado.predecir_proba(bundle.compilado.codificar_codigos(sub_codigos, sub_numericas, m))
+        else:
+            import pandas as pd
+
+            sub = {c: categorias_codigos(c, v) for c, v in sub_codigos.items()}
+            sub.update(sub_numericas)
+            probas = bundle.model.predict_proba(bundle.preprocessor.transform(pd.DataFrame(sub)))
+        _asignar(resultado, bundle, mascara, probas)
+
+    return resultado
+
+
+def registros_salida(resultado: Dict[str, np.ndarray], inicio: int,
+                     extra: Optional[Mapping[str, Sequence]] = None) -> Iterator[Dict[str, Any]]:
+    """Convierte el resultado de un bloque en registros por fila"""
+    extra = extra or {}
+    for i, (pred, prob, modelo, error) in enumerate(zip(
+        resultado["prediction"].tolist(), resultado["probability"].tolist(), resultado["modelo"], resultado["error"]
+    )):
+        fila = {"fila": inicio + i}
+        fila.update({c: v[i] for c, v in extra.items()})
+        if modelo is None:
+            fila.update(prediction=None, probability=None, modelo=None, error=error)
+        else:
+            fila.update(prediction=pred, probability=prob, modelo=modelo, error=None)
+        yield fila
+
+
+def leer_bloques(ruta: str, tam_bloque: int = TAM_BLOQUE) -> Iterator[Dict[str, List[Any]]]:
+    """Lee un fichero CSV o Parquet en bloques de columnas"""
+    if ruta.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        fichero = pq.ParquetFile(ruta)
+        for lote in fichero.iter_batches(batch_size=tam_bloque):
+            yield lote.to_pydict()
+    else:
+        import pandas as pd
+
+        for df in pd.read_csv(ruta, chunksize=tam_bloque, dtype={c: str for c in CAMPOS_CATEGORICOS}):
+            yield {c: df[c].to_numpy() for c in df.columns}
+
+
+class EscritorNDJSON:
+    def __init__(self, ruta: str):
+        self.fichero = open(ruta, "w", encoding="utf-8")
+
+    def escribir(self, registros: Iterable[Dict[str, Any]]):
+        self.fichero.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+
+    def cerrar(self):
+        self.fichero.close()
+
+
+class EscritorParquet:
+    def __init__(self, ruta: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.pq = pq
+        self.ruta = ruta
+        self.escritor = None
+        self.esquema = None
+        self.esquema_base = [
+            pa.field("fila", pa.int64()),
+            pa.field("prediction", pa.int64()),
+            pa.field("probability", pa.float64()),
+            pa.field("modelo", pa.string()),
+            pa.field("error", pa.string()),
+        ]
+
+    def escribir(self, registros: Iterable[Dict[str, Any]]):
+        tabla = self.pa.Table.from_pylist(list(registros))
+        if self.escritor is None:
+            nombres_base = {f.name for f in self.esquema_base}
+            extra = [f for f in tabla.schema if f.name not in nombres_base]
+            self.esquema = self.pa.schema(extra + self.esquema_base)
+            self.escritor = self.pq.ParquetWriter(self.ruta, self.esquema)
+        self.escritor.write_table(tabla.select(self.esquema.names).cast(self.esquema))
+
+    def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+
+
+def puntuar_fichero(registro: ModelRegistry, entrada: str, salida: str,
+                    tam_bloque: int = TAM_BLOQUE, columnas_extra: Sequence[str] = ()) -> int:
+    """
+    Puntúa un fichero completo bloque a bloque.
+
+    Args:
+        columnas_extra: Columnas de la entrada que se copian a la salida (p. ej. un identificador)
+
+    Returns:
+        Número de filas puntuadas
+    """
+    escritor = EscritorParquet(salida) if salida.endswith(".parquet") else EscritorNDJSON(salida)
+    total = 0
+    inicio = time.perf_counter()
+    try:
+        for columnas in leer_bloques(entrada, tam_bloque):
+            n = len(next(iter(columnas.values())))
+            resultado = puntuar_columnas(registro, columnas, n)
+            extra = {c: list(columnas[c]) for c in columnas_extra}
+            escritor.escribir(registros_salida(resultado, total, extra))
+            total += n
+
+            transcurrido = time.perf_counter() - inicio
+            logger.info(f"{total} filas puntuadas ({total / transcurrido:,.0f} filas/s)")
+    finally:
+        escritor.cerrar()
+    return total
+
+
+class LectorStream:
+    """
+    Convierte un cuerpo de petición recibido por trozos (CSV con cabecera o
+    NDJSON) en bloques de columnas.
+    """
+
+    def __init__(self, formato: str, tam_bloque: int = TAM_BLOQUE):
+        self.formato = formato
+        self.tam_bloque = tam_bloque
+        self._resto = b""
+        self._cabecera: Optional[List[str]] = None
+        self._lineas: List[str] = []
+
+    def alimentar(self, trozo: bytes) -> Iterator[Dict[str, List[Any]]]:
+        """Añade un trozo del cuerpo y devuelve los bloques completos"""
+        datos = self._resto + trozo
+        *lineas, self._resto = datos.split(b"\n")
+        for linea in lineas:
+            yield from self._linea(linea.decode("utf-8").rstrip("\r"))
+
+    def finalizar(self) -> Iterator[Dict[str, List[Any]]]:
+        """Devuelve el último bloque incompleto"""
+        if self._resto:
+            yield from self._linea(self._resto.decode("utf-8").rstrip("\r"))
+            self._resto = b""
+        if self._lineas:
+            yield self._bloque()
+
+    def _linea(self, linea: str) -> Iterator[Dict[str, List[Any]]]:
+        if not linea.strip():
+            return
+        if self.formato == "csv" and self._cabecera is None:
+            self._cabecera = next(csv.reader([linea]))
+            return
+        self._lineas.append(linea)
+        if len(self._lineas) >= self.tam_bloque:
+            yield self._bloque()
+
+    def _bloque(self) -> Dict[str, List[Any]]:
+        lineas, self._lineas = self._lineas, []
+        if self.formato == "csv":
+            filas = list(csv.reader(io.StringIO("\n".join(lineas))))
+            return {c: [f[j] if j < len(f) else None for f in filas] for j, c in enumerate(self._cabecera)}
+        objetos = [json.loads(linea) for linea in lineas]
+        claves = dict.fromkeys(k for o in objetos for k in o)
+        return {c: [o.get(c) for o in objetos] for c in claves}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Puntúa ficheros CSV/Parquet de accidentes por bloques")
+    parser.add_argument("entrada", help="Fichero .csv o .parquet")
+    parser.add_argument("salida", help="Fichero .ndjson o .parquet")
+    parser.add_argument("--bloque", type=int, default=TAM_BLOQUE, help="Filas por bloque")
+    parser.add_argument("--columnas-extra", nargs="*", default=[], help="Columnas de la entrada que se copian a la salida")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    n = puntuar_fichero(ModelRegistry(), args.entrada, args.salida, args.bloque, args.columnas_extra)
+    logger.info(f"Completado: {n} filas en {time.perf_counter() - inicio:.1f} s")
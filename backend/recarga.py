@@ -0,0 +1,157 @@
+"""
+Recarga en caliente de los bundles de modelos.
+
+Las recargas se ejecutan en un hilo en segundo plano: el nuevo bundle se carga
+y se calienta mientras la API sigue sirviendo con el anterior, y después se
+sustituye de forma atómica en el registro. Opcionalmente, un vigilante revisa
+periódicamente los artefactos en disco (y el fichero versiones/ACTIVA) y lanza
+una recarga cuando cambian.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from registro_modelos import VARIANTES, ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class RecargadorModelos:
+    """
+    Gestiona recargas en segundo plano y el vigilante de ficheros.
+
+    Args:
+        registro: Registro de modelos cuyos bundles se sustituyen
+        intervalo_s: Periodo del vigilante en segundos (0 lo desactiva)
+    """
+
+    def __init__(self, registro: ModelRegistry, intervalo_s: float = 0.0):
+        self.registro = registro
+        self.intervalo_s = intervalo_s
+
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._vigilante: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._etiqueta_vista = ""
+
+        self.ultima: Dict[str, Any] = {}
+        self.recargas = 0
+        self.errores = 0
+
+    @property
+    def en_curso(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def recargar_en_segundo_plano(self, nombres: Optional[Iterable[str]] = None,
+                                  etiqueta: Optional[str] = None) -> bool:
+        """
+        Lanza la recarga de los bundles indicados (por defecto, todas las
+        variantes). Devuelve False si ya hay una recarga en curso.
+        """
+        nombres = list(nombres or VARIANTES)
+        for nombre in nombres:
+            if nombre not in VARIANTES:
+                raise KeyError(f"Variante de modelo desconocida: {nombre}")
+        if etiqueta is not None:
+            # Falla antes de lanzar el hilo si la versión no existe
+            self.registro.directorio_version(etiqueta)
+
+        with self._lock:
+            if self.en_curso:
+                return False
+            self.ultima = {
+                "estado": "en curso",
+                "modelos": nombres,
+                "version": etiqueta or self.registro.version_configurada(),
+                "inicio": time.time(),
+            }
+            self._hilo = threading.Thread(
+                target=self._recargar, args=(nombres, etiqueta), name="recarga-modelos", daemon=True
+            )
+            self._hilo.start()
+        return True
+
+    def _recargar(self, nombres, etiqueta):
+        inicio = time.perf_counter()
+        try:
+            for nombre in nombres:
+                self.registro.recargar(nombre, etiqueta)
+        except Exception as e:
+            logger.error(f"Error recargando modelos {nombres}: {e}")
+            self.errores += 1
+            self.ultima.update(estado="error", error=str(e))
+        else:
+            self.recargas += 1
+            self.ultima.update(estado="completada")
+        self.ultima["duracion_s"] = round(time.perf_counter() - inicio, 3)
+
+    def iniciar_vigilancia(self):
+        """Arranca el vigilante de ficheros si hay intervalo configurado"""
+        if self.intervalo_s <= 0 or self._vigilante is not None:
+            return
+        self._parar.clear()
+        self._etiqueta_vista = self.registro.version_configurada()
+        self._vigilante = threading.Thread(target=self._vigilar, name="vigilante-modelos", daemon=True)
+        self._vigilante.start()
+        logger.info(f"Vigilancia de artefactos de modelos cada {self.intervalo_s} s")
+
+    def detener(self):
+        """Detiene el vigilante y espera a la recarga en curso"""
+        self._parar.set()
+        if self._vigilante is not None:
+            self._vigilante.join()
+            self._vigilante = None
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def _cambiados(self) -> Dict[str, str]:
+        """
+        Bundles que hay que recargar: todos los cargados si ha cambiado la
+        versión de versiones/ACTIVA, o aquellos cuyos artefactos en disco ya no
+        coinciden con los activos.
+        """
+        etiqueta = self.registro.version_configurada()
+        if etiqueta != self._etiqueta_vista:
+            return {nombre: etiqueta for nombre in self.registro.cargados()}
+
+        cambiados = {}
+        for nombre in self.registro.cargados():
+            bundle = self.registro.obtener_si_cargado(nombre)
+            if self.registro.huella_artefactos(nombre, bundle.directorio) != bundle.version:
+                cambiados[nombre] = bundle.etiqueta
+        return cambiados
+
+    def _vigilar(self):
+        pendientes: Dict[str, str] = {}
+        while not self._parar.wait(self.intervalo_s):
+            try:
+                cambiados = self._cambiados()
+            except Exception as e:
+                logger.warning(f"Error revisando artefactos de modelos: {e}")
+                continue
+
+            # Solo se recarga si el cambio se mantiene entre dos revisiones,
+            # para no leer ficheros que todavía se están escribiendo
+            estables = {n: e for n, e in cambiados.items() if pendientes.get(n) == e}
+            pendientes = cambiados
+            if not estables or self.en_curso:
+                continue
+
+            for etiqueta in set(estables.values()):
+                nombres = [n for n, e in estables.items() if e == etiqueta]
+                logger.info(f"Cambios detectados en los artefactos de {nombres}; recargando versión {etiqueta}")
+                self.recargar_en_segundo_plano(nombres, etiqueta)
+                self._hilo.join()
+            self._etiqueta_vista = self.registro.version_configurada()
+            pendientes = {}
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "en_curso": self.en_curso,
+            "vigilancia_s": self.intervalo_s,
+            "recargas": self.recargas,
+            "errores": self.errores,
+            "ultima": self.ultima,
+        }
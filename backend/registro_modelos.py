@@ -0,0 +1,409 @@
+"""
+Registro de modelos con carga perezosa.
+
+Cada variante ('distrito', 'coordenadas') es un bundle formado por el modelo
+XGBoost, su preprocesador y su label encoder. Los bundles se cargan la primera
+vez que se usan y quedan en memoria. Las rutas se resuelven respecto al
+directorio de modelos (por defecto `modelos/` en la raíz del repositorio, o la
+variable de entorno MODELOS_DIR), no respecto al directorio de trabajo.
+
+El modelo puede cargarse desde el formato nativo de XGBoost (.ubj o .json),
+que es más rápido que deserializar el pickle. Para generarlo:
+    python backend/registro_modelos.py --exportar
+
+Con MODELOS_RUNTIME=ligero el registro carga en su lugar el artefacto
+autocontenido de runtime_ligero.py, que solo necesita NumPy:
+    python backend/runtime_ligero.py --exportar
+
+Versiones: la versión 'base' son los artefactos de `modelos/`. Otras versiones
+se guardan en `modelos/versiones/<version>/` con la misma estructura; el
+fichero `modelos/versiones/ACTIVA` (si existe) indica la versión que se carga
+al arrancar.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from inferencia_rapida import PipelineCompilado
+from tabla_distrito import TablaDistrito
+from vocabulario import VOCABULARIO, vocabulario_preprocesador
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_MODELOS = Path(os.getenv("MODELOS_DIR", Path(__file__).resolve().parent.parent / "modelos"))
+
+PREFIJO = "xgboost_binario_balanceado_smote"
+
+VARIANTES = ("distrito", "coordenadas")
+
+# Formatos nativos de XGBoost, por orden de preferencia
+FORMATOS_NATIVOS = (".ubj", ".json")
+
+VERSION_BASE = "base"
+
+RUNTIME_XGBOOST = "xgboost"
+RUNTIME_LIGERO = "ligero"
+RUNTIMES = (RUNTIME_XGBOOST, RUNTIME_LIGERO)
+
+RUNTIME = os.getenv("MODELOS_RUNTIME", RUNTIME_XGBOOST)
+
+
+@dataclass
+class ModelBundle:
+    """Modelo, preprocesador y label encoder de una variante"""
+    nombre: str
+    model: Any
+    preprocessor: Any
+    label_encoder: Any
+    version: str
+    etiqueta: str
+    directorio: Path
+    formato_modelo: str
+    tiempos_carga: Dict[str, float] = field(default_factory=dict)
+    compilado: Optional[PipelineCompilado] = None
+    tabla: Optional[TablaDistrito] = None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.etiqueta,
+            "huella": self.version,
+            "formato_modelo": self.formato_modelo,
+            "ruta_rapida": self.compilado is not None,
+            "tabla_precalculada": self.tabla.info() if self.tabla is not None else None,
+            "tiempos_carga_ms": {k: round(v * 1000, 2) for k, v in self.tiempos_carga.items()},
+        }
+
+
+def calentar(bundle: ModelBundle, filas: int = 8):
+    """
+    Ejecuta predicciones sintéticas sobre un bundle recién cargado para que el
+    primer uso real no pague la inicialización, y comprueba que las
+    probabilidades son válidas.
+    """
+    if bundle.compilado is None or filas <= 0:
+        return
+    compilado = bundle.compilado
+    registros = []
+    for i in range(filas):
+        valores = {
+            columna: list(compilado.vocabularios[columna])[i % len(compilado.vocabularios[columna])]
+            for columna in compilado.columnas_categoricas
+        }
+        for j, columna in enumerate(compilado.columnas_numericas):
+            valores[columna] = float(compilado._medias[j])
+        registros.append(SimpleNamespace(**valores))
+
+    inicio = time.perf_counter()
+    probas = compilado.predecir_proba(compilado.codificar(registros))
+    compilado.predecir(registros[0])
+    if not np.all(np.isfinite(probas)) or np.any(probas < 0) or np.any(probas > 1):
+        raise ValueError(f"El modelo {bundle.nombre} devuelve probabilidades no válidas")
+    bundle.tiempos_carga["calentamiento"] = time.perf_counter() - inicio
+
+
+class ModelRegistry:
+    """
+    Registro de bundles cargados bajo demanda.
+
+    Args:
+        directorio: Directorio con los artefactos (modelos/, preprocessor/, label_encoder/)
+        nthread: Hilos de XGBoost por booster (None = valor por defecto de XGBoost)
+        runtime: 'xgboost' (pickles y booster) o 'ligero' (solo el artefacto .npz)
+    """
+
+    def __init__(self, directorio: Path = DIRECTORIO_MODELOS, nthread: Optional[int] = None,
+                 runtime: str = RUNTIME):
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Runtime de modelos desconocido: {runtime} (use uno de {RUNTIMES})")
+        self.directorio = Path(directorio)
+        self.nthread = nthread
+        self.runtime = runtime
+        self._bundles: Dict[str, ModelBundle] = {}
+        self._locks = {nombre: threading.Lock() for nombre in VARIANTES}
+        self._version = ""
+
+    def directorio_version(self, etiqueta: str) -> Path:
+        """Directorio de artefactos de una versión"""
+        if etiqueta == VERSION_BASE:
+            return self.directorio
+        directorio = self.directorio / "versiones" / etiqueta
+        if not directorio.is_dir():
+            raise FileNotFoundError(f"No existe la versión de modelos '{etiqueta}' ({directorio})")
+        return directorio
+
+    def version_configurada(self) -> str:
+        """Versión indicada en modelos/versiones/ACTIVA, o 'base'"""
+        puntero = self.directorio / "versiones" / "ACTIVA"
+        if puntero.exists():
+            etiqueta = puntero.read_text(encoding="utf-8").strip()
+            if etiqueta:
+                return etiqueta
+        return VERSION_BASE
+
+    def rutas(self, nombre: str, directorio: Optional[Path] = None) -> Dict[str, Path]:
+        """Rutas de los artefactos pickle de una variante"""
+        directorio = directorio or self.directorio
+        return {
+            "modelo": directorio / f"{PREFIJO}_modelo_{nombre}.pkl",
+            "preprocessor": directorio / "preprocessor" / f"{PREFIJO}_preprocessor_{nombre}.pkl",
+            "label_encoder": directorio / "label_encoder" / f"{PREFIJO}_label_encoder_{nombre}.pkl",
+        }
+
+    def ruta_nativa(self, nombre: str, extension: str = ".ubj", directorio: Optional[Path] = None) -> Path:
+        """Ruta del booster en formato nativo de XGBoost"""
+        return (directorio or self.directorio) / f"{PREFIJO}_modelo_{nombre}{extension}"
+
+    def ruta_ligera(self, nombre: str, directorio: Optional[Path] = None) -> Path:
+        """Ruta del artefacto del runtime ligero"""
+        return (directorio or self.directorio) / f"{PREFIJO}_ligero_{nombre}.npz"
+
+    def ruta_tabla(self, directorio: Optional[Path] = None) -> Path:
+        """Ruta de la tabla precalculada del modelo de distrito"""
+        if directorio is None or directorio == self.directorio:
+            return Path(os.getenv("TABLA_DISTRITO", self.directorio / "tabla" / "tabla_distrito.npy"))
+        return directorio / "tabla" / "tabla_distrito.npy"
+
+    def huella_artefactos(self, nombre: str, directorio: Optional[Path] = None) -> str:
+        """Huella (nombre, tamaño, fecha) de los artefactos en disco de una variante"""
+        directorio = directorio or self.directorio
+        rutas = list(self.rutas(nombre, directorio).values())
+        rutas += [self.ruta_nativa(nombre, extension, directorio) for extension in FORMATOS_NATIVOS]
+        rutas.append(self.ruta_ligera(nombre, directorio))
+        huella = hashlib.sha256()
+        for ruta in rutas:
+            if ruta.exists():
+                estado = ruta.stat()
+                huella.update(f"{ruta}:{estado.st_size}:{estado.st_mtime_ns}".encode())
+        return huella.hexdigest()[:12]
+
+    @property
+    def version(self) -> str:
+        """Versión conjunta de los bundles cargados"""
+        return self._version
+
+    def _actualizar_version(self):
+        self._version = "+".join(f"{n}:{b.version}" for n, b in sorted(self._bundles.items()))
+
+    def cargados(self) -> List[str]:
+        return list(self._bundles)
+
+    def versiones(self) -> Dict[str, Tuple[str, str]]:
+        """(etiqueta, huella) de cada bundle cargado, para el registro de auditoría"""
+        return {nombre: (bundle.etiqueta, bundle.version) for nombre, bundle in list(self._bundles.items())}
+
+    def obtener_si_cargado(self, nombre: str) -> Optional[ModelBundle]:
+        """Devuelve el bundle si ya está en memoria, sin provocar su carga"""
+        return self._bundles.get(nombre)
+
+    def get(self, nombre: str) -> ModelBundle:
+        """Devuelve el bundle de una variante, cargándolo si es la primera vez"""
+        bundle = self._bundles.get(nombre)
+        if bundle is not None:
+            return bundle
+        if nombre not in self._locks:
+            raise KeyError(f"Variante de modelo desconocida: {nombre}")
+
+        with self._locks[nombre]:
+            bundle = self._bundles.get(nombre)
+            if bundle is None:
+                bundle = self._cargar(nombre, self.version_configurada())
+                self._bundles[nombre] = bundle
+                self._actualizar_version()
+        return bundle
+
+    def recargar(self, nombre: str, etiqueta: Optional[str] = None, filas_calentamiento: int = 8) -> ModelBundle:
+        """
+        Carga una nueva versión de un bundle, la calienta y la sustituye de
+        forma atómica. Las peticiones en curso terminan con el bundle anterior,
+        que se libera cuando deja de estar referenciado.
+
+        Args:
+            nombre: Variante a recargar
+            etiqueta: Versión a cargar (por defecto, la configurada en ACTIVA o 'base')
+            filas_calentamiento: Predicciones sintéticas antes de activar el bundle
+        """
+        if nombre not in self._locks:
+            raise KeyError(f"Variante de modelo desconocida: {nombre}")
+
+        with self._locks[nombre]:
+            nuevo = self._cargar(nombre, etiqueta or self.version_configurada())
+            calentar(nuevo, filas_calentamiento)
+
+            anterior = self._bundles.get(nombre)
+            self._bundles[nombre] = nuevo
+            self._actualizar_version()
+
+        if anterior is not None:
+            weakref.finalize(anterior, logger.info, f"Bundle {nombre} versión {anterior.etiqueta} ({anterior.version}) liberado")
+            logger.info(
+                f"Modelo {nombre} activo: versión {nuevo.etiqueta} ({nuevo.version}), "
+                f"sustituye a {anterior.etiqueta} ({anterior.version})"
+            )
+        return nuevo
+
+    def _modelo_nativo(self, nombre: str, ruta_pickle: Path, directorio: Path) -> Optional[Path]:
+        for extension in FORMATOS_NATIVOS:
+            ruta = self.ruta_nativa(nombre, extension, directorio)
+            if not ruta.exists():
+                continue
+            if ruta_pickle.exists() and ruta.stat().st_mtime < ruta_pickle.stat().st_mtime:
+                logger.warning(f"{ruta.name} es más antiguo que el pickle del modelo; se ignora")
+                continue
+            return ruta
+        return None
+
+    def _cargar(self, nombre: str, etiqueta: str = VERSION_BASE) -> ModelBundle:
+        directorio = self.directorio_version(etiqueta)
+        if self.runtime == RUNTIME_LIGERO:
+            bundle = self._cargar_ligero(nombre, etiqueta, directorio)
+        else:
+            bundle = self._cargar_xgboost(nombre, etiqueta, directorio)
+        tiempos = bundle.tiempos_carga
+        formato = bundle.formato_modelo
+
+        # Tabla precalculada del modelo de distrito (opcional, ver tabla_distrito.py)
+        if nombre == "distrito" and bundle.compilado is not None:
+            inicio = time.perf_counter()
+            try:
+                bundle.tabla = TablaDistrito.cargar(bundle.compilado, str(self.ruta_tabla(directorio)))
+            except Exception as e:
+                logger.warning(f"No se pudo cargar la tabla de distrito: {e}")
+            tiempos["tabla"] = time.perf_counter() - inicio
+
+        total = sum(tiempos.values()) * 1000
+        detalle = ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in tiempos.items())
+        logger.info(f"Modelo {nombre} versión {etiqueta} cargado ({formato}) en {total:.1f} ms: {detalle}")
+        return bundle
+
+    def _cargar_ligero(self, nombre: str, etiqueta: str, directorio: Path) -> ModelBundle:
+        from runtime_ligero import EtiquetasLigeras, PipelineLigero
+
+        ruta = self.ruta_ligera(nombre, directorio)
+        if not ruta.exists():
+            raise FileNotFoundError(f"No existe el artefacto ligero {ruta}; genérelo con "
+                                    f"python backend/runtime_ligero.py --exportar")
+        ruta_pickle = self.rutas(nombre, directorio)["modelo"]
+        if ruta_pickle.exists() and ruta.stat().st_mtime < ruta_pickle.stat().st_mtime:
+            logger.warning(f"{ruta.name} es más antiguo que el pickle del modelo; vuelva a exportarlo")
+        inicio = time.perf_counter()
+        compilado = PipelineLigero(ruta)
+        return ModelBundle(
+            nombre=nombre,
+            model=None,
+            preprocessor=None,
+            label_encoder=EtiquetasLigeras(compilado.clases),
+            version=self.huella_artefactos(nombre, directorio),
+            etiqueta=etiqueta,
+            directorio=directorio,
+            formato_modelo=RUNTIME_LIGERO,
+            tiempos_carga={"artefacto_ligero": time.perf_counter() - inicio},
+            compilado=compilado,
+        )
+
+    def _cargar_xgboost(self, nombre: str, etiqueta: str, directorio: Path) -> ModelBundle:
+        rutas = self.rutas(nombre, directorio)
+        tiempos: Dict[str, float] = {}
+
+        inicio = time.perf_counter()
+        ruta_nativa = self._modelo_nativo(nombre, rutas["modelo"], directorio)
+        if ruta_nativa is not None:
+            import xgboost as xgb
+
+            model = xgb.XGBClassifier()
+            model.load_model(ruta_nativa)
+            formato = ruta_nativa.suffix.lstrip(".")
+            rutas["modelo"] = ruta_nativa
+        else:
+            with open(rutas["modelo"], "rb") as f:
+                model = pickle.load(f)
+            formato = "pickle"
+        if self.nthread:
+            model.set_params(n_jobs=self.nthread)
+            model.get_booster().set_param({"nthread": self.nthread})
+        tiempos["modelo"] = time.perf_counter() - inicio
+
+        artefactos = {}
+        for artefacto in ("preprocessor", "label_encoder"):
+            inicio = time.perf_counter()
+            with open(rutas[artefacto], "rb") as f:
+                artefactos[artefacto] = pickle.load(f)
+            tiempos[artefacto] = time.perf_counter() - inicio
+
+        bundle = ModelBundle(
+            nombre=nombre,
+            model=model,
+            preprocessor=artefactos["preprocessor"],
+            label_encoder=artefactos["label_encoder"],
+            version=self.huella_artefactos(nombre, directorio),
+            etiqueta=etiqueta,
+            directorio=directorio,
+            formato_modelo=formato,
+            tiempos_carga=tiempos,
+        )
+
+        # Compilar la ruta rápida de inferencia; si el preprocesador no es
+        # compatible, el bundle sigue usando la ruta pandas
+        inicio = time.perf_counter()
+        try:
+            bundle.compilado = PipelineCompilado(model, bundle.preprocessor, bundle.label_encoder)
+        except Exception as e:
+            logger.warning(f"Ruta rápida no disponible para el modelo {nombre}: {e}")
+        tiempos["compilacion"] = time.perf_counter() - inicio
+
+        # Los códigos enteros de la API solo son válidos si el modelo usa el
+        # vocabulario compartido (ver vocabulario.py)
+        try:
+            if vocabulario_preprocesador(bundle.preprocessor) != VOCABULARIO:
+                logger.warning(f"El vocabulario del modelo {nombre} no coincide con vocabulario.py; "
+                               f"regenérelo con python backend/vocabulario.py --generar")
+        except ValueError as e:
+            logger.warning(f"No se pudo comprobar el vocabulario del modelo {nombre}: {e}")
+
+        return bundle
+
+    def info(self) -> Dict[str, Any]:
+        """Estado del registro y tiempos de carga por artefacto"""
+        return {
+            "directorio": str(self.directorio),
+            "runtime": self.runtime,
+            "version": self.version,
+            "cargados": {nombre: bundle.info() for nombre, bundle in self._bundles.items()},
+        }
+
+    def exportar_nativo(self, nombre: str, extension: str = ".ubj") -> Path:
+        """Guarda el booster de una variante en formato nativo de XGBoost"""
+        if extension not in FORMATOS_NATIVOS:
+            raise ValueError(f"Formato no soportado: {extension}")
+        with open(self.rutas(nombre)["modelo"], "rb") as f:
+            model = pickle.load(f)
+        ruta = self.ruta_nativa(nombre, extension)
+        model.save_model(ruta)
+        logger.info(f"Modelo {nombre} exportado a {ruta}")
+        return ruta
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Utilidades del registro de modelos")
+    parser.add_argument("--exportar", action="store_true", help="Exporta los boosters a formato nativo")
+    parser.add_argument("--formato", choices=[e.lstrip(".") for e in FORMATOS_NATIVOS], default="ubj")
+    args = parser.parse_args()
+
+    registro = ModelRegistry()
+    if args.exportar:
+        for variante in VARIANTES:
+            registro.exportar_nativo(variante, "." + args.formato)
+    for variante in VARIANTES:
+        registro.get(variante)
+    print(registro.info())
@@ -0,0 +1,290 @@
+"""
+Runtime ligero de inferencia: un artefacto autocontenido evaluado con NumPy.
+
+`exportar` convierte cada bundle (preprocesador, modelo XGBoost y label
+encoder) en un único fichero .npz con el preprocesado de la ruta compilada
+(vocabularios one-hot, medias y escalas), los árboles del booster aplanados
+en arrays contiguos (característica, umbral, hijos, rama por defecto y valor
+de hoja) y las clases. Cargarlo solo requiere NumPy: ni sklearn, ni pandas,
+ni xgboost, ni pickle.
+
+Los árboles se recorren a la vez para todas las filas de un bloque: en cada
+nivel se avanza la posición (fila, árbol) con indexación vectorizada, y las
+hojas apuntan a sí mismas para que las ramas cortas se queden quietas. Las
+comparaciones se hacen en float32, como XGBoost.
+
+Uso (desde cualquier directorio):
+    python backend/runtime_ligero.py --exportar
+    python backend/runtime_ligero.py --verificar
+Para servir solo con los artefactos ligeros: MODELOS_RUNTIME=ligero
+"""
+import argparse
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from inferencia_rapida import PipelineCompilado
+
+logger = logging.getLogger(__name__)
+
+VERSION_FORMATO = 1
+
+# Filas por bloque en el recorrido vectorizado (acota la memoria de filas x árboles)
+TAM_BLOQUE = 4096
+
+
+class EtiquetasLigeras:
+    """Sustituto del LabelEncoder ajustado: solo classes_ e inverse_transform"""
+
+    def __init__(self, clases: np.ndarray):
+        self.classes_ = clases
+
+    def inverse_transform(self, y) -> np.ndarray:
+        return self.classes_[np.asarray(y, dtype=np.intp)]
+
+
+def _profundidad(izquierdos: List[int], derechos: List[int]) -> int:
+    profundidad = 0
+    pendientes = [(0, 0)]
+    while pendientes:
+        nodo, nivel = pendientes.pop()
+        if izquierdos[nodo] == -1:
+            profundidad = max(profundidad, nivel)
+        else:
+            pendientes.append((izquierdos[nodo], nivel + 1))
+            pendientes.append((derechos[nodo], nivel + 1))
+    return profundidad
+
+
+def aplanar_arboles(booster, iteration_range: Tuple[int, int] = (0, 0)) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Aplana los árboles de un booster binary:logistic (gbtree, sin splits
+    categóricos) en arrays con índices globales de nodo.
+
+    Returns:
+        Arrays del ensamble y metadatos (margen base, profundidad máxima)
+    """
+    modelo = json.loads(bytes(booster.save_raw("json")))
+    learner = modelo["learner"]
+    objetivo = learner["objective"]["name"]
+    if objetivo != "binary:logistic":
+        raise ValueError(f"Objetivo no soportado en el runtime ligero: {objetivo}")
+    gbm = learner["gradient_booster"]
+    if gbm["name"] != "gbtree":
+        raise ValueError(f"Booster no soportado en el runtime ligero: {gbm['name']}")
+
+    arboles = gbm["model"]["trees"]
+    por_iteracion = int(gbm["model"]["gbtree_model_param"].get("num_parallel_tree", "1") or 1)
+    inicio, fin = iteration_range
+    if fin > 0:
+        arboles = arboles[inicio * por_iteracion:fin * por_iteracion]
+
+    # base_score se guarda en espacio de probabilidad ("5E-1" o "[5E-1]")
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+    margen_base = float(np.log(base_score / (1.0 - base_score)))
+
+    caracteristicas, umbrales, izquierdos, derechos, defecto, hojas, raices = [], [], [], [], [], [], []
+    profundidad = 0
+    desplazamiento = 0
+    for arbol in arboles:
+        if any(int(t) != 0 for t in arbol.get("split_type", [])):
+            raise ValueError("Splits categóricos no soportados en el runtime ligero")
+        izq = arbol["left_children"]
+        der = arbol["right_children"]
+        n = len(izq)
+        nodos = np.arange(n) + desplazamiento
+        es_hoja = np.asarray(izq) == -1
+
+        raices.append(desplazamiento)
+        caracteristicas.append(np.where(es_hoja, 0, arbol["split_indices"]))
+        # En las hojas, split_conditions guarda el valor de la hoja
+        condiciones = np.asarray(arbol["split_conditions"], dtype=np.float32)
+        umbrales.append(condiciones)
+        hojas.append(np.where(es_hoja, condiciones, np.float32(0.0)).astype(np.float32))
+        izquierdos.append(np.where(es_hoja, nodos, np.asarray(izq) + desplazamiento))
+        derechos.append(np.where(es_hoja, nodos, np.asarray(der) + desplazamiento))
+        defecto.append(np.asarray(arbol["default_left"], dtype=bool))
+
+        profundidad = max(profundidad, _profundidad(izq, der))
+        desplazamiento += n
+
+    arrays = {
+        "raices": np.asarray(raices, dtype=np.int64),
+        "caracteristicas": np.concatenate(caracteristicas).astype(np.int64),
+        "umbrales": np.concatenate(umbrales),
+        "izquierdos": np.concatenate(izquierdos).astype(np.int64),
+        "derechos": np.concatenate(derechos).astype(np.int64),
+        "defecto_izquierda": np.concatenate(defecto),
+        "hojas": np.concatenate(hojas),
+    }
+    return arrays, {"margen_base": margen_base, "profundidad": profundidad}
+
+
+def exportar(compilado: PipelineCompilado, ruta: Path) -> Path:
+    """Guarda la ruta compilada de un bundle como artefacto ligero .npz"""
+    from tabla_distrito import huella_modelo
+
+    arrays, metadatos = aplanar_arboles(compilado.booster, compilado.iteration_range)
+    metadatos.update({
+        "version_formato": VERSION_FORMATO,
+        "n_features": compilado.n_features,
+        "columnas_categoricas": compilado.columnas_categoricas,
+        "columnas_numericas": compilado.columnas_numericas,
+        "vocabularios": {c: list(v.items()) for c, v in compilado.vocabularios.items()},
+        "missing": None if np.isnan(compilado.missing) else float(compilado.missing),
+        "huella_tabla": huella_modelo(compilado),
+    })
+    arrays.update({
+        "medias": compilado._medias,
+        "escalas": compilado._escalas,
+        "indices_numericos": compilado._indices_numericos,
+        "clases": np.asarray(compilado.clases),
+        "metadatos": np.frombuffer(json.dumps(metadatos, ensure_ascii=False).encode(), dtype=np.uint8),
+    })
+    ruta = Path(ruta)
+    with open(ruta, "wb") as f:
+        np.savez(f, **arrays)
+    logger.info(f"Artefacto ligero guardado en {ruta} ({len(arrays['raices'])} árboles, "
+                f"{len(arrays['hojas'])} nodos, profundidad {metadatos['profundidad']})")
+    return ruta
+
+
+class PipelineLigero(PipelineCompilado):
+    """
+    Equivalente de PipelineCompilado cargado desde un artefacto ligero. La
+    codificación es la misma; predecir_proba recorre los árboles con NumPy.
+    Sin booster no hay contribuciones por campo.
+    """
+
+    admite_contribuciones = False
+
+    def __init__(self, ruta: Path):
+        with np.load(ruta, allow_pickle=False) as datos:
+            arrays = {nombre: datos[nombre] for nombre in datos.files}
+        metadatos = json.loads(arrays.pop("metadatos").tobytes())
+        if metadatos.get("version_formato") != VERSION_FORMATO:
+            raise ValueError(f"Versión de artefacto ligero no soportada: {metadatos.get('version_formato')}")
+
+        self.n_features = metadatos["n_features"]
+        self.columnas_categoricas = metadatos["columnas_categoricas"]
+        self.columnas_numericas = metadatos["columnas_numericas"]
+        self.vocabularios = {c: dict((k, int(i)) for k, i in pares) for c, pares in metadatos["vocabularios"].items()}
+        self._medias = arrays["medias"]
+        self._escalas = arrays["escalas"]
+        self._indices_numericos = arrays["indices_numericos"].astype(np.intp)
+        self._salida_codigos = self._indices_codigos()
+        self.campos = self.columnas_categoricas + self.columnas_numericas
+        self.clases = arrays["clases"]
+        self.missing = np.nan if metadatos["missing"] is None else metadatos["missing"]
+        self.huella_tabla = metadatos["huella_tabla"]
+        self._local = threading.local()
+
+        self.margen_base = np.float32(metadatos["margen_base"])
+        self.profundidad = int(metadatos["profundidad"])
+        self.raices = arrays["raices"]
+        self.caracteristicas = arrays["caracteristicas"]
+        self.umbrales = arrays["umbrales"]
+        self.izquierdos = arrays["izquierdos"]
+        self.derechos = arrays["derechos"]
+        self.defecto_izquierda = arrays["defecto_izquierda"]
+        self.hojas = arrays["hojas"]
+
+    def margen(self, X: np.ndarray) -> np.ndarray:
+        """Suma de las hojas más el margen base, en float32 y en orden de árbol como XGBoost"""
+        X = np.asarray(X, dtype=np.float32)
+        n = X.shape[0]
+        margen = np.empty(n, dtype=np.float32)
+        for desde in range(0, n, TAM_BLOQUE):
+            bloque = X[desde:desde + TAM_BLOQUE]
+            if not np.isnan(self.missing):
+                bloque = np.where(bloque == np.float32(self.missing), np.float32(np.nan), bloque)
+            filas = np.arange(len(bloque))[:, None]
+            posiciones = np.broadcast_to(self.raices, (len(bloque), len(self.raices)))
+            for _ in range(self.profundidad):
+                valores = bloque[filas, self.caracteristicas[posiciones]]
+                izquierda = np.where(np.isnan(valores), self.defecto_izquierda[posiciones],
+                                     valores < self.umbrales[posiciones])
+                posiciones = np.where(izquierda, self.izquierdos[posiciones], self.derechos[posiciones])
+
+            hojas = self.hojas[posiciones]
+            acumulado = np.full(len(bloque), self.margen_base, dtype=np.float32)
+            for arbol in range(hojas.shape[1]):
+                acumulado += hojas[:, arbol]
+            margen[desde:desde + len(bloque)] = acumulado
+        return margen
+
+    def predecir_proba(self, X: np.ndarray) -> np.ndarray:
+        """Equivalente a model.predict_proba para el objetivo binary:logistic"""
+        clase_uno = np.float32(1.0) / (np.float32(1.0) + np.exp(-self.margen(X)))
+        return np.vstack((1.0 - clase_uno, clase_uno)).transpose()
+
+    def contribuciones(self, X: np.ndarray):
+        """Sin booster no hay contribuciones; los llamantes consultan admite_contribuciones"""
+        raise ValueError("El runtime ligero no calcula contribuciones por campo")
+
+
+def verificar(compilado: PipelineCompilado, ligero: PipelineLigero, filas: int = 200000,
+              tolerancia: float = 1e-6, semilla: int = 0) -> Dict[str, float]:
+    """
+    Compara el runtime ligero con la ruta compilada (que coincide bit a bit
+    con la ruta pandas, ver inferencia_rapida.verificar_paridad) sobre filas
+    aleatorias, incluidas categorías desconocidas y numéricas ausentes.
+
+    Raises:
+        AssertionError: Si alguna probabilidad difiere más de `tolerancia` o
+            cambia la clase predicha
+    """
+    rng = np.random.default_rng(semilla)
+    codigos = {
+        c: rng.integers(-1, len(compilado.vocabularios[c]), size=filas)
+        for c in compilado.columnas_categoricas
+    }
+    numericas = {}
+    for j, c in enumerate(compilado.columnas_numericas):
+        valores = rng.normal(compilado._medias[j], compilado._escalas[j] * 1.5, size=filas)
+        valores[rng.random(filas) < 0.01] = np.nan
+        numericas[c] = valores
+
+    X = compilado.codificar_codigos(codigos, numericas, filas)
+    esperado = compilado.predecir_proba(X)
+    obtenido = ligero.predecir_proba(X)
+    diferencia = np.abs(esperado[:, 1].astype(np.float64) - obtenido[:, 1].astype(np.float64))
+    clases_distintas = int((esperado.argmax(axis=1) != obtenido.argmax(axis=1)).sum())
+    resumen = {
+        "filas": filas,
+        "diferencia_max": float(diferencia.max()),
+        "identicas": int((diferencia == 0).sum()),
+        "clases_distintas": clases_distintas,
+    }
+    if resumen["diferencia_max"] > tolerancia or clases_distintas:
+        raise AssertionError(f"El runtime ligero difiere de la ruta compilada: {resumen}")
+    return resumen
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Exporta y verifica los artefactos del runtime ligero")
+    parser.add_argument("--exportar", action="store_true", help="Genera los artefactos .npz de cada variante")
+    parser.add_argument("--verificar", action="store_true", help="Compara los artefactos con la ruta actual")
+    parser.add_argument("--filas", type=int, default=200000, help="Filas aleatorias de la verificación")
+    args = parser.parse_args()
+    if not (args.exportar or args.verificar):
+        parser.error("Indique --exportar, --verificar o ambos")
+
+    from registro_modelos import RUNTIME_XGBOOST, VARIANTES, ModelRegistry
+
+    registro = ModelRegistry(runtime=RUNTIME_XGBOOST)
+    for variante in VARIANTES:
+        bundle = registro.get(variante)
+        if bundle.compilado is None:
+            raise SystemExit(f"El modelo {variante} no tiene ruta compilada; no se puede exportar")
+        ruta = registro.ruta_ligera(variante)
+        if args.exportar:
+            exportar(bundle.compilado, ruta)
+        if args.verificar:
+            resumen = verificar(bundle.compilado, PipelineLigero(ruta), args.filas)
+            logger.info(f"Modelo {variante}: runtime ligero equivalente ({resumen})")
@@ -0,0 +1,111 @@
+"""
+Barridos de sensibilidad: un registro base con una o dos variables
+recorriendo todos sus valores.
+
+La rejilla se construye directamente como códigos del vocabulario (producto
+cartesiano con NumPy) y se puntúa con una única llamada a predict_proba, en
+lugar de una petición a /predict por variante.
+"""
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from tabla_distrito import DISTRITOS
+from vocabulario import CAMPOS_CATEGORICOS, CODIGOS, VOCABULARIO, categoria
+
+CAMPOS_BARRIBLES = CAMPOS_CATEGORICOS + ("cod_distrito",)
+
+MAX_CAMPOS = 2
+
+
+def valores_campo(campo: str, valores: Optional[Sequence[Any]] = None) -> List[Any]:
+    """
+    Valores a recorrer de un campo: los indicados (categorías o códigos) o,
+    por defecto, todo el vocabulario o todos los distritos.
+
+    Raises:
+        ValueError: Si el campo no se puede barrer o algún valor no es válido
+    """
+    if campo not in CAMPOS_BARRIBLES:
+        raise ValueError(f"No se puede barrer '{campo}'; use uno de {list(CAMPOS_BARRIBLES)}")
+    if campo == "cod_distrito":
+        if valores is None:
+            return list(DISTRITOS)
+        distritos = [int(v) for v in valores]
+        desconocidos = [d for d in distritos if d not in DISTRITOS]
+        if desconocidos:
+            raise ValueError(f"Distritos desconocidos: {desconocidos}")
+        return distritos
+
+    if valores is None:
+        return list(VOCABULARIO[campo])
+    categorias = [categoria(campo, v) for v in valores]
+    desconocidas = [c for c in categorias if c not in CODIGOS[campo]]
+    if desconocidas:
+        raise ValueError(f"Categorías desconocidas para '{campo}': {desconocidas}")
+    return categorias
+
+
+def rejilla(base: Mapping[str, Any], valores: Mapping[str, Sequence[Any]]):
+    """
+    Columnas del producto cartesiano de `valores` sobre el registro base, en
+    orden C (el último campo varía más rápido).
+
+    Returns:
+        (códigos de las categóricas, numéricas float64, número de filas)
+    """
+    campos = list(valores)
+    forma = tuple(len(valores[c]) for c in campos)
+    n = int(np.prod(forma))
+    posiciones = dict(zip(campos, np.unravel_index(np.arange(n), forma)))
+
+    codigos = {}
+    for campo in CAMPOS_CATEGORICOS:
+        if campo in posiciones:
+            codigos_campo = np.asarray([CODIGOS[campo][v] for v in valores[campo]], dtype=np.intp)
+            codigos[campo] = codigos_campo[posiciones[campo]]
+        else:
+            codigos[campo] = np.full(n, CODIGOS[campo].get(base[campo], -1), dtype=np.intp)
+
+    numericas = {}
+    for campo in ("cod_distrito", "coordenada_x_utm", "coordenada_y_utm"):
+        if campo in posiciones:
+            numericas[campo] = np.asarray(valores[campo], dtype=np.float64)[posiciones[campo]]
+        else:
+            valor = base.get(campo)
+            numericas[campo] = np.full(n, np.nan if valor is None else float(valor))
+    return codigos, numericas, n
+
+
+def barrer(bundle, base: Mapping[str, Any], valores: Mapping[str, Sequence[Any]]) -> Dict[str, Any]:
+    """
+    Puntúa la rejilla completa con el bundle indicado.
+
+    Returns:
+        Matrices (listas anidadas, un eje por campo) con la clase predicha,
+        su probabilidad y la probabilidad de cada clase
+    """
+    codigos, numericas, n = rejilla(base, valores)
+    if bundle.compilado is not None:
+        X = bundle.compilado.codificar_codigos(codigos, numericas, n)
+        probas = bundle.compilado.predecir_proba(X)
+    else:
+        import pandas as pd
+
+        columnas = {
+            c: np.asarray(VOCABULARIO[c] + (None,), dtype=object)[codigos[c]] for c in CAMPOS_CATEGORICOS
+        }
+        columnas.update(numericas)
+        probas = bundle.model.predict_proba(bundle.preprocessor.transform(pd.DataFrame(columnas)))
+
+    forma = tuple(len(v) for v in valores.values())
+    clase = probas.argmax(axis=1)
+    prediccion = bundle.label_encoder.inverse_transform(clase)
+    return {
+        "prediction": prediccion.reshape(forma).tolist(),
+        "probability": probas[np.arange(n), clase].reshape(forma).tolist(),
+        "probabilidad_clase": {
+            str(etiqueta): probas[:, i].reshape(forma).tolist()
+            for i, etiqueta in enumerate(bundle.label_encoder.classes_)
+        },
+    }
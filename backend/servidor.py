@@ -0,0 +1,137 @@
+"""
+Servidor con varios procesos de inferencia que comparten los modelos.
+
+El proceso padre carga los bundles una sola vez (y abre la tabla de distrito
+con memoria mapeada), congela el recolector de basura y crea los workers con
+fork, de modo que los modelos se comparten copy-on-write en lugar de
+deserializarse en cada proceso. Todos los workers atienden el mismo socket.
+
+Los hilos de XGBoost se reparten entre los workers para no sobresuscribir la
+máquina: por defecto, núcleos // workers (mínimo 1).
+
+Uso (desde cualquier directorio):
+    python backend/servidor.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Optional
+
+logger = logging.getLogger("servidor")
+
+
+def hilos_por_worker(workers: int, nucleos: Optional[int] = None) -> int:
+    """Hilos de XGBoost por worker para ocupar los núcleos sin sobresuscribirlos"""
+    nucleos = nucleos or len(os.sched_getaffinity(0))
+    return max(1, nucleos // max(1, workers))
+
+
+def crear_socket(host: str, port: int) -> socket.socket:
+    # Con proto=IPPROTO_TCP explícito asyncio activa TCP_NODELAY en las
+    # conexiones aceptadas; si no, Nagle retrasa ~40 ms cada respuesta
+    familia = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(familia, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def ejecutar_worker(app, sock: socket.socket, indice: int, nivel_log: str):
+    import uvicorn
+
+    logger.info(f"Worker {indice} iniciado (pid {os.getpid()})")
+    config = uvicorn.Config(app, log_level=nivel_log, lifespan="on")
+    servidor = uvicorn.Server(config)
+    servidor.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor multiproceso de la API de lesividad")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument("--hilos-xgboost", type=int, default=0,
+                        help="Hilos de XGBoost por worker (0 = núcleos // workers)")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    hilos = args.hilos_xgboost or hilos_por_worker(args.workers)
+
+    # Antes de importar XGBoost, para que el runtime OpenMP respete el reparto
+    os.environ["OMP_NUM_THREADS"] = str(hilos)
+    os.environ["XGBOOST_NTHREAD"] = str(hilos)
+    # El padre ya precarga los modelos; los workers no deben volver a cargarlos
+    os.environ["MODELOS_PRECARGA"] = ""
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as api
+    from registro_modelos import VARIANTES
+
+    inicio = time.perf_counter()
+    for nombre in VARIANTES:
+        api.registro.get(nombre)
+    logger.info(f"Modelos precargados en el proceso padre en {time.perf_counter() - inicio:.2f} s")
+
+    # Los objetos ya creados no vuelven a ser recorridos por el GC, lo que
+    # evita que los workers copien las páginas de los modelos al recolectar
+    gc.collect()
+    gc.freeze()
+
+    sock = crear_socket(args.host, args.port)
+    logger.info(f"Escuchando en {args.host}:{args.port} con {args.workers} workers y {hilos} hilos de XGBoost por worker")
+
+    workers = {}
+    parando = False
+
+    def lanzar(indice: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                ejecutar_worker(api.app, sock, indice, args.log_level)
+            finally:
+                os._exit(0)
+        workers[pid] = indice
+
+    def parar(signum, frame):
+        nonlocal parando
+        parando = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, parar)
+    signal.signal(signal.SIGTERM, parar)
+
+    for indice in range(args.workers):
+        lanzar(indice)
+
+    while workers:
+        try:
+            pid, estado = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        indice = workers.pop(pid, None)
+        if indice is not None and not parando:
+            logger.warning(f"Worker {indice} (pid {pid}) terminó con estado {estado}; se relanza")
+            lanzar(indice)
+
+    sock.close()
+    logger.info("Servidor detenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Tabla precalculada de probabilidades para el modelo de distrito.
+
+Todas las entradas del modelo de distrito son categóricas, así que el espacio
+de entradas es una rejilla finita (unos 12,7 millones de combinaciones). Este
+módulo puntúa la rejilla completa una sola vez y la guarda como un array
+en disco que se abre con memoria mapeada, de modo que /predict responde con
+una búsqueda por índice.
+
+Por defecto la tabla guarda la probabilidad float32 que devuelve el modelo
+(unos 50 MB), y /predict responde lo mismo que el resto de endpoints. Las
+cuantizaciones float16 y uint8 reducen la tabla a la mitad o a la cuarta
+parte a cambio de un error de hasta ERROR_MAXIMO en la probabilidad (la
+clase predicha no cambia); /modelo/info indica la cuantización en uso.
+
+Construcción (desde la raíz del repositorio):
+    python backend/tabla_distrito.py [--cuantizacion float32|float16|uint8]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from inferencia_rapida import PipelineCompilado
+
+logger = logging.getLogger(__name__)
+
+# Códigos de distrito de Madrid (1 = Centro ... 21 = Barajas)
+DISTRITOS = list(range(1, 22))
+
+CUANTIZACIONES = ("float32", "float16", "uint8")
+
+# Error máximo de la probabilidad devuelta por cada cuantización: un paso de
+# redondeo (float16 tiene un paso de 2^-11 en [0.5, 1)), porque junto a 0.5
+# el valor se desplaza al lado de la clase predicha
+ERROR_MAXIMO = {"float32": 0.0, "float16": 2.0 ** -11, "uint8": 1.0 / 255.0}
+
+
+def huella_modelo(compilado: PipelineCompilado) -> str:
+    """Huella del booster y del preprocesado, para detectar tablas obsoletas"""
+    # El runtime ligero no tiene booster: trae la huella calculada al exportar
+    guardada = getattr(compilado, "huella_tabla", None)
+    if guardada is not None:
+        return guardada
+    h = hashlib.sha256(bytes(compilado.booster.save_raw("ubj")))
+    for columna in compilado.columnas_categoricas:
+        h.update(json.dumps([columna, list(compilado.vocabularios[columna])]).encode())
+    h.update(compilado._medias.tobytes())
+    h.update(compilado._escalas.tobytes())
+    return h.hexdigest()[:16]
+
+
+def _ruta_metadatos(ruta: str) -> str:
+    return os.path.splitext(ruta)[0] + ".json"
+
+
+def _cuantizar(probabilidad: np.ndarray, clase_uno: np.ndarray, cuantizacion: str) -> np.ndarray:
+    """
+    Cuantiza la probabilidad de la clase 1 sin cambiar la clase predicha:
+    los valores que el redondeo lleva al otro lado de 0.5 se ajustan al valor
+    representable más cercano del lado correcto.
+    """
+    if cuantizacion == "float32":
+        return probabilidad.astype(np.float32)
+    if cuantizacion == "uint8":
+        q = np.rint(probabilidad * 255.0).astype(np.uint8)
+        q[clase_uno & (q < 128)] = 128
+        q[~clase_uno & (q > 127)] = 127
+        return q
+    q = probabilidad.astype(np.float16)
+    mitad = np.float16(0.5)
+    q[clase_uno & (q <= mitad)] = np.nextafter(mitad, np.float16(1.0))
+    q[~clase_uno & (q > mitad)] = mitad
+    return q
+
+
+def construir_tabla(compilado: PipelineCompilado, ruta: str,
+                    distritos: Sequence[int] = DISTRITOS, cuantizacion: str = "float32",
+                    tam_bloque: int = 262144) -> str:
+    """
+    Puntúa la rejilla completa (categorías x distritos) y la guarda en `ruta`.
+
+    Se guarda la probabilidad de la clase 1 en orden C sobre las dimensiones
+    (columnas categóricas..., distrito).
+
+    Returns:
+        Huella del modelo con el que se ha construido la tabla
+    """
+    if cuantizacion not in CUANTIZACIONES:
+        raise ValueError(f"Cuantización no soportada: {cuantizacion}")
+    if compilado.columnas_numericas != ["cod_distrito"]:
+        raise ValueError("La tabla solo admite el modelo de distrito")
+
+    columnas = compilado.columnas_categoricas
+    indices_salida = [np.fromiter(compilado.vocabularios[c].values(), dtype=np.intp) for c in columnas]
+    distritos_escalados = (np.asarray(distritos, dtype=np.float64) - compilado._medias[0]) / compilado._escalas[0]
+    forma = tuple(len(i) for i in indices_salida) + (len(distritos),)
+    total = int(np.prod(forma))
+
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    tabla = np.lib.format.open_memmap(ruta, mode="w+", dtype=np.dtype(cuantizacion), shape=(total,))
+
+    logger.info(f"Construyendo tabla de distrito: {total} combinaciones, forma {forma}")
+    inicio = time.perf_counter()
+    X = np.zeros((tam_bloque, compilado.n_features), dtype=np.float32)
+
+    for desde in range(0, total, tam_bloque):
+        hasta = min(desde + tam_bloque, total)
+        n = hasta - desde
+        posiciones = np.unravel_index(np.arange(desde, hasta), forma)
+
+        bloque = X[:n]
+        bloque.fill(0.0)
+        filas = np.arange(n)
+        for salida, posicion in zip(indices_salida, posiciones[:-1]):
+            bloque[filas, salida[posicion]] = 1.0
+        bloque[:, compilado._indices_numericos[0]] = distritos_escalados[posiciones[-1]]
+
+        probas = compilado.predecir_proba(bloque)
+        tabla[desde:hasta] = _cuantizar(probas[:, 1], probas[:, 1] > probas[:, 0], cuantizacion)
+
+        logger.info(f"Tabla de distrito: {hasta}/{total} combinaciones")
+
+    tabla.flush()
+    del tabla
+
+    huella = huella_modelo(compilado)
+    metadatos = {
+        "huella": huella,
+        "cuantizacion": cuantizacion,
+        "forma": list(forma),
+        "columnas": columnas + ["cod_distrito"],
+        "vocabularios": {c: list(compilado.vocabularios[c]) for c in columnas},
+        "distritos": list(distritos),
+    }
+    with open(_ruta_metadatos(ruta), "w", encoding="utf-8") as f:
+        json.dump(metadatos, f, ensure_ascii=False)
+
+    logger.info(f"Tabla de distrito guardada en {ruta} ({time.perf_counter() - inicio:.1f} s)")
+    return huella
+
+
+class TablaDistrito:
+    """Búsqueda O(1) sobre la tabla precalculada del modelo de distrito"""
+
+    def __init__(self, ruta: str, metadatos: Dict[str, Any], clases):
+        self.ruta = ruta
+        self.huella = metadatos["huella"]
+        self.cuantizacion = metadatos["cuantizacion"]
+        self.columnas: List[str] = metadatos["columnas"][:-1]
+        self.indices = [
+            {categoria: i for i, categoria in enumerate(metadatos["vocabularios"][c])}
+            for c in self.columnas
+        ]
+        self.indices_distrito = {d: i for i, d in enumerate(metadatos["distritos"])}
+        self.pasos = [int(p) for p in np.cumprod([1] + metadatos["forma"][:0:-1])[::-1]]
+        self.escala = 1.0 / 255.0 if self.cuantizacion == "uint8" else 1.0
+        self.clases = clases
+        self.tabla = np.load(ruta, mmap_mode="r")
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "cuantizacion": self.cuantizacion,
+            "exacta": self.cuantizacion == "float32",
+            "error_maximo_probabilidad": ERROR_MAXIMO[self.cuantizacion],
+        }
+
+    @classmethod
+    def cargar(cls, compilado: PipelineCompilado, ruta: str) -> Optional["TablaDistrito"]:
+        """Abre la tabla si existe y corresponde al modelo cargado; si no, devuelve None"""
+        if not os.path.exists(ruta):
+            return None
+        with open(_ruta_metadatos(ruta), encoding="utf-8") as f:
+            metadatos = json.load(f)
+        if metadatos["huella"] != huella_modelo(compilado):
+            logger.warning(f"La tabla de distrito {ruta} no corresponde al modelo cargado; se ignora")
+            return None
+        logger.info(f"Tabla de distrito cargada ({metadatos['cuantizacion']}, {int(np.prod(metadatos['forma']))} combinaciones)")
+        return cls(ruta, metadatos, compilado.clases)
+
+    def buscar(self, registro) -> Optional[Dict[str, Any]]:
+        """Devuelve la predicción del registro, o None si tiene categorías no vistas"""
+        posicion = 0
+        for columna, indices, paso in zip(self.columnas, self.indices, self.pasos):
+            i = indices.get(getattr(registro, columna))
+            if i is None:
+                return None
+            posicion += i * paso
+        i = self.indices_distrito.get(registro.cod_distrito)
+        if i is None:
+            return None
+        posicion += i
+
+        if self.cuantizacion == "float32":
+            # Misma aritmética float32 que predecir_proba: el resultado es
+            # idéntico al de la ruta compilada
+            uno = self.tabla[posicion]
+            cero = np.float32(1.0) - uno
+            clase = 1 if uno > cero else 0
+            return {
+                "prediction": int(self.clases[clase]),
+                "probability": float(uno if clase == 1 else cero),
+            }
+
+        probabilidad = float(self.tabla[posicion]) * self.escala
+        # Mismo criterio que argmax sobre [1 - p, p]
+        clase = 1 if probabilidad > 1.0 - probabilidad else 0
+        return {
+            "prediction": int(self.clases[clase]),
+            "probability": probabilidad if clase == 1 else 1.0 - probabilidad,
+        }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Construye la tabla precalculada del modelo de distrito")
+    parser.add_argument("--ruta", default=None, help="Fichero .npy de salida")
+    parser.add_argument("--cuantizacion", choices=CUANTIZACIONES, default="float32")
+    args = parser.parse_args()
+
+    from registro_modelos import ModelRegistry
+
+    registro = ModelRegistry()
+    construir_tabla(
+        registro.get("distrito").compilado,
+        args.ruta or str(registro.ruta_tabla()),
+        cuantizacion=args.cuantizacion,
+    )
@@ -0,0 +1,424 @@
+"""
+Trabajos de predicción asíncronos con resultados persistidos en SQLite.
+
+Un trabajo es un lote de registros que se guarda en disco por bloques al
+enviarse y que procesa en segundo plano un grupo de hilos, bloque a bloque,
+con la misma puntuación por columnas que /predict/stream. Los resultados de
+cada bloque se escriben en una única transacción, así que sobreviven a un
+reinicio y se pueden consultar por páginas mientras el trabajo avanza.
+
+La cola también vive en SQLite: un hilo reclama un trabajo pendiente con una
+actualización condicional y renueva un latido tras cada bloque. Si el
+proceso muere, otro hilo (de este u otro proceso, p. ej. con servidor.py)
+retoma el trabajo cuando el latido caduca, desde el primer bloque sin
+resultados. La cola está acotada en trabajos y en filas pendientes: por
+encima de los límites los envíos se rechazan en lugar de encolarse.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from auditoria import RegistroAuditoria
+from puntuacion_masiva import puntuar_columnas, registros_salida
+from registro_modelos import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+RUTA_TRABAJOS = Path(os.getenv(
+    "TRABAJOS_DB", Path(__file__).resolve().parent.parent / "cache" / "trabajos.sqlite3"
+))
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+ERROR = "error"
+TERMINADOS = (COMPLETADO, ERROR)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    total INTEGER NOT NULL,
+    procesadas INTEGER NOT NULL DEFAULT 0,
+    errores INTEGER NOT NULL DEFAULT 0,
+    bloques INTEGER NOT NULL,
+    tam_bloque INTEGER NOT NULL,
+    siguiente_bloque INTEGER NOT NULL DEFAULT 0,
+    version TEXT,
+    error TEXT,
+    propietario TEXT,
+    latido REAL
+);
+CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, creado);
+CREATE TABLE IF NOT EXISTS entradas (
+    trabajo_id TEXT NOT NULL,
+    bloque INTEGER NOT NULL,
+    datos TEXT NOT NULL,
+    PRIMARY KEY (trabajo_id, bloque)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS resultados (
+    trabajo_id TEXT NOT NULL,
+    fila INTEGER NOT NULL,
+    prediction INTEGER,
+    probability REAL,
+    modelo TEXT,
+    error TEXT,
+    PRIMARY KEY (trabajo_id, fila)
+) WITHOUT ROWID;
+"""
+
+CAMPOS_ESTADO = (
+    "id", "estado", "creado", "actualizado", "total", "procesadas",
+    "errores", "bloques", "version", "error",
+)
+
+
+class ColaLlena(Exception):
+    """La cola de trabajos ha alcanzado su límite de trabajos o de filas pendientes"""
+
+
+class AlmacenTrabajos:
+    """
+    Trabajos, entradas y resultados en un fichero SQLite (modo WAL).
+
+    Cada hilo usa su propia conexión, que se abre de nuevo tras un fork.
+    """
+
+    def __init__(self, ruta: Path = RUTA_TRABAJOS):
+        self.ruta = Path(ruta)
+        self._local = threading.local()
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None or self._local.pid != os.getpid():
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, check_same_thread=False)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.executescript(ESQUEMA)
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    def pendientes(self) -> Dict[str, int]:
+        """Trabajos y filas sin terminar"""
+        trabajos, filas = self._conexion().execute(
+            "SELECT COUNT(*), COALESCE(SUM(total - procesadas), 0) FROM trabajos WHERE estado IN (?, ?)",
+            (PENDIENTE, EN_CURSO)
+        ).fetchone()
+        return {"trabajos": trabajos, "filas": filas}
+
+    def crear(self, registros: Sequence[Mapping[str, Any]], tam_bloque: int,
+              max_trabajos: int, max_filas: int) -> Dict[str, Any]:
+        """
+        Guarda un trabajo nuevo con sus entradas por bloques.
+
+        Raises:
+            ColaLlena: Si aceptarlo superaría `max_trabajos` o `max_filas` pendientes
+        """
+        # Serializar fuera de la transacción para no bloquear a los demás escritores
+        bloques = [
+            json.dumps(list(registros[i:i + tam_bloque]), ensure_ascii=False)
+            for i in range(0, len(registros), tam_bloque)
+        ]
+        identificador = uuid.uuid4().hex
+        ahora = time.time()
+
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            pendientes = self.pendientes()
+            if pendientes["trabajos"] >= max_trabajos or pendientes["filas"] + len(registros) > max_filas:
+                raise ColaLlena(
+                    f"Cola de trabajos llena ({pendientes['trabajos']} trabajos, "
+                    f"{pendientes['filas']} filas pendientes)"
+                )
+            conexion.execute(
+                "INSERT INTO trabajos (id, estado, creado, actualizado, total, bloques, tam_bloque) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (identificador, PENDIENTE, ahora, ahora, len(registros), len(bloques), tam_bloque)
+            )
+            conexion.executemany(
+                "INSERT INTO entradas (trabajo_id, bloque, datos) VALUES (?, ?, ?)",
+                ((identificador, i, datos) for i, datos in enumerate(bloques))
+            )
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return self.estado(identificador)
+
+    def reclamar(self, propietario: str, caducidad_s: float) -> Optional[Dict[str, Any]]:
+        """
+        Reclama el trabajo pendiente más antiguo, o uno en curso cuyo latido
+        ha caducado (su proceso ha muerto o se ha reiniciado).
+        """
+        conexion = self._conexion()
+        ahora = time.time()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conexion.execute(
+                "SELECT id FROM trabajos WHERE estado = ? OR (estado = ? AND latido < ?) "
+                "ORDER BY creado LIMIT 1",
+                (PENDIENTE, EN_CURSO, ahora - caducidad_s)
+            ).fetchone()
+            if fila is not None:
+                conexion.execute(
+                    "UPDATE trabajos SET estado = ?, propietario = ?, latido = ?, actualizado = ? WHERE id = ?",
+                    (EN_CURSO, propietario, ahora, ahora, fila[0])
+                )
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        if fila is None:
+            return None
+        return self._trabajo(fila[0])
+
+    def _trabajo(self, identificador: str) -> Optional[Dict[str, Any]]:
+        conexion = self._conexion()
+        cursor = conexion.execute("SELECT * FROM trabajos WHERE id = ?", (identificador,))
+        fila = cursor.fetchone()
+        if fila is None:
+            return None
+        return dict(zip((c[0] for c in cursor.description), fila))
+
+    def entradas(self, identificador: str, bloque: int) -> List[Dict[str, Any]]:
+        fila = self._conexion().execute(
+            "SELECT datos FROM entradas WHERE trabajo_id = ? AND bloque = ?", (identificador, bloque)
+        ).fetchone()
+        return json.loads(fila[0]) if fila is not None else []
+
+    def guardar_bloque(self, identificador: str, propietario: str, bloque: int,
+                       resultados: List[Dict[str, Any]], version: str) -> bool:
+        """
+        Escribe los resultados de un bloque y avanza el trabajo en una única
+        transacción. Devuelve False si el trabajo ya no pertenece a este
+        propietario (se ha borrado o lo ha reclamado otro proceso).
+        """
+        conexion = self._conexion()
+        errores = sum(1 for r in resultados if r["error"] is not None)
+        ahora = time.time()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conexion.execute(
+                "UPDATE trabajos SET procesadas = procesadas + ?, errores = errores + ?, "
+                "siguiente_bloque = ?, version = ?, latido = ?, actualizado = ? "
+                "WHERE id = ? AND propietario = ? AND estado = ? AND siguiente_bloque = ?",
+                (len(resultados), errores, bloque + 1, version, ahora, ahora,
+                 identificador, propietario, EN_CURSO, bloque)
+            )
+            if cursor.rowcount == 0:
+                conexion.execute("ROLLBACK")
+                return False
+            conexion.executemany(
+                "INSERT OR REPLACE INTO resultados (trabajo_id, fila, prediction, probability, modelo, error) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((identificador, r["fila"], r["prediction"], r["probability"], r["modelo"], r["error"])
+                 for r in resultados)
+            )
+            conexion.execute("DELETE FROM entradas WHERE trabajo_id = ? AND bloque = ?", (identificador, bloque))
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return True
+
+    def finalizar(self, identificador: str, propietario: str, estado: str, error: Optional[str] = None):
+        conexion = self._conexion()
+        conexion.execute(
+            "UPDATE trabajos SET estado = ?, error = ?, actualizado = ?, latido = NULL "
+            "WHERE id = ? AND propietario = ?",
+            (estado, error, time.time(), identificador, propietario)
+        )
+        conexion.execute("DELETE FROM entradas WHERE trabajo_id = ?", (identificador,))
+
+    def estado(self, identificador: str) -> Optional[Dict[str, Any]]:
+        """Estado público de un trabajo, o None si no existe"""
+        trabajo = self._trabajo(identificador)
+        if trabajo is None:
+            return None
+        return {campo: trabajo[campo] for campo in CAMPOS_ESTADO}
+
+    def resultados(self, identificador: str, desde: int = 0, limite: int = 1000) -> List[Dict[str, Any]]:
+        """Resultados con fila >= desde, en orden de fila"""
+        filas = self._conexion().execute(
+            "SELECT fila, prediction, probability, modelo, error FROM resultados "
+            "WHERE trabajo_id = ? AND fila >= ? ORDER BY fila LIMIT ?",
+            (identificador, desde, limite)
+        ).fetchall()
+        return [
+            {"fila": f, "prediction": p, "probability": prob, "modelo": m, "error": e}
+            for f, p, prob, m, e in filas
+        ]
+
+    def borrar(self, identificador: str) -> bool:
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conexion.execute("DELETE FROM trabajos WHERE id = ?", (identificador,))
+            conexion.execute("DELETE FROM entradas WHERE trabajo_id = ?", (identificador,))
+            conexion.execute("DELETE FROM resultados WHERE trabajo_id = ?", (identificador,))
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return cursor.rowcount > 0
+
+    def purgar(self, antiguedad_s: float) -> int:
+        """Borra los trabajos terminados hace más de `antiguedad_s` segundos"""
+        limite = time.time() - antiguedad_s
+        identificadores = [f[0] for f in self._conexion().execute(
+            "SELECT id FROM trabajos WHERE estado IN (?, ?) AND actualizado < ?", (*TERMINADOS, limite)
+        ).fetchall()]
+        for identificador in identificadores:
+            self.borrar(identificador)
+        return len(identificadores)
+
+
+class ProcesadorTrabajos:
+    """
+    Grupo de hilos que procesa los trabajos del almacén.
+
+    Args:
+        registro: Registro de modelos con el que se puntúa
+        almacen: Almacén SQLite de trabajos
+        hilos: Hilos de trabajo (0 = solo se aceptan y consultan trabajos)
+        max_trabajos: Trabajos sin terminar admitidos en la cola
+        max_filas: Filas sin procesar admitidas en la cola
+        tam_bloque: Filas por bloque (unidad de persistencia y de reanudación)
+        caducidad_s: Segundos sin latido tras los que otro hilo retoma un trabajo
+        retencion_s: Segundos que se conservan los trabajos terminados
+        auditoria: Registro de auditoría al que se entrega cada bloque puntuado
+    """
+
+    def __init__(self, registro: ModelRegistry, almacen: AlmacenTrabajos, hilos: int = 1,
+                 max_trabajos: int = 16, max_filas: int = 2000000, tam_bloque: int = 5000,
+                 caducidad_s: float = 60.0, retencion_s: float = 86400.0,
+                 auditoria: Optional[RegistroAuditoria] = None):
+        self.registro = registro
+        self.almacen = almacen
+        self.auditoria = auditoria
+        self.hilos = max(0, hilos)
+        self.max_trabajos = max_trabajos
+        self.max_filas = max_filas
+        self.tam_bloque = max(1, tam_bloque)
+        self.caducidad_s = caducidad_s
+        self.retencion_s = retencion_s
+
+        self._hilos: List[threading.Thread] = []
+        self._parar = threading.Event()
+        self._nuevo = threading.Event()
+
+        self.enviados = 0
+        self.rechazados = 0
+        self.completados = 0
+        self.fallidos = 0
+
+    def enviar(self, registros: Sequence[Mapping[str, Any]]) -> Dict[str, Any]:
+        """
+        Encola un trabajo y devuelve su estado inicial.
+
+        Raises:
+            ColaLlena: Si la cola está en su límite
+        """
+        try:
+            estado = self.almacen.crear(registros, self.tam_bloque, self.max_trabajos, self.max_filas)
+        except ColaLlena:
+            self.rechazados += 1
+            raise
+        self.enviados += 1
+        self._nuevo.set()
+        return estado
+
+    def iniciar(self):
+        """Arranca los hilos de trabajo"""
+        if self._hilos or self.hilos == 0:
+            return
+        self._parar.clear()
+        for i in range(self.hilos):
+            hilo = threading.Thread(target=self._bucle, name=f"trabajos-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        logger.info(f"Trabajos asíncronos: {self.hilos} hilos, base de datos {self.almacen.ruta}")
+
+    def detener(self):
+        """Detiene los hilos al terminar su bloque actual; los trabajos a medias se retoman al arrancar"""
+        self._parar.set()
+        self._nuevo.set()
+        for hilo in self._hilos:
+            hilo.join()
+        self._hilos = []
+
+    def _bucle(self):
+        propietario = f"{os.getpid()}-{threading.current_thread().name}-{uuid.uuid4().hex[:8]}"
+        ultima_purga = 0.0
+        while not self._parar.is_set():
+            try:
+                if time.monotonic() - ultima_purga > 3600:
+                    ultima_purga = time.monotonic()
+                    purgados = self.almacen.purgar(self.retencion_s)
+                    if purgados:
+                        logger.info(f"{purgados} trabajos caducados borrados")
+                trabajo = self.almacen.reclamar(propietario, self.caducidad_s)
+            except sqlite3.Error as e:
+                logger.error(f"Error en la cola de trabajos: {e}")
+                trabajo = None
+            if trabajo is None:
+                self._nuevo.wait(timeout=1.0)
+                self._nuevo.clear()
+                continue
+            self._procesar(trabajo, propietario)
+
+    def _procesar(self, trabajo: Dict[str, Any], propietario: str):
+        identificador = trabajo["id"]
+        inicio = time.perf_counter()
+        if trabajo["siguiente_bloque"]:
+            logger.info(f"Trabajo {identificador} retomado en el bloque {trabajo['siguiente_bloque']}")
+        try:
+            for bloque in range(trabajo["siguiente_bloque"], trabajo["bloques"]):
+                if self._parar.is_set():
+                    # Sin finalizar: al caducar el latido lo retoma otro hilo o el próximo arranque
+                    return
+                registros = self.almacen.entradas(identificador, bloque)
+                columnas = {c: [r.get(c) for r in registros] for c in dict.fromkeys(k for r in registros for k in r)}
+                version = self.registro.version
+                resultado = puntuar_columnas(self.registro, columnas, len(registros))
+                if self.auditoria is not None:
+                    self.auditoria.registrar_columnas(
+                        "/trabajos", self.registro.versiones(), columnas, columnas, resultado
+                    )
+                salida = list(registros_salida(resultado, bloque * trabajo["tam_bloque"]))
+                if not self.almacen.guardar_bloque(identificador, propietario, bloque, salida, version):
+                    logger.info(f"Trabajo {identificador} borrado o reclamado por otro proceso; se abandona")
+                    return
+        except Exception as e:
+            logger.error(f"Error en el trabajo {identificador}: {str(e)}")
+            self.almacen.finalizar(identificador, propietario, ERROR, str(e))
+            self.fallidos += 1
+            return
+
+        self.almacen.finalizar(identificador, propietario, COMPLETADO)
+        self.completados += 1
+        logger.info(f"Trabajo {identificador} completado: {trabajo['total']} filas en "
+                    f"{time.perf_counter() - inicio:.1f} s")
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "hilos": self.hilos,
+            "max_trabajos": self.max_trabajos,
+            "max_filas": self.max_filas,
+            "pendientes": self.almacen.pendientes(),
+            "enviados": self.enviados,
+            "rechazados": self.rechazados,
+            "completados": self.completados,
+            "fallidos": self.fallidos,
+        }
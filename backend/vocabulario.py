@@ -0,0 +1,276 @@
+"""
+Vocabulario compartido de las variables categóricas.
+
+Cada categoría tiene un código entero: su posición en `categories_` del
+OneHotEncoder ajustado, que es la misma en los dos modelos. La API acepta
+indistintamente la categoría o su código y el dashboard construye sus listas
+desplegables a partir de este módulo, de modo que el vocabulario del modelo y
+el de la interfaz no pueden divergir.
+
+Este módulo no depende de numpy ni de sklearn, para que el dashboard pueda
+importarlo sin cargar los modelos. El bloque VOCABULARIO se genera a partir
+de los preprocesadores de `modelos/` (desde cualquier directorio):
+    python backend/vocabulario.py --generar
+y `--comprobar` falla si el bloque no corresponde a los modelos.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_CATEGORICOS = (
+    "tipo_vehiculo", "tipo_persona", "tipo_accidente",
+    "sexo", "rango_edad", "estado_meteorológico",
+)
+
+INICIO_GENERADO = "# --- inicio del vocabulario generado ---"
+FIN_GENERADO = "# --- fin del vocabulario generado ---"
+
+# Código de un valor que no se puede interpretar (código fuera de rango o
+# booleano), distinto de -1, que es una categoría desconocida o nula
+CODIGO_INVALIDO = -2
+
+# --- inicio del vocabulario generado ---
+VOCABULARIO: Dict[str, Tuple[str, ...]] = {
+    "tipo_vehiculo": (
+        "Ambulancia samur",
+        "Autobus emt",
+        "Autobús",
+        "Autobús articulado",
+        "Autobús articulado emt",
+        "Autocaravana",
+        "Bicicleta",
+        "Bicicleta epac (pedaleo asistido)",
+        "Camión de bomberos",
+        "Camión rígido",
+        "Caravana",
+        "Ciclo",
+        "Ciclo de motor l1e-a",
+        "Ciclomotor",
+        "Ciclomotor de dos ruedas l1e-b",
+        "Ciclomotor de tres ruedas",
+        "Cuadriciclo ligero",
+        "Cuadriciclo no ligero",
+        "Furgoneta",
+        "Maquinaria agrícola",
+        "Maquinaria de obras",
+        "Microbús <= 17 plazas",
+        "Moto de tres ruedas > 125cc",
+        "Moto de tres ruedas hasta 125cc",
+        "Motocicleta > 125cc",
+        "Motocicleta hasta 125cc",
+        "Otros vehículos con motor",
+        "Otros vehículos sin motor",
+        "Patinete",
+        "Patinete no eléctrico",
+        "Remolque",
+        "Se desconoce",
+        "Semiremolque",
+        "Sin especificar",
+        "Todo terreno",
+        "Tractocamión",
+        "Tranvía",
+        "Tren/metro",
+        "Turismo",
+        "Vehículo articulado",
+        "Vmu eléctrico",
+    ),
+    "tipo_persona": (
+        "Conductor",
+        "Pasajero",
+        "Peatón",
+    ),
+    "tipo_accidente": (
+        "Alcance",
+        "Atropello a animal",
+        "Atropello a persona",
+        "Caída",
+        "Choque contra obstáculo fijo",
+        "Colisión frontal",
+        "Colisión fronto-lateral",
+        "Colisión lateral",
+        "Colisión múltiple",
+        "Despeñamiento",
+        "Otro",
+        "Solo salida de la vía",
+        "Vuelco",
+    ),
+    "sexo": (
+        "Desconocido",
+        "Hombre",
+        "Mujer",
+    ),
+    "rango_edad": (
+        "De 10 a 14 años",
+        "De 15 a 17 años",
+        "De 18 a 20 años",
+        "De 21 a 24 años",
+        "De 25 a 29 años",
+        "De 30 a 34 años",
+        "De 35 a 39 años",
+        "De 40 a 44 años",
+        "De 45 a 49 años",
+        "De 50 a 54 años",
+        "De 55 a 59 años",
+        "De 6 a 9 años",
+        "De 60 a 64 años",
+        "De 65 a 69 años",
+        "De 70 a 74 años",
+        "Desconocido",
+        "Menor de 5 años",
+        "Más de 74 años",
+    ),
+    "estado_meteorológico": (
+        "Despejado",
+        "Granizando",
+        "Lluvia débil",
+        "Lluvia intensa",
+        "Nevando",
+        "Nublado",
+        "Se desconoce",
+    ),
+}
+# --- fin del vocabulario generado ---
+
+# Código de cada categoría, por campo
+CODIGOS: Dict[str, Dict[str, int]] = {
+    campo: {categoria: i for i, categoria in enumerate(categorias)}
+    for campo, categorias in VOCABULARIO.items()
+}
+
+
+def huella(vocabulario: Mapping[str, Sequence[str]] = VOCABULARIO) -> str:
+    """Huella del vocabulario, para que los clientes detecten códigos obsoletos"""
+    contenido = json.dumps({c: list(v) for c, v in vocabulario.items()}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(contenido.encode()).hexdigest()[:12]
+
+
+HUELLA = huella()
+
+
+def categoria(campo: str, valor: Any) -> Any:
+    """
+    Devuelve la categoría de un valor recibido como código entero o como
+    texto. Los textos del vocabulario se sustituyen por el objeto str del
+    propio vocabulario, cuyo hash ya está calculado, así que las búsquedas
+    posteriores en los codificadores no vuelven a recorrer la cadena. Los
+    textos desconocidos se devuelven sin cambios (el modelo los ignora).
+
+    Raises:
+        ValueError: Si el código entero está fuera de rango o el valor es booleano
+    """
+    if isinstance(valor, bool):
+        raise ValueError(f"'{campo}' no admite valores booleanos; use la categoría o su código")
+    if isinstance(valor, int):
+        categorias = VOCABULARIO[campo]
+        if not 0 <= valor < len(categorias):
+            raise ValueError(f"Código {valor} fuera de rango para '{campo}' (0-{len(categorias) - 1})")
+        return categorias[valor]
+    codigo = CODIGOS[campo].get(valor)
+    return valor if codigo is None else VOCABULARIO[campo][codigo]
+
+
+def _invalido(valor: Any, total: int) -> bool:
+    return isinstance(valor, bool) or (isinstance(valor, int) and not 0 <= valor < total)
+
+
+def categorias_columna(campo: str, valores: Sequence[Any]) -> Sequence[Any]:
+    """
+    Sustituye los códigos enteros de una columna por su categoría. Los valores
+    inválidos (ver filas_invalidas) pasan a None. Una columna sin códigos se
+    devuelve sin copiarla.
+    """
+    if not any(isinstance(v, int) for v in valores):
+        return valores
+    categorias = VOCABULARIO[campo]
+    return [
+        None if _invalido(v, len(categorias)) else categorias[v] if isinstance(v, int) else v
+        for v in valores
+    ]
+
+
+def filas_invalidas(campo: str, valores: Sequence[Any]) -> List[int]:
+    """
+    Posiciones de una columna con valores que categoria() rechaza: códigos
+    fuera de rango y booleanos. Las rutas por columnas las devuelven como
+    error de fila en lugar de puntuarlas como categoría desconocida.
+    """
+    if not any(isinstance(v, int) for v in valores):
+        return []
+    total = len(VOCABULARIO[campo])
+    return [i for i, v in enumerate(valores) if _invalido(v, total)]
+
+
+def vocabulario_preprocesador(preprocessor) -> Dict[str, Tuple[str, ...]]:
+    """Categorías del OneHotEncoder de un preprocesador ajustado, por columna"""
+    for nombre, transformer, columnas in preprocessor.transformers_:
+        if type(transformer).__name__ == "OneHotEncoder":
+            return {
+                columna: tuple(str(c) for c in categorias)
+                for columna, categorias in zip(columnas, transformer.categories_)
+            }
+    raise ValueError("El preprocesador no tiene OneHotEncoder")
+
+
+def _bloque_generado(vocabulario: Mapping[str, Sequence[str]]) -> str:
+    lineas = [INICIO_GENERADO, "VOCABULARIO: Dict[str, Tuple[str, ...]] = {"]
+    for campo in CAMPOS_CATEGORICOS:
+        lineas.append(f"    {json.dumps(campo, ensure_ascii=False)}: (")
+        lineas.extend(f"        {json.dumps(c, ensure_ascii=False)}," for c in vocabulario[campo])
+        lineas.append("    ),")
+    lineas += ["}", FIN_GENERADO]
+    return "\n".join(lineas)
+
+
+def generar(preprocesadores: Mapping[str, Any], ruta: Path = Path(__file__)) -> bool:
+    """
+    Reescribe el bloque VOCABULARIO de este módulo a partir de los
+    preprocesadores. Todas las variantes deben compartir el vocabulario.
+
+    Returns:
+        True si el fichero ha cambiado
+    """
+    vocabularios = {nombre: vocabulario_preprocesador(p) for nombre, p in preprocesadores.items()}
+    referencia = next(iter(vocabularios.values()))
+    for nombre, vocabulario in vocabularios.items():
+        if vocabulario != referencia:
+            raise ValueError(f"El vocabulario del modelo {nombre} difiere del resto")
+    if set(referencia) != set(CAMPOS_CATEGORICOS):
+        raise ValueError(f"Columnas categóricas inesperadas: {sorted(referencia)}")
+
+    texto = ruta.read_text(encoding="utf-8")
+    antes, resto_texto = texto.split(INICIO_GENERADO + "\n", 1)
+    _, despues = resto_texto.split(FIN_GENERADO + "\n", 1)
+    nuevo = antes + _bloque_generado(referencia) + "\n" + despues
+    if nuevo == texto:
+        return False
+    ruta.write_text(nuevo, encoding="utf-8")
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Genera o comprueba el vocabulario compartido")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--generar", action="store_true", help="Reescribe VOCABULARIO a partir de los modelos")
+    grupo.add_argument("--comprobar", action="store_true", help="Falla si VOCABULARIO no corresponde a los modelos")
+    args = parser.parse_args()
+
+    from registro_modelos import VARIANTES, ModelRegistry
+
+    registro = ModelRegistry()
+    preprocesadores = {nombre: registro.get(nombre).preprocessor for nombre in VARIANTES}
+    if args.generar:
+        cambiado = generar(preprocesadores)
+        logger.info("Vocabulario actualizado" if cambiado else "El vocabulario ya estaba al día")
+    else:
+        for nombre, preprocessor in preprocesadores.items():
+            if vocabulario_preprocesador(preprocessor) != VOCABULARIO:
+                logger.error(f"VOCABULARIO no corresponde al modelo {nombre}; ejecute --generar")
+                sys.exit(1)
+        logger.info(f"Vocabulario al día ({HUELLA})")
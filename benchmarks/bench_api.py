@@ -0,0 +1,71 @@
+"""
+Benchmark de extremo a extremo de la API en proceso (cliente ASGI, sin red).
+
+Mide /predict con peticiones repetidas (aciertos de tabla o caché) y variadas
+(pasan por el modelo), y /predict/batch, para cada variante de modelo.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_api.py --peticiones 2000
+"""
+import argparse
+import logging
+import time
+
+from fastapi.testclient import TestClient
+
+from comun import PETICIONES, guardar_resultados, registros_sinteticos, resumen_latencias
+
+
+def medir_peticiones(cliente: TestClient, ruta: str, cuerpos) -> dict:
+    latencias = []
+    inicio = time.perf_counter()
+    for cuerpo in cuerpos:
+        t = time.perf_counter()
+        respuesta = cliente.post(ruta, json=cuerpo)
+        latencias.append(time.perf_counter() - t)
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"{ruta} devolvió {respuesta.status_code}: {respuesta.text}")
+    transcurrido = time.perf_counter() - inicio
+    return {"peticiones_s": len(cuerpos) / transcurrido, "latencia": resumen_latencias(latencias)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de /predict con un cliente ASGI en proceso")
+    parser.add_argument("--peticiones", type=int, default=2000, help="Peticiones por escenario")
+    parser.add_argument("--tamano-lote", type=int, default=100, help="Registros por petición a /predict/batch")
+    parser.add_argument("--salida", default=None)
+    args = parser.parse_args()
+
+    # El log por petición de la API distorsionaría las medidas
+    logging.disable(logging.INFO)
+    import main as api
+
+    resultados = {}
+    with TestClient(api.app) as cliente:
+        for nombre, peticion in zip(("distrito", "coordenadas"), PETICIONES):
+            bundle = api.registro.get(nombre)
+            variados = registros_sinteticos(bundle, args.peticiones, semilla=1)
+            # Calentamiento: carga perezosa, microbatcher y primera entrada de caché
+            medir_peticiones(cliente, "/predict", [peticion] * 10)
+
+            escenarios = {
+                "predict_repetida": ("/predict", [peticion] * args.peticiones),
+                "predict_variada": ("/predict", variados),
+                "predict_batch": ("/predict/batch", [
+                    variados[i:i + args.tamano_lote] for i in range(0, len(variados), args.tamano_lote)
+                ]),
+            }
+            resultados[nombre] = {}
+            for escenario, (ruta, cuerpos) in escenarios.items():
+                api.cache_predicciones.vaciar()
+                medida = medir_peticiones(cliente, ruta, cuerpos)
+                resultados[nombre][escenario] = medida
+                print(f"{nombre:12s} {escenario:18s} {medida['peticiones_s']:8.0f} pet/s  "
+                      f"p50 {medida['latencia']['p50_ms']:7.3f} ms  p99 {medida['latencia']['p99_ms']:7.3f} ms")
+        resultados["cache"] = api.cache_predicciones.estadisticas()
+
+    guardar_resultados("api", resultados, args.salida)
+
+
+if __name__ == "__main__":
+    main()
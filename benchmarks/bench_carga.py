@@ -0,0 +1,86 @@
+"""
+Generador de carga contra /predict con concurrencia creciente.
+
+Para cada nivel de concurrencia mantiene ese número de conexiones keep-alive
+enviando peticiones durante unos segundos y registra el rendimiento y las
+latencias p50/p99. Por defecto arranca su propio servidor (backend/servidor.py);
+con --url se mide un servidor ya en marcha.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_carga.py --concurrencia 1 2 4 8 16 32 --duracion 10
+    python benchmarks/bench_carga.py --url http://127.0.0.1:8000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from urllib.parse import urlparse
+
+from comun import PETICIONES, RAIZ, esperar_http, generar_carga, guardar_resultados
+
+ESCENARIOS = ("repetidas", "variadas")
+
+
+def cuerpos_escenario(escenario: str, n: int = 5000):
+    if escenario == "repetidas":
+        return [json.dumps(p).encode() for p in PETICIONES]
+    # Coordenadas distintas en cada petición: sin aciertos de caché
+    cuerpos = []
+    for i in range(n):
+        peticion = dict(PETICIONES[1])
+        peticion["coordenada_x_utm"] += i * 7.3
+        peticion["coordenada_y_utm"] -= i * 3.1
+        cuerpos.append(json.dumps(peticion).encode())
+    return cuerpos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia y rendimiento de /predict con concurrencia creciente")
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de carga por nivel")
+    parser.add_argument("--escenario", choices=ESCENARIOS, default="repetidas")
+    parser.add_argument("--url", default=None, help="Servidor ya arrancado; si no se indica se lanza uno")
+    parser.add_argument("--workers", type=int, default=1, help="Workers del servidor lanzado")
+    parser.add_argument("--port", type=int, default=8766, help="Puerto del servidor lanzado")
+    parser.add_argument("--salida", default=None)
+    args = parser.parse_args()
+
+    proceso = None
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        proceso = subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, "backend", "servidor.py"),
+             "--host", host, "--port", str(port), "--workers", str(args.workers)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    cuerpos = cuerpos_escenario(args.escenario)
+    niveles = []
+    try:
+        esperar_http(host, port, proceso)
+        generar_carga(host, port, max(args.concurrencia), 1.0, cuerpos)
+        for conexiones in args.concurrencia:
+            medida = generar_carga(host, port, conexiones, args.duracion, cuerpos)
+            niveles.append(medida)
+            print(f"{conexiones:4d} conexiones  {medida['peticiones_s']:8.0f} pet/s  "
+                  f"p50 {medida['latencia'].get('p50_ms', float('nan')):8.2f} ms  "
+                  f"p99 {medida['latencia'].get('p99_ms', float('nan')):8.2f} ms  errores {medida['errores']}  "
+                  f"rechazadas {medida['rechazadas']}")
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+    guardar_resultados("carga", {
+        "servidor": args.url or f"servidor.py --workers {args.workers}",
+        "escenario": args.escenario,
+        "niveles": niveles,
+    }, args.salida)
+
+
+if __name__ == "__main__":
+    main()
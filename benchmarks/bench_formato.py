@@ -0,0 +1,102 @@
+"""
+Compara el formato JSON (/predict/batch) con el formato Arrow IPC
+(/predict/arrow) con un cliente ASGI en proceso, para varios tamaños de lote.
+
+Los cuerpos se serializan antes de medir: la latencia incluye la lectura y
+decodificación del cuerpo, la predicción y la serialización de la respuesta
+en el servidor, y la decodificación de la respuesta en el cliente. Con
+--codigos el cuerpo Arrow envía las categorías como códigos enteros del
+vocabulario en lugar de texto diccionario.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_formato.py --tamanos 1 100 10000
+"""
+import argparse
+import json
+import logging
+
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+from comun import cronometrar, guardar_resultados, registros_sinteticos
+from formato_arrow import TIPO_ARROW, leer_tabla
+from vocabulario import CAMPOS_CATEGORICOS, CODIGOS
+
+
+def cuerpo_arrow(registros, codigos: bool) -> bytes:
+    columnas = {c: [r.get(c) for r in registros] for c in dict.fromkeys(k for r in registros for k in r)}
+    arrays = {}
+    for columna, valores in columnas.items():
+        if columna in CAMPOS_CATEGORICOS:
+            arrays[columna] = (
+                pa.array([CODIGOS[columna][v] for v in valores], type=pa.int8()) if codigos
+                else pa.array(valores, type=pa.string()).dictionary_encode()
+            )
+        else:
+            arrays[columna] = pa.array(valores, type=pa.float64())
+    tabla = pa.table(arrays)
+    salida = pa.BufferOutputStream()
+    with pa.ipc.new_stream(salida, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    return salida.getvalue().to_pybytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON frente a Arrow IPC en las predicciones por lotes")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1, 100, 10000], help="Filas por petición")
+    parser.add_argument("--codigos", action="store_true", help="Envía las categorías como códigos enteros")
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--minimo-s", type=float, default=1.0, help="Tiempo mínimo de medida por escenario")
+    parser.add_argument("--salida", default=None)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    import main as api
+
+    resultados = {}
+    with TestClient(api.app) as cliente:
+        for nombre in ("distrito", "coordenadas"):
+            bundle = api.registro.get(nombre)
+            resultados[nombre] = {}
+            for tamano in args.tamanos:
+                registros = registros_sinteticos(bundle, tamano, semilla=2)
+                cuerpo_json = json.dumps(registros).encode()
+                cuerpo_binario = cuerpo_arrow(registros, args.codigos)
+
+                def peticion_json():
+                    respuesta = cliente.post("/predict/batch", content=cuerpo_json,
+                                             headers={"Content-Type": "application/json"})
+                    respuesta.raise_for_status()
+                    return respuesta.json()
+
+                def peticion_arrow():
+                    respuesta = cliente.post("/predict/arrow", content=cuerpo_binario,
+                                             headers={"Content-Type": TIPO_ARROW})
+                    respuesta.raise_for_status()
+                    return leer_tabla(respuesta.content)
+
+                # Ambas rutas deben dar las mismas predicciones
+                esperado = [r["prediction"] for r in peticion_json()["resultados"]]
+                if peticion_arrow().column("prediction").to_pylist() != esperado:
+                    raise AssertionError(f"JSON y Arrow difieren ({nombre}, {tamano} filas)")
+
+                medidas = {
+                    "json": {"bytes_peticion": len(cuerpo_json),
+                             **cronometrar(peticion_json, args.repeticiones, args.minimo_s)},
+                    "arrow": {"bytes_peticion": len(cuerpo_binario),
+                              **cronometrar(peticion_arrow, args.repeticiones, args.minimo_s)},
+                }
+                for medida in medidas.values():
+                    medida["filas_s"] = tamano / (medida["p50_ms"] / 1000)
+                resultados[nombre][str(tamano)] = medidas
+
+                for formato, medida in medidas.items():
+                    print(f"{nombre:12s} {tamano:>6d} filas  {formato:6s} {medida['bytes_peticion']:>9d} B  "
+                          f"p50 {medida['p50_ms']:9.3f} ms  p99 {medida['p99_ms']:9.3f} ms  "
+                          f"{medida['filas_s']:12,.0f} filas/s")
+
+    guardar_resultados("formato", resultados, args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Microbenchmarks de las etapas de inferencia de cada bundle.
+
+Mide por separado preprocessor.transform, model.predict_proba y
+label_encoder.inverse_transform (la ruta original con pandas) y, como
+referencia, la codificación, predicción y contribuciones por campo de la ruta
+compilada, para varios tamaños de lote.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_micro.py --tamanos 1 100 10000
+"""
+import argparse
+from types import SimpleNamespace
+
+import pandas as pd
+
+from comun import cronometrar, guardar_resultados, registros_sinteticos
+from registro_modelos import VARIANTES, ModelRegistry
+
+
+def medir_bundle(bundle, registros, repeticiones: int, minimo_s: float):
+    df = pd.DataFrame(registros)
+    X = bundle.preprocessor.transform(df)
+    probas = bundle.model.predict_proba(X)
+    clases = probas.argmax(axis=1)
+
+    etapas = {
+        "preprocessor.transform": lambda: bundle.preprocessor.transform(df),
+        "model.predict_proba": lambda: bundle.model.predict_proba(X),
+        "label_encoder.inverse_transform": lambda: bundle.label_encoder.inverse_transform(clases),
+    }
+    if bundle.compilado is not None:
+        compilado = bundle.compilado
+        Xc = compilado.codificar([SimpleNamespace(**r) for r in registros])
+        etapas["compilado.codificar_columnas"] = lambda: compilado.codificar_columnas(
+            {c: df[c].to_numpy() for c in df.columns}, len(df)
+        )
+        etapas["compilado.predecir_proba"] = lambda: compilado.predecir_proba(Xc)
+        if compilado.admite_contribuciones:
+            etapas["compilado.contribuciones"] = lambda: compilado.contribuciones(Xc)
+
+    return {etapa: cronometrar(funcion, repeticiones, minimo_s) for etapa, funcion in etapas.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de preprocesado, predicción y decodificación")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1, 100, 10000], help="Filas por lote")
+    parser.add_argument("--modelos", nargs="+", default=list(VARIANTES), choices=VARIANTES)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--minimo-s", type=float, default=0.5, help="Tiempo mínimo de medida por etapa")
+    parser.add_argument("--salida", default=None)
+    args = parser.parse_args()
+
+    registro = ModelRegistry()
+    resultados = {}
+    for nombre in args.modelos:
+        bundle = registro.get(nombre)
+        resultados[nombre] = {}
+        for tamano in args.tamanos:
+            medidas = medir_bundle(bundle, registros_sinteticos(bundle, tamano), args.repeticiones, args.minimo_s)
+            resultados[nombre][str(tamano)] = medidas
+            for etapa, resumen in medidas.items():
+                print(f"{nombre:12s} {tamano:>6d} filas  {etapa:34s} p50 {resumen['p50_ms']:9.3f} ms  "
+                      f"p99 {resumen['p99_ms']:9.3f} ms")
+
+    guardar_resultados("micro", resultados, args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark del servidor multiproceso (backend/servidor.py).
+
+Para cada número de workers arranca el servidor, genera carga contra /predict
+con varias conexiones keep-alive durante unos segundos y mide el rendimiento
+(peticiones/s y latencias) y la memoria de cada worker (RSS y PSS, que reparte
+las páginas compartidas copy-on-write entre los procesos que las usan).
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_workers.py --workers 1 2 4 --duracion 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from comun import RAIZ, esperar_http, generar_carga, guardar_resultados
+
+
+def memoria_proceso(pid: int) -> Dict[str, int]:
+    """RSS y PSS en KiB de un proceso (Linux)"""
+    memoria = {}
+    with open(f"/proc/{pid}/status") as f:
+        for linea in f:
+            if linea.startswith("VmRSS:"):
+                memoria["rss_kib"] = int(linea.split()[1])
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for linea in f:
+                if linea.startswith("Pss:"):
+                    memoria["pss_kib"] = int(linea.split()[1])
+    except FileNotFoundError:
+        pass
+    return memoria
+
+
+def hijos(pid: int) -> List[int]:
+    resultado = []
+    for tarea in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{tarea}/children") as f:
+            resultado.extend(int(p) for p in f.read().split())
+    return resultado
+
+
+def esperar_workers(proceso: subprocess.Popen, workers: int, timeout_s: float = 30.0):
+    limite = time.monotonic() + timeout_s
+    while len(hijos(proceso.pid)) < workers:
+        if time.monotonic() > limite:
+            raise TimeoutError("No han arrancado todos los workers")
+        time.sleep(0.2)
+
+
+def medir(workers: int, args) -> Dict:
+    comando = [
+        sys.executable, os.path.join(RAIZ, "backend", "servidor.py"),
+        "--host", args.host, "--port", str(args.port), "--workers", str(workers),
+    ]
+    if args.hilos_xgboost:
+        comando += ["--hilos-xgboost", str(args.hilos_xgboost)]
+    proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_http(args.host, args.port, proceso)
+        esperar_workers(proceso, workers)
+        # Calentamiento breve para que todos los workers hayan atendido peticiones
+        generar_carga(args.host, args.port, args.conexiones, 1.0)
+        carga = generar_carga(args.host, args.port, args.conexiones, args.duracion)
+        memoria_workers = [memoria_proceso(pid) for pid in hijos(proceso.pid)]
+        return {
+            "workers": workers,
+            **carga,
+            "padre": memoria_proceso(proceso.pid),
+            "memoria_workers": memoria_workers,
+            "rss_medio_worker_mib": float(np.mean([m["rss_kib"] for m in memoria_workers])) / 1024,
+            "pss_total_mib": sum(m.get("pss_kib", 0) for m in memoria_workers + [memoria_proceso(proceso.pid)]) / 1024,
+        }
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendimiento y memoria del servidor multiproceso")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de carga por configuración")
+    parser.add_argument("--conexiones", type=int, default=16, help="Conexiones concurrentes del generador")
+    parser.add_argument("--hilos-xgboost", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--salida", default=None)
+    args = parser.parse_args()
+
+    resultados = []
+    for workers in args.workers:
+        resultado = medir(workers, args)
+        resultados.append(resultado)
+        print(
+            f"{workers} workers: {resultado['peticiones_s']:.0f} pet/s, "
+            f"p50 {resultado['latencia']['p50_ms']:.2f} ms, p99 {resultado['latencia']['p99_ms']:.2f} ms, "
+            f"RSS medio por worker {resultado['rss_medio_worker_mib']:.0f} MiB, "
+            f"PSS total {resultado['pss_total_mib']:.0f} MiB"
+        )
+
+    guardar_resultados("workers", resultados, args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compara dos ficheros de resultados de un mismo benchmark (p. ej. de dos
+commits) y muestra la variación de cada métrica numérica.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/comparar.py resultados/micro-abc123-....json resultados/micro-def456-....json
+"""
+import argparse
+import json
+from typing import Any, Dict, Iterator, Tuple
+
+# Métricas en las que un valor mayor es mejor; en el resto (latencias, memoria) es peor
+MAYOR_ES_MEJOR = ("peticiones_s", "filas_s")
+
+
+def aplanar(datos: Any, prefijo: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(datos, dict):
+        for clave, valor in datos.items():
+            yield from aplanar(valor, f"{prefijo}.{clave}" if prefijo else str(clave))
+    elif isinstance(datos, list):
+        for i, valor in enumerate(datos):
+            yield from aplanar(valor, f"{prefijo}[{i}]")
+    elif isinstance(datos, (int, float)) and not isinstance(datos, bool):
+        yield prefijo, float(datos)
+
+
+def comparar(base: Dict[str, Any], nuevo: Dict[str, Any], umbral: float = 0.05):
+    metricas_base = dict(aplanar(base["resultados"]))
+    metricas_nuevo = dict(aplanar(nuevo["resultados"]))
+    print(f"Base:  {base['metadatos'].get('commit')}  {base['metadatos'].get('fecha')}")
+    print(f"Nuevo: {nuevo['metadatos'].get('commit')}  {nuevo['metadatos'].get('fecha')}")
+
+    for clave, valor_base in metricas_base.items():
+        if clave not in metricas_nuevo or not clave.endswith(("_ms", "_mib") + MAYOR_ES_MEJOR):
+            continue
+        valor_nuevo = metricas_nuevo[clave]
+        if valor_base == 0:
+            continue
+        cambio = (valor_nuevo - valor_base) / valor_base
+        mejora = cambio > 0 if clave.endswith(MAYOR_ES_MEJOR) else cambio < 0
+        marca = "" if abs(cambio) < umbral else ("mejor" if mejora else "PEOR")
+        print(f"{clave:70s} {valor_base:12.3f} -> {valor_nuevo:12.3f}  {cambio:+7.1%}  {marca}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos ejecuciones de un benchmark")
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--umbral", type=float, default=0.05, help="Variación relativa a partir de la que se marca")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding="utf-8") as f:
+        nuevo = json.load(f)
+    if base.get("benchmark") != nuevo.get("benchmark"):
+        parser.error(f"Benchmarks distintos: {base.get('benchmark')} y {nuevo.get('benchmark')}")
+    comparar(base, nuevo, args.umbral)
+
+
+if __name__ == "__main__":
+    main()
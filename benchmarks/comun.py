@@ -0,0 +1,215 @@
+"""
+Utilidades compartidas por los benchmarks: datos sintéticos, medición de
+latencias, generador de carga HTTP y guardado de resultados en JSON con los
+metadatos necesarios para comparar ejecuciones entre commits.
+"""
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_BACKEND = os.path.join(RAIZ, "backend")
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+if DIRECTORIO_BACKEND not in sys.path:
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+
+PETICIONES = [
+    {
+        "tipo_vehiculo": "Turismo", "tipo_persona": "Conductor", "tipo_accidente": "Alcance",
+        "sexo": "Hombre", "rango_edad": "De 25 a 29 años", "estado_meteorológico": "Despejado",
+        "cod_distrito": 3,
+    },
+    {
+        "tipo_vehiculo": "Motocicleta > 125cc", "tipo_persona": "Conductor", "tipo_accidente": "Colisión lateral",
+        "sexo": "Mujer", "rango_edad": "De 35 a 39 años", "estado_meteorológico": "Lluvia débil",
+        "coordenada_x_utm": 441000.0, "coordenada_y_utm": 4475000.0,
+    },
+]
+
+# Extensión aproximada del municipio de Madrid en UTM 30N (ETRS89)
+RANGO_X_UTM = (424000.0, 456000.0)
+RANGO_Y_UTM = (4462000.0, 4500000.0)
+
+
+def registros_sinteticos(bundle, n: int, semilla: int = 0) -> List[Dict[str, Any]]:
+    """
+    Registros aleatorios con las categorías que conoce el preprocesador del
+    bundle, para medir con combinaciones variadas (sin aciertos de caché ni
+    de tabla salvo por casualidad).
+    """
+    codificador = bundle.preprocessor.named_transformers_["cat"]
+    columnas_categoricas = next(c for nombre, _, c in bundle.preprocessor.transformers_ if nombre == "cat")
+    rng = np.random.default_rng(semilla)
+    columnas = {
+        columna: rng.choice(categorias, size=n).tolist()
+        for columna, categorias in zip(columnas_categoricas, codificador.categories_)
+    }
+    if bundle.nombre == "distrito":
+        columnas["cod_distrito"] = rng.integers(1, 22, size=n).tolist()
+    else:
+        columnas["coordenada_x_utm"] = rng.uniform(*RANGO_X_UTM, size=n).round(1).tolist()
+        columnas["coordenada_y_utm"] = rng.uniform(*RANGO_Y_UTM, size=n).round(1).tolist()
+    return [{c: v[i] for c, v in columnas.items()} for i in range(n)]
+
+
+def resumen_latencias(latencias_s: Sequence[float]) -> Dict[str, float]:
+    """Percentiles en milisegundos de una lista de latencias en segundos"""
+    ms = np.asarray(latencias_s, dtype=np.float64) * 1000
+    if ms.size == 0:
+        return {"n": 0}
+    return {
+        "n": int(ms.size),
+        "media_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def cronometrar(funcion: Callable[[], Any], repeticiones: int = 50, minimo_s: float = 0.5,
+                calentamiento: int = 3) -> Dict[str, float]:
+    """
+    Ejecuta `funcion` al menos `repeticiones` veces y durante al menos
+    `minimo_s` segundos, y devuelve el resumen de latencias.
+    """
+    for _ in range(calentamiento):
+        funcion()
+    latencias = []
+    inicio = time.perf_counter()
+    while len(latencias) < repeticiones or time.perf_counter() - inicio < minimo_s:
+        t = time.perf_counter()
+        funcion()
+        latencias.append(time.perf_counter() - t)
+    return resumen_latencias(latencias)
+
+
+def generar_carga(host: str, port: int, conexiones: int, duracion_s: float,
+                  cuerpos: Optional[Sequence[bytes]] = None, ruta: str = "/predict") -> Dict[str, Any]:
+    """
+    Lanza peticiones POST desde `conexiones` hilos, cada uno con su conexión
+    keep-alive, durante `duracion_s` segundos. Las respuestas 503 del control
+    de admisión se cuentan como rechazadas, no como errores.
+    """
+    cuerpos = cuerpos or [json.dumps(p).encode() for p in PETICIONES]
+    latencias: List[List[float]] = [[] for _ in range(conexiones)]
+    errores = [0] * conexiones
+    rechazadas = [0] * conexiones
+    fin = time.monotonic() + duracion_s
+
+    def cliente(i: int):
+        conexion = http.client.HTTPConnection(host, port, timeout=30)
+        j = i
+        while time.monotonic() < fin:
+            cuerpo = cuerpos[j % len(cuerpos)]
+            j += 1
+            inicio = time.perf_counter()
+            try:
+                conexion.request("POST", ruta, body=cuerpo, headers={"Content-Type": "application/json"})
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                if respuesta.status == 503:
+                    rechazadas[i] += 1
+                    continue
+                if respuesta.status != 200:
+                    errores[i] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                errores[i] += 1
+                conexion.close()
+                conexion = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            latencias[i].append(time.perf_counter() - inicio)
+        conexion.close()
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(conexiones)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - inicio
+
+    todas = [l for lista in latencias for l in lista]
+    return {
+        "conexiones": conexiones,
+        "duracion_s": transcurrido,
+        "peticiones": len(todas),
+        "errores": int(sum(errores)),
+        "rechazadas": int(sum(rechazadas)),
+        "peticiones_s": len(todas) / transcurrido,
+        "latencia": resumen_latencias(todas),
+    }
+
+
+def esperar_http(host: str, port: int, proceso: Optional[subprocess.Popen] = None,
+                 timeout_s: float = 120.0, ruta: str = "/health"):
+    """Espera a que el servidor responda 200 en `ruta`"""
+    limite = time.monotonic() + timeout_s
+    while time.monotonic() < limite:
+        if proceso is not None and proceso.poll() is not None:
+            raise RuntimeError(f"El servidor terminó con código {proceso.returncode}")
+        try:
+            conexion = http.client.HTTPConnection(host, port, timeout=2)
+            conexion.request("GET", ruta)
+            if conexion.getresponse().status == 200:
+                conexion.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError("El servidor no ha arrancado a tiempo")
+
+
+def _git(*argumentos: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *argumentos], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadatos() -> Dict[str, Any]:
+    """Commit, entorno y versiones de librerías de la ejecución"""
+    versiones = {}
+    for modulo in ("numpy", "pandas", "sklearn", "xgboost", "fastapi", "uvicorn"):
+        try:
+            versiones[modulo] = __import__(modulo).__version__
+        except ImportError:
+            versiones[modulo] = None
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "cambios_sin_commit": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "nucleos": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "versiones": versiones,
+    }
+
+
+def guardar_resultados(nombre: str, resultados: Any, salida: Optional[str] = None) -> str:
+    """
+    Guarda los resultados junto con los metadatos. Por defecto en
+    benchmarks/resultados/<nombre>-<commit>-<fecha>.json.
+    """
+    datos = {"benchmark": nombre, "metadatos": metadatos(), "resultados": resultados}
+    if salida is None:
+        marca = datetime.now().strftime("%Y%m%d-%H%M%S")
+        salida = os.path.join(DIRECTORIO_RESULTADOS, f"{nombre}-{datos['metadatos']['commit'] or 'sin-git'}-{marca}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {salida}")
+    return salida
@@ -1,8 +1,17 @@
+import os
+import re
+import sys
+
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import folium
 from streamlit_folium import st_folium
 
+# Vocabulario compartido con el backend (mismas categorías y códigos que los modelos)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+from vocabulario import CODIGOS, VOCABULARIO
+
 # Configuración de página
 st.set_page_config(
     page_title="Sistema de Predicción de Lesividad",
@@ -187,41 +196,86 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Constantes
-TIPOS_VEHICULO = [
-    "Turismo", "Motocicleta > 125cc", "Furgoneta", "Motocicleta hasta 125cc", 
-    "Bicicleta", "Ciclomotor", "Todo terreno", "Autobús", "Camión rígido", 
-    "Maquinaria de obras", "Tractocamión", "Se desconoce", "Cuadriciclo no ligero", 
-    "Vehículo articulado", "Autobús articulado", "Otros vehículos con motor", 
-    "Autocaravana", "Patinete", "Ciclo", "Cuadriciclo ligero", "Vmu eléctrico",
-    "Semiremolque", "Microbús <= 17 plazas", "Sin especificar", "Autobus emt", 
-    "Remolque", "Tranvía", "Caravana", "Camión de bomberos", 
-    "Otros vehículos sin motor", "Bicicleta epac (pedaleo asistido)",
-    "Moto de tres ruedas > 125cc", "Tren/metro", "Ambulancia samur", 
-    "Moto de tres ruedas hasta 125cc", "Ciclomotor de dos ruedas l1e-b", 
-    "Maquinaria agrícola", "Autobús articulado emt", "Ciclomotor de tres ruedas", 
-    "Ciclo de motor l1e-a", "Patinete no eléctrico"
-]
-
-TIPOS_ACCIDENTE = [
-    "Colisión lateral", "Alcance", "Choque contra obstáculo fijo", 
-    "Colisión fronto-lateral", "Caída", "Colisión frontal", "Otro", 
-    "Atropello a persona", "Colisión múltiple", "Vuelco", "Atropello a animal",
-    "Solo salida de la vía", "Despeñamiento"
-]
-
-RANGOS_EDAD = [
-    "Menor de 5 años", "De 6 a 9 años", "De 10 a 14 años", "De 15 a 17 años", 
-    "De 18 a 20 años", "De 21 a 24 años", "De 25 a 29 años", "De 30 a 34 años", 
-    "De 35 a 39 años", "De 40 a 44 años", "De 45 a 49 años", "De 50 a 54 años", 
-    "De 55 a 59 años", "De 60 a 64 años", "De 65 a 69 años", "De 70 a 74 años", 
-    "Más de 74 años", "Desconocido"
-]
-
-ESTADOS_METEOROLOGICOS = [
-    "Despejado", "Se desconoce", "Lluvia débil", "Nublado", 
-    "Lluvia intensa", "Granizando", "Nevando"
-]
+URL_API = os.getenv("BACKEND_URL", "http://localhost:8000").rstrip("/")
+
+def orden_rango_edad(rango: str) -> float:
+    """Ordena los rangos de edad por su primera edad; 'Desconocido' va al final"""
+    edades = re.findall(r"\d+", rango)
+    return int(edades[0]) if edades else float("inf")
+
+# Listas de los desplegables: las categorías del vocabulario, en orden de presentación
+TIPOS_PERSONA = list(VOCABULARIO["tipo_persona"])
+TIPOS_VEHICULO = list(VOCABULARIO["tipo_vehiculo"])
+TIPOS_ACCIDENTE = list(VOCABULARIO["tipo_accidente"])
+SEXOS = list(VOCABULARIO["sexo"])
+RANGOS_EDAD = sorted(VOCABULARIO["rango_edad"], key=orden_rango_edad)
+ESTADOS_METEOROLOGICOS = list(VOCABULARIO["estado_meteorológico"])
+
+CENTRO_MADRID = [40.4168, -3.7038]
+
+distrito_map = {
+    "Centro": 1, "Arganzuela": 2, "Retiro": 3, "Salamanca": 4, "Chamartín": 5,
+    "Tetuán": 6, "Chamberí": 7, "Fuencarral-El Pardo": 8, "Moncloa-Aravaca": 9,
+    "Latina": 10, "Carabanchel": 11, "Usera": 12, "Puente de Vallecas": 13,
+    "Moratalaz": 14, "Ciudad Lineal": 15, "Hortaleza": 16, "Villaverde": 17,
+    "Villa de Vallecas": 18, "Vicálvaro": 19, "San Blas-Canillejas": 20, "Barajas": 21
+}
+
+
+@st.cache_resource
+def sesion_http() -> requests.Session:
+    """Sesión HTTP compartida entre reruns y usuarios: reutiliza las conexiones keep-alive con la API"""
+    sesion = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    sesion.mount("http://", adaptador)
+    sesion.mount("https://", adaptador)
+    return sesion
+
+
+@st.cache_data(max_entries=1024, ttl=3600, show_spinner=False)
+def predecir(datos: tuple) -> dict:
+    """
+    Predicción de la API para unos datos del accidente, memorizada: los reruns
+    con las mismas entradas no vuelven a llamar al backend. Los errores no se
+    memorizan.
+    """
+    response = sesion_http().post(f"{URL_API}/predict", json=dict(datos), timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def evaluacion_modelo():
+    """Informe de evaluación offline servido en /modelo/info (None si no hay o la API no responde)"""
+    try:
+        response = sesion_http().get(f"{URL_API}/modelo/info", timeout=5)
+        response.raise_for_status()
+        return response.json().get("evaluacion")
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def porcentaje(valor) -> str:
+    return "n/d" if valor is None else f"{valor:.1%}"
+
+
+def mapa_base() -> folium.Map:
+    """
+    Mapa base de Madrid. Se construye en cada rerun (unos pocos ms) en lugar de
+    memorizarse porque st_folium le añade las capas dinámicas.
+    """
+    return folium.Map(location=CENTRO_MADRID, zoom_start=12)
+
+
+def guardar_clic():
+    """Guarda el último clic del mapa antes del rerun, para que el marcador se dibuje en esa misma pasada"""
+    clic = (st.session_state.get("madrid_map") or {}).get("last_clicked")
+    if clic:
+        # Guardar como lista [lat, lng]
+        st.session_state["map_click"] = [clic["lat"], clic["lng"]]
 
+
+# Las variables categóricas se envían como códigos enteros del vocabulario
 features = {}
 
 st.markdown("---")
@@ -242,43 +296,46 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("Información Personal")
-    features["tipo_persona"] = st.selectbox(
+    features["tipo_persona"] = CODIGOS["tipo_persona"][st.selectbox(
         "Tipo de persona",
-        ["Conductor", "Pasajero", "Peatón"],
+        TIPOS_PERSONA,
         help="Rol de la persona en el accidente"
-    )
+    )]
     
-    features["rango_edad"] = st.selectbox(
+    features["rango_edad"] = CODIGOS["rango_edad"][st.selectbox(
         "Rango de edad",
         RANGOS_EDAD,
         help="Grupo etario de la persona involucrada"
-    )
+    )]
     
-    features["sexo"] = st.selectbox(
+    features["sexo"] = CODIGOS["sexo"][st.selectbox(
         "Sexo",
-        ["Hombre", "Mujer", "Desconocido"],
+        SEXOS,
+        index=SEXOS.index("Hombre"),
         help="Sexo de la persona involucrada"
-    )
+    )]
 
 with col2:
     st.subheader("Información del Siniestro")
-    features["tipo_vehiculo"] = st.selectbox(
+    features["tipo_vehiculo"] = CODIGOS["tipo_vehiculo"][st.selectbox(
         "Tipo de vehículo",
         TIPOS_VEHICULO,
+        index=TIPOS_VEHICULO.index("Turismo"),
         help="Vehículo involucrado en el accidente"
-    )
+    )]
     
-    features["tipo_accidente"] = st.selectbox(
+    features["tipo_accidente"] = CODIGOS["tipo_accidente"][st.selectbox(
         "Tipo de accidente",
         TIPOS_ACCIDENTE,
+        index=TIPOS_ACCIDENTE.index("Colisión lateral"),
         help="Clasificación del siniestro"
-    )
+    )]
     
-    features["estado_meteorológico"] = st.selectbox(
+    features["estado_meteorológico"] = CODIGOS["estado_meteorológico"][st.selectbox(
         "Condiciones meteorológicas",
         ESTADOS_METEOROLOGICOS,
         help="Estado del tiempo durante el accidente"
-    )
+    )]
 
 st.markdown("---")
 
@@ -301,14 +358,6 @@ modo = st.selectbox(
 )
 
 if modo == "Distrito":
-    distrito_map = {
-        "Centro": 1, "Arganzuela": 2, "Retiro": 3, "Salamanca": 4, "Chamartín": 5,
-        "Tetuán": 6, "Chamberí": 7, "Fuencarral-El Pardo": 8, "Moncloa-Aravaca": 9,
-        "Latina": 10, "Carabanchel": 11, "Usera": 12, "Puente de Vallecas": 13,
-        "Moratalaz": 14, "Ciudad Lineal": 15, "Hortaleza": 16, "Villaverde": 17,
-        "Villa de Vallecas": 18, "Vicálvaro": 19, "San Blas-Canillejas": 20, "Barajas": 21
-    }
-    
     distrito_nombre = st.selectbox(
         "Distrito de Madrid",
         list(distrito_map.keys()),
@@ -325,17 +374,49 @@ if modo == "Distrito":
     </div>
     """, unsafe_allow_html=True)
 
-    with st.empty():
-        dummy_map = folium.Map(location=[40.4168, -3.7038], zoom_start=12)
-        st_folium(dummy_map, width=None, height=0, key="hidden_map")
-
 else:
     # Inicialización del estado
     if "map_click" not in st.session_state:
         st.session_state["map_click"] = None
 
-    # Crear mapa
-    map_madrid = folium.Map(location=[40.4168, -3.7038], zoom_start=12)
+    # Capas que cambian entre reruns (marcador y riesgo); el mapa base queda fuera
+    capas = folium.FeatureGroup(name="Selección")
+
+    # Capa de riesgo del escenario: el backend la calcula una vez por escenario
+    # y sirve las teselas PNG ya renderizadas
+    if st.checkbox(
+        "Mostrar mapa de riesgo del escenario",
+        help="Colorea Madrid según el riesgo estimado para los datos del accidente seleccionados"
+    ):
+        escenario = {campo: features[campo] for campo in (
+            "tipo_vehiculo", "tipo_persona", "tipo_accidente",
+            "sexo", "rango_edad", "estado_meteorológico"
+        )}
+        capa = st.session_state.get("mapa_riesgo", {})
+        if capa.get("escenario") != escenario:
+            try:
+                respuesta = sesion_http().post(f"{URL_API}/mapa/riesgo", json=escenario, timeout=30)
+                respuesta.raise_for_status()
+                capa = {"escenario": escenario, **respuesta.json()}
+            except (requests.exceptions.RequestException, ValueError):
+                capa = {"escenario": escenario}
+            st.session_state["mapa_riesgo"] = capa
+        if "teselas" in capa:
+            folium.TileLayer(
+                tiles=capa["teselas"],
+                attr="Modelo de lesividad",
+                name="Riesgo",
+                overlay=True,
+                opacity=0.7,
+            ).add_to(capas)
+            estadisticas = capa["estadisticas"]
+            if estadisticas.get("riesgo_min") is not None:
+                st.caption(
+                    f"Riesgo estimado entre {estadisticas['riesgo_min']:.0%} (verde) "
+                    f"y {estadisticas['riesgo_max']:.0%} (rojo)"
+                )
+        else:
+            st.warning("No se pudo obtener el mapa de riesgo del servidor")
 
     # Agregar marcador solo si hay ubicación seleccionada
     if st.session_state["map_click"]:
@@ -343,37 +424,62 @@ else:
             st.session_state["map_click"],
             icon=folium.Icon(color="red", icon="map-marker"),
             popup="📍 Ubicación seleccionada"
-        ).add_to(map_madrid)
+        ).add_to(capas)
 
-    mapa = st_folium(
-        map_madrid, 
-        width=None, 
+    # El mapa base genera siempre el mismo script, así que el navegador lo
+    # conserva entre reruns (teselas, zoom y encuadre) y solo sustituye las capas
+    st_folium(
+        mapa_base(),
+        width=None,
         height=500,
         key="madrid_map",
-        returned_objects=["last_clicked"]
+        returned_objects=["last_clicked"],
+        feature_group_to_add=capas,
+        on_change=guardar_clic,
     )
 
-    if mapa and mapa.get("last_clicked"):
-        clicked_point = mapa["last_clicked"]
-        # Guardar como lista [lat, lng]
-        st.session_state["map_click"] = [
-            clicked_point["lat"], 
-            clicked_point["lng"]
-        ]
-        # Forzar recarga para mostrar marcador
-        st.rerun()
-
-    # Configurar features según selección
+    # Configurar features según selección: el clic llega en latitud/longitud
+    # WGS84 y el backend lo proyecta a UTM 30N
     if st.session_state["map_click"]:
-        features["coordenada_y_utm"] = st.session_state["map_click"][0]
-        features["coordenada_x_utm"] = st.session_state["map_click"][1] 
+        latitud, longitud = st.session_state["map_click"]
+        features["latitud"] = latitud
+        features["longitud"] = longitud
+        features["coordenada_y_utm"] = None
+        features["coordenada_x_utm"] = None
         features["cod_distrito"] = None
-        
+
+        # Proyección y distrito del punto, una vez por clic
+        if st.session_state.get("map_click_geo", {}).get("punto") != [latitud, longitud]:
+            try:
+                geo = sesion_http().post(
+                    f"{URL_API}/geo/localizar",
+                    json={"latitud": [latitud], "longitud": [longitud]},
+                    timeout=10
+                ).json()
+                st.session_state["map_click_geo"] = {
+                    "punto": [latitud, longitud],
+                    "x": geo["coordenada_x_utm"][0],
+                    "y": geo["coordenada_y_utm"][0],
+                    "distrito": geo["cod_distrito"][0],
+                }
+            except (requests.exceptions.RequestException, KeyError, ValueError):
+                st.session_state["map_click_geo"] = {"punto": [latitud, longitud]}
+        geo = st.session_state["map_click_geo"]
+
+        texto_utm = f" (UTM {geo['x']:.0f}, {geo['y']:.0f})" if "x" in geo else ""
         st.markdown(f"""
         <div class="alert-success">
-            <strong>Coordenadas:</strong> {features['coordenada_y_utm']:.4f}, {features['coordenada_x_utm']:.4f}
+            <strong>Coordenadas:</strong> {latitud:.4f}, {longitud:.4f}{texto_utm}
         </div>
         """, unsafe_allow_html=True)
+
+        if geo.get("distrito"):
+            nombres_distrito = {codigo: nombre for nombre, codigo in distrito_map.items()}
+            if st.checkbox(
+                f"Usar el modelo de distrito ({nombres_distrito.get(geo['distrito'], geo['distrito'])})",
+                help="Predice con el distrito del punto en lugar de sus coordenadas"
+            ):
+                features["cod_distrito"] = geo["distrito"]
     else:
         features["coordenada_y_utm"] = None
         features["coordenada_x_utm"] = None  
@@ -406,47 +512,74 @@ st.markdown("""
 if st.button("Analizar Caso", disabled=not can_predict):
     with st.spinner("Procesando análisis..."):
         try:
-            response = requests.post(
-                "http://localhost:8000/predict",
-                json=features,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                resultado = response.json()
-                pred = resultado.get("prediction")
-                prob = resultado.get("probability", 0)
-
-                if pred == 1:
-                    st.markdown(f"""
-                    <div class="prediction-result prediction-safe">
-                        <div class="prediction-title">Sin Asistencia Sanitaria</div>
-                        <div class="prediction-probability">Probabilidad: {prob*100:.1f}%</div>
-                        <div class="prediction-description">
-                            El modelo predice que este accidente probablemente no requerirá 
-                            asistencia sanitaria inmediata.
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="prediction-result prediction-danger">
-                        <div class="prediction-title">Asistencia Sanitaria Requerida</div>
-                        <div class="prediction-probability">Probabilidad: {prob*100:.1f}%</div>
-                        <div class="prediction-description">
-                            El modelo predice que este accidente probablemente requerirá 
-                            asistencia sanitaria. Se recomienda activar protocolos de emergencia.
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
+            # La clave de la memoización es independiente del orden de los campos
+            resultado = predecir(tuple(sorted(features.items())))
         except requests.exceptions.ConnectionError:
+            resultado = None
             st.markdown("""
             <div class="alert-danger">
                 <strong>Error de conexión:</strong> No se pudo conectar con el sistema de análisis.
                 Verifica que el servidor esté ejecutándose.
             </div>
             """, unsafe_allow_html=True)
+        except requests.exceptions.HTTPError as e:
+            resultado = None
+            if e.response is not None and e.response.status_code == 503:
+                reintento = e.response.headers.get("Retry-After", "unos")
+                st.markdown(f"""
+                <div class="alert-danger">
+                    <strong>Sistema saturado:</strong> El sistema de análisis está atendiendo demasiadas
+                    peticiones. Vuelve a intentarlo en {reintento} segundos.
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.markdown(f"""
+                <div class="alert-danger">
+                    <strong>Error del sistema de análisis:</strong> {e}
+                </div>
+                """, unsafe_allow_html=True)
+        except requests.exceptions.Timeout:
+            resultado = None
+            st.markdown("""
+            <div class="alert-danger">
+                <strong>Tiempo de espera agotado:</strong> El sistema de análisis no respondió a tiempo.
+                Vuelve a intentarlo en unos segundos.
+            </div>
+            """, unsafe_allow_html=True)
+        except requests.exceptions.RequestException as e:
+            resultado = None
+            st.markdown(f"""
+            <div class="alert-danger">
+                <strong>Error del sistema de análisis:</strong> {e}
+            </div>
+            """, unsafe_allow_html=True)
+
+        if resultado is not None:
+            pred = resultado.get("prediction")
+            prob = resultado.get("probability", 0)
+
+            if pred == 1:
+                st.markdown(f"""
+                <div class="prediction-result prediction-safe">
+                    <div class="prediction-title">Sin Asistencia Sanitaria</div>
+                    <div class="prediction-probability">Probabilidad: {prob*100:.1f}%</div>
+                    <div class="prediction-description">
+                        El modelo predice que este accidente probablemente no requerirá 
+                        asistencia sanitaria inmediata.
+                    </div>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.markdown(f"""
+                <div class="prediction-result prediction-danger">
+                    <div class="prediction-title">Asistencia Sanitaria Requerida</div>
+                    <div class="prediction-probability">Probabilidad: {prob*100:.1f}%</div>
+                    <div class="prediction-description">
+                        El modelo predice que este accidente probablemente requerirá 
+                        asistencia sanitaria. Se recomienda activar protocolos de emergencia.
+                    </div>
+                </div>
+                """, unsafe_allow_html=True)
 
 st.markdown("---")
 
@@ -463,12 +596,30 @@ with st.expander("Información Técnica del Modelo"):
     - Tipo y circunstancias del accidente
     - Condiciones meteorológicas
     - Ubicación geográfica
-    
+    """)
+
+    informe = evaluacion_modelo()
+    if informe is None:
+        st.markdown("""
     ### Métricas de Rendimiento
-    - **Precisión global**: 84%
-    - **Sensibilidad**: 84%
-    - **Especificidad**: 84%
-    
+    No hay evaluación disponible para los modelos en uso
+    (`python backend/evaluacion.py <fichero etiquetado>`).
+    """)
+    else:
+        metricas_api = informe["metricas"]["api"]
+        roc_auc = "n/d" if metricas_api["roc_auc"] is None else f"{metricas_api['roc_auc']:.3f}"
+        st.markdown(f"""
+    ### Métricas de Rendimiento
+    Evaluación sobre {metricas_api['n']:,} accidentes etiquetados ({informe['fichero']}, {informe['fecha'][:10]}):
+    - **Precisión global**: {porcentaje(metricas_api['exactitud'])}
+    - **Sensibilidad**: {porcentaje(metricas_api['sensibilidad'])}
+    - **Especificidad**: {porcentaje(metricas_api['especificidad'])}
+    - **ROC-AUC**: {roc_auc}
+    """)
+        if not informe.get("vigente", True):
+            st.warning("La evaluación corresponde a otra versión de los modelos")
+
+    st.markdown("""
     ### Interpretación
     - **Sin Asistencia**: Lesiones leves sin necesidad de atención médica
     - **Con Asistencia**: Lesiones que requieren intervención sanitaria
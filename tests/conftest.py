@@ -0,0 +1,9 @@
+"""
+Configuración común de los tests: los módulos de backend/ se importan por su
+nombre, igual que cuando la API se arranca desde ese directorio.
+"""
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND))
@@ -0,0 +1,123 @@
+"""Endpoints de predicción con TestClient: errores por fila, 422 y Arrow IPC"""
+import importlib
+
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+BASE = {
+    "tipo_vehiculo": "Turismo",
+    "tipo_persona": "Conductor",
+    "tipo_accidente": "Colisión lateral",
+    "sexo": "Hombre",
+    "rango_edad": "De 30 a 34 años",
+    "estado_meteorológico": "Despejado",
+    "cod_distrito": 5,
+}
+COORDENADAS = {**BASE, "cod_distrito": None, "coordenada_x_utm": 441000.0, "coordenada_y_utm": 4474000.0}
+
+
+@pytest.fixture(scope="module")
+def cliente(tmp_path_factory):
+    # main lee la configuración al importarse: auditoría y trabajos en un directorio temporal
+    directorio = tmp_path_factory.mktemp("api")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("AUDITORIA_DIR", str(directorio / "auditoria"))
+        mp.setenv("TRABAJOS_DB", str(directorio / "trabajos.sqlite3"))
+        mp.setenv("TRABAJOS_HILOS", "0")
+        mp.setenv("CACHE_MAX_ENTRADAS", "0")
+        main = importlib.import_module("main")
+        with TestClient(main.app) as cliente:
+            yield cliente
+
+
+def _arrow(columnas) -> bytes:
+    tabla = pa.table(columnas)
+    salida = pa.BufferOutputStream()
+    with pa.ipc.new_stream(salida, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    return salida.getvalue().to_pybytes()
+
+
+def _predict_arrow(cliente, columnas):
+    respuesta = cliente.post("/predict/arrow", content=_arrow(columnas),
+                             headers={"content-type": "application/vnd.apache.arrow.stream"})
+    assert respuesta.status_code == 200, respuesta.text
+    with pa.ipc.open_stream(respuesta.content) as lector:
+        return lector.read_all().to_pylist()
+
+
+def test_predict(cliente):
+    respuesta = cliente.post("/predict", json=BASE)
+    assert respuesta.status_code == 200
+    resultado = respuesta.json()
+    assert resultado["prediction"] in (0, 1)
+    assert 0.5 <= resultado["probability"] <= 1.0
+
+
+def test_predict_codigos_equivalen_a_categorias(cliente):
+    codigos = {**BASE, "tipo_vehiculo": 38, "sexo": 1}
+    assert cliente.post("/predict", json=codigos).json() == cliente.post("/predict", json=BASE).json()
+
+
+@pytest.mark.parametrize("valor", [999, -1, True])
+def test_predict_codigo_invalido_422(cliente, valor):
+    respuesta = cliente.post("/predict", json={**BASE, "tipo_vehiculo": valor})
+    assert respuesta.status_code == 422
+    errores = respuesta.json()["detail"]
+    assert errores and all(e["loc"][:2] == ["body", "tipo_vehiculo"] for e in errores)
+    if valor is not True:
+        assert [e["type"] for e in errores] == ["codigo_categoria"]
+
+
+def test_predict_sin_ubicacion_400(cliente):
+    respuesta = cliente.post("/predict", json={**BASE, "cod_distrito": None})
+    assert respuesta.status_code == 400
+
+
+def test_batch_errores_por_fila(cliente):
+    registros = [BASE, {**BASE, "tipo_vehiculo": 999}, {**BASE, "cod_distrito": None}, COORDENADAS]
+    respuesta = cliente.post("/predict/batch", json=registros)
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert cuerpo["total"] == 4
+    assert cuerpo["errores"] == 2
+    resultados = cuerpo["resultados"]
+    assert resultados[0] == cliente.post("/predict", json=BASE).json()
+    assert resultados[1]["error"][0]["type"] == "codigo_categoria"
+    assert "cod_distrito" in resultados[2]["error"]
+    assert resultados[3] == cliente.post("/predict", json=COORDENADAS).json()
+
+
+def test_arrow_coincide_con_batch(cliente):
+    registros = [BASE, COORDENADAS, {**BASE, "tipo_vehiculo": "Bicicleta", "cod_distrito": 12}]
+    esperado = cliente.post("/predict/batch", json=registros).json()["resultados"]
+    columnas = {c: [r.get(c) for r in registros] for c in COORDENADAS}
+    columnas["cod_distrito"] = pa.array(columnas["cod_distrito"], pa.int32())
+    obtenido = _predict_arrow(cliente, columnas)
+    assert [{"prediction": r["prediction"], "probability": r["probability"]} for r in obtenido] == esperado
+    assert [r["modelo"] for r in obtenido] == ["distrito", "coordenadas", "distrito"]
+
+
+def test_arrow_codigos_diccionario_y_errores(cliente):
+    n = 4
+    columnas = {c: [BASE[c]] * n for c in BASE}
+    # Códigos enteros: válido, nulo (desconocida), fuera de rango (error de fila)
+    columnas["tipo_vehiculo"] = pa.array([38, None, 999, 38], pa.int16())
+    columnas["sexo"] = pa.array(["Hombre", "zzz", "Hombre", "Hombre"]).dictionary_encode()
+    columnas["cod_distrito"] = pa.array([5, 5, 5, None], pa.float64())
+    obtenido = _predict_arrow(cliente, columnas)
+
+    assert obtenido[0]["probability"] == cliente.post("/predict", json=BASE).json()["probability"]
+    # Categorías nulas o desconocidas se puntúan como en el resto de endpoints
+    desconocida = cliente.post("/predict/batch", json=[{**BASE, "tipo_vehiculo": "zzz", "sexo": "zzz"}])
+    assert obtenido[1]["probability"] == desconocida.json()["resultados"][0]["probability"]
+    assert obtenido[1]["error"] is None
+    assert obtenido[2] == {"prediction": None, "probability": None, "modelo": None,
+                           "error": "codigo_categoria_invalido"}
+    assert obtenido[3]["error"] == "ubicacion_insuficiente"
+
+
+def test_arrow_content_type(cliente):
+    respuesta = cliente.post("/predict/arrow", content=b"{}", headers={"content-type": "application/json"})
+    assert respuesta.status_code == 415
@@ -0,0 +1,115 @@
+"""Índice de distritos sobre polígonos sintéticos en coordenadas UTM"""
+import json
+
+import numpy as np
+import pytest
+
+from geo import IndiceDistritos, construir, utm_a_wgs84
+
+X0, Y0 = 440000.0, 4470000.0
+
+
+def cuadrado(x0: float, y0: float, lado: float) -> np.ndarray:
+    return np.array([[x0, y0], [x0 + lado, y0], [x0 + lado, y0 + lado], [x0, y0 + lado], [x0, y0]])
+
+
+def poligonos():
+    """
+    Distrito 1: cuadrado de 3 km con un hueco central de 1 km.
+    Distrito 2: multipolígono con una isla dentro del hueco del 1 y un
+    cuadrado separado al este.
+    """
+    return {
+        1: [cuadrado(X0, Y0, 3000), cuadrado(X0 + 1000, Y0 + 1000, 1000)],
+        2: [cuadrado(X0 + 1200, Y0 + 1200, 600), cuadrado(X0 + 4000, Y0, 1000)],
+    }
+
+
+def referencia(poligonos_distrito, x: float, y: float) -> int:
+    """Regla par-impar punto a punto, sin rejilla"""
+    for codigo, anillos in poligonos_distrito.items():
+        cruces = 0
+        for anillo in anillos:
+            for (ax, ay), (bx, by) in zip(anillo[:-1], anillo[1:]):
+                if (ay > y) != (by > y) and x < ax + (y - ay) * (bx - ax) / (by - ay):
+                    cruces += 1
+        if cruces % 2:
+            return codigo
+    return 0
+
+
+@pytest.mark.parametrize("tam_celda", [250.0, 1000.0, 5000.0])
+def test_distrito_con_huecos_y_multipoligono(tam_celda):
+    indice = IndiceDistritos(poligonos(), {1: "Uno", 2: "Dos"}, tam_celda=tam_celda)
+    puntos = {
+        (X0 + 500, Y0 + 500): 1,      # anillo exterior del 1
+        (X0 + 1100, Y0 + 1100): 0,    # hueco del 1, fuera de la isla
+        (X0 + 1500, Y0 + 1500): 2,    # isla del 2 dentro del hueco
+        (X0 + 4500, Y0 + 500): 2,     # segunda parte del multipolígono
+        (X0 + 3500, Y0 + 500): 0,     # entre los dos distritos
+        (X0 - 10000, Y0): 0,          # fuera de la rejilla
+    }
+    x, y = np.array(list(puntos)).T
+    assert indice.distrito(x, y).tolist() == list(puntos.values())
+
+
+def test_distrito_coincide_con_la_referencia_en_puntos_aleatorios():
+    geometria = poligonos()
+    indice = IndiceDistritos(geometria, tam_celda=300.0)
+    rng = np.random.default_rng(0)
+    x = rng.uniform(X0 - 500, X0 + 5500, 5000)
+    y = rng.uniform(Y0 - 500, Y0 + 3500, 5000)
+    esperado = [referencia(geometria, xi, yi) for xi, yi in zip(x, y)]
+    assert indice.distrito(x, y).tolist() == esperado
+
+
+def test_distrito_valores_no_finitos():
+    indice = IndiceDistritos(poligonos())
+    assert indice.distrito([np.nan, np.inf], [Y0, Y0]).tolist() == [0, 0]
+
+
+def _geojson(ruta, elementos):
+    ruta.write_text(json.dumps({"type": "FeatureCollection", "features": elementos}), encoding="utf-8")
+
+
+def _elemento(propiedades, tipo, coordenadas):
+    return {"type": "Feature", "properties": propiedades, "geometry": {"type": tipo, "coordinates": coordenadas}}
+
+
+def test_desde_geojson_en_grados(tmp_path):
+    geometria = poligonos()
+
+    def a_grados(anillo):
+        latitud, longitud = utm_a_wgs84(anillo[:, 0], anillo[:, 1])
+        return np.column_stack([longitud, latitud]).tolist()
+
+    ruta = tmp_path / "distritos.geojson"
+    _geojson(ruta, [
+        _elemento({"COD_DIS": "1", "NOMBRE": "Uno"}, "Polygon", [a_grados(a) for a in geometria[1]]),
+        _elemento({"cod_distrito": 2}, "MultiPolygon", [[a_grados(a)] for a in geometria[2]]),
+    ])
+    indice = IndiceDistritos.desde_geojson(ruta)
+    assert indice.nombres == {1: "Uno"}
+    # Los vértices vuelven a UTM con error submilimétrico
+    assert np.allclose(indice.aristas.min(axis=0)[:2], [X0, Y0], atol=1e-3)
+    x, y = np.array([X0 + 500, X0 + 1500, X0 + 4500]), np.array([Y0 + 500, Y0 + 1500, Y0 + 500])
+    assert indice.distrito(x, y).tolist() == [1, 2, 2]
+
+
+def test_construir_exige_los_21_distritos(tmp_path):
+    entrada = tmp_path / "descargado.geojson"
+    elementos = [
+        _elemento({"COD_DIS_TX": f"{codigo:02d}", "NOM_DIS": f"Distrito {codigo}"}, "Polygon",
+                  [cuadrado(X0 + 1000 * codigo, Y0, 900).tolist()])
+        for codigo in range(1, 22)
+    ]
+    _geojson(entrada, elementos[:-1])
+    with pytest.raises(ValueError, match="faltan \\[21\\]"):
+        construir(entrada, tmp_path / "distritos.geojson")
+
+    _geojson(entrada, elementos)
+    indice = construir(entrada, tmp_path / "geo" / "distritos.geojson")
+    assert len(indice.codigos) == 21
+    assert indice.nombres[7] == "Distrito 7"
+    guardado = json.loads((tmp_path / "geo" / "distritos.geojson").read_text(encoding="utf-8"))
+    assert guardado["features"][0]["properties"] == {"cod_distrito": 1, "nombre": "Distrito 1"}
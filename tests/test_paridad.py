@@ -0,0 +1,107 @@
+"""
+Paridad de las rutas de inferencia con pickle + pandas sobre una muestra de
+la rejilla de entradas: ruta compilada, booster nativo .ubj y runtime ligero.
+"""
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from inferencia_rapida import PipelineCompilado
+from registro_modelos import VARIANTES, ModelRegistry
+from runtime_ligero import PipelineLigero, exportar
+from vocabulario import CAMPOS_CATEGORICOS, CODIGOS, VOCABULARIO
+
+FILAS = 3000
+
+NUMERICAS = {
+    "distrito": {"cod_distrito": lambda rng, n: rng.integers(1, 22, n).astype(np.float64)},
+    "coordenadas": {
+        "coordenada_x_utm": lambda rng, n: rng.uniform(432000.0, 452000.0, n),
+        "coordenada_y_utm": lambda rng, n: rng.uniform(4465000.0, 4490000.0, n),
+    },
+}
+
+registro = ModelRegistry()
+
+
+def _cargar_pickle(nombre: str):
+    rutas = registro.rutas(nombre)
+    if not all(ruta.exists() for ruta in rutas.values()):
+        pytest.skip(f"No están los artefactos pickle del modelo {nombre}")
+    artefactos = {}
+    for artefacto, ruta in rutas.items():
+        with open(ruta, "rb") as f:
+            artefactos[artefacto] = pickle.load(f)
+    return artefactos["modelo"], artefactos["preprocessor"], artefactos["label_encoder"]
+
+
+@pytest.fixture(scope="module", params=VARIANTES)
+def muestra(request):
+    """Modelo pickle, filas de muestra y probabilidades de referencia (pandas)"""
+    nombre = request.param
+    model, preprocessor, label_encoder = _cargar_pickle(nombre)
+    rng = np.random.default_rng(0)
+    columnas = {}
+    for campo in CAMPOS_CATEGORICOS:
+        valores = np.asarray(VOCABULARIO[campo] + ("categoria_desconocida",), dtype=object)
+        columnas[campo] = valores[rng.integers(0, len(valores), FILAS)]
+    for campo, generar in NUMERICAS[nombre].items():
+        columnas[campo] = generar(rng, FILAS)
+    esperado = model.predict_proba(preprocessor.transform(pd.DataFrame(columnas)))
+    return SimpleNamespace(
+        nombre=nombre, model=model, preprocessor=preprocessor, label_encoder=label_encoder,
+        columnas=columnas, esperado=esperado,
+    )
+
+
+def _registros(columnas):
+    campos = list(columnas)
+    return [SimpleNamespace(**dict(zip(campos, fila))) for fila in zip(*columnas.values())]
+
+
+def test_ruta_compilada_identica_a_pandas(muestra):
+    compilado = PipelineCompilado(muestra.model, muestra.preprocessor, muestra.label_encoder)
+    registros = _registros(muestra.columnas)
+    assert np.array_equal(compilado.predecir_proba(compilado.codificar(registros)), muestra.esperado)
+    assert np.array_equal(
+        compilado.predecir_proba(compilado.codificar_columnas(muestra.columnas, FILAS)), muestra.esperado
+    )
+    for i in range(0, FILAS, 97):
+        fila = compilado.predecir_proba(compilado.codificar_fila(registros[i]))
+        assert np.array_equal(fila, muestra.esperado[i:i + 1])
+
+
+def test_ruta_por_codigos_identica_a_pandas(muestra):
+    compilado = PipelineCompilado(muestra.model, muestra.preprocessor, muestra.label_encoder)
+    codigos = {
+        c: np.fromiter((CODIGOS[c].get(v, -1) for v in muestra.columnas[c]), dtype=np.intp, count=FILAS)
+        for c in CAMPOS_CATEGORICOS
+    }
+    numericas = {c: muestra.columnas[c] for c in NUMERICAS[muestra.nombre]}
+    X = compilado.codificar_codigos(codigos, numericas, FILAS)
+    assert np.array_equal(compilado.predecir_proba(X), muestra.esperado)
+
+
+def test_booster_ubj_identico_a_pandas(muestra):
+    import xgboost as xgb
+
+    ruta = registro.ruta_nativa(muestra.nombre)
+    if not ruta.exists():
+        pytest.skip(f"No existe {ruta.name}")
+    model = xgb.XGBClassifier()
+    model.load_model(ruta)
+    compilado = PipelineCompilado(model, muestra.preprocessor, muestra.label_encoder)
+    obtenido = compilado.predecir_proba(compilado.codificar(_registros(muestra.columnas)))
+    assert np.array_equal(obtenido, muestra.esperado)
+
+
+def test_runtime_ligero_coincide_con_pandas(muestra, tmp_path):
+    compilado = PipelineCompilado(muestra.model, muestra.preprocessor, muestra.label_encoder)
+    ligero = PipelineLigero(exportar(compilado, tmp_path / f"{muestra.nombre}.npz"))
+    obtenido = ligero.predecir_proba(ligero.codificar(_registros(muestra.columnas)))
+    # El recorrido de los árboles con NumPy suma en otro orden: mismas clases, error de redondeo float32
+    assert np.array_equal(obtenido.argmax(axis=1), muestra.esperado.argmax(axis=1))
+    assert np.abs(obtenido[:, 1] - muestra.esperado[:, 1]).max() <= 1e-6